@@ -0,0 +1,336 @@
+"""Replays sniffed events through a `Trader` to evaluate its conditions.
+
+By default offers fill the instant they appear. Given a `LatencyModel` and a
+`RemovalIndex` of the replayed events, an offer only fills if it is not
+removed from the market place before the trader's decision and the broker's
+request would have reached it.
+"""
+import logging
+import math
+import random
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+from gann.offer import Offer, OfferType, PaymentOption
+from gann.order_book import OrderBooks
+from gann.removal import CompactRemoval, Removal
+from gann.serialization import EVENT_TYPE
+from gann.trader import Trader
+from gann.trader_conditions import TraderConditions
+
+log = logging.getLogger('gann')
+
+# bitcoin.de charges buyer and seller 0.5% of each trade.
+BITCOIN_DE_FEE = 0.005
+
+@dataclass
+class LatencyModel:
+    """How long it takes from an offer's appearance until a trade request
+    reaches the market place, in seconds.
+
+    :param float decision: The time to receive and decide on an offer.
+    :param float broker: The median time of a trade request.
+    :param float jitter: The standard deviation of the logarithm of the
+    broker's latency, which is constant without jitter.
+    :param int seed: Seed of the random latencies.
+    """
+    decision: float = 0.0
+    broker: float = 0.0
+    jitter: float = 0.0
+    seed: int = 0
+
+    def __post_init__(self):
+        self.random = random.Random(self.seed)
+
+    def sample(self):
+        """The latency of a single trade."""
+        if not self.jitter:
+            return self.decision + self.broker
+        return self.decision + self.broker * self.random.lognormvariate(
+            0, self.jitter)
+
+class RemovalIndex:
+    """When offers got removed, looked up by binary search in arrays sorted
+    by order id and time.
+
+    bitcoin.de re-emits offers, so an order id may be removed several times.
+    All removals are kept, so that each emission finds its own.
+
+    :param order_ids: The removed offers' ids as numpy array of bytes.
+    :param timestamps: When they were removed.
+    """
+    def __init__(self, order_ids, timestamps):
+        order = np.lexsort((timestamps, order_ids))
+        self.order_ids = order_ids[order]
+        self.timestamps = timestamps[order]
+
+    @classmethod
+    def from_records(cls, records):
+        """Indexes the removals of an array of `RECORD_DTYPE`."""
+        removals = records[records['event'] == EVENT_TYPE.REMOVED.value]
+        return cls(np.array(removals['order_id']),
+                   np.array(removals['timestamp']))
+
+    @classmethod
+    def from_events(cls, events):
+        """Indexes the removals among offers and removals."""
+        order_ids = []
+        timestamps = []
+        for event in events:
+            if isinstance(event, (Removal, CompactRemoval)):
+                order_ids.append(event.order_id.encode('utf-8'))
+                timestamps.append(event.timestamp)
+        return cls(np.array(order_ids, dtype=bytes),
+                   np.array(timestamps, dtype=np.float64))
+
+    def __len__(self):
+        return len(self.order_ids)
+
+    def removed_at(self, order_id: str, since: float = -math.inf):
+        """The timestamp of the first removal of an offer at or after `since`
+        or infinity if it did not get removed since."""
+        key = order_id.encode('utf-8')[:self.order_ids.dtype.itemsize]
+        first = int(np.searchsorted(self.order_ids, key, side='left'))
+        last = int(np.searchsorted(self.order_ids, key, side='right'))
+        i = first + int(np.searchsorted(self.timestamps[first:last], since,
+                                        side='left'))
+        if i < last:
+            return float(self.timestamps[i])
+        return math.inf
+
+@dataclass(frozen=True)
+class Trade:
+    """A trade executed by the `SimulatedBroker`.
+
+        :param datetime date: When the traded offer appeared.
+        :param OfferType type: `BUY` if the trader bought coins, `SELL` if it
+        sold them.
+        :param int price: The price per coin in cents.
+        :param float amount: The amount of coins traded before fees.
+        :param float gained: Coins gained by buying or cents gained by
+        selling after fees.
+    """
+    date: datetime
+    type: OfferType
+    price: int
+    amount: float
+    gained: float
+
+class SimulatedBroker:
+    """A broker which fills every order at the offer's price as long as the
+    offer has not been removed or taken already and charges bitcoin.de's
+    fees.
+
+    :param float fee: The fee charged for each trade as fraction.
+    :param LatencyModel latency: Delays trades, only applies along with
+    `removals`.
+    :param RemovalIndex removals: When offers get removed, trades reaching
+    them later fail.
+    """
+    def __init__(self, fee: float = BITCOIN_DE_FEE,
+                 latency: LatencyModel = None,
+                 removals: RemovalIndex = None):
+        self.fee = fee
+        self.latency = latency if latency is not None else LatencyModel()
+        self.removals = removals
+        # When the offers seen removed got removed last
+        self.removed = dict()
+        self.taken = dict()
+        self.trades = []
+        # Trades failing since the offer got removed before they arrived
+        self.missed = 0
+
+    def remove(self, removal: Removal):
+        """Forgets an offer, so that it can not be traded any more, unless
+        it is emitted again later."""
+        self.removed[removal.order_id] = removal.timestamp
+        self.taken.pop(removal.order_id, None)
+
+    def fill(self, offer: Offer, amount: float):
+        """Takes `amount` of an offer if it is still available."""
+        if self.removed.get(offer.order_id, -math.inf) >= offer.timestamp:
+            return False
+        if self.removals is not None:
+            arrival = offer.timestamp + self.latency.sample()
+            if (self.removals.removed_at(offer.order_id, offer.timestamp)
+                <= arrival):
+                self.missed += 1
+                return False
+        taken = self.taken.get(offer.order_id, 0.0)
+        if taken + amount > offer.amount:
+            return False
+        self.taken[offer.order_id] = taken + amount
+        return True
+
+    def try_buy(self, offer: Offer, amount: float):
+        # Same as the real broker, we can not make sepa bank transfers
+        if offer.payment_option == PaymentOption.SEPA_ONLY:
+            return False
+        if not self.fill(offer, amount):
+            return False
+
+        coins = amount * (1 - self.fee)
+        self.trades.append(Trade(offer.date, OfferType.BUY, offer.price,
+                                 amount, coins))
+        return coins
+
+    def try_sell(self, offer: Offer, amount: float):
+        if not self.fill(offer, amount):
+            return False
+
+        money = int(offer.price * amount * (1 - self.fee))
+        self.trades.append(Trade(offer.date, OfferType.SELL, offer.price,
+                                 amount, money))
+        return money
+
+@dataclass(frozen=True)
+class DepotSnapshot:
+    """The state of the trader right after a trade.
+
+        :param datetime date: When the trade happened.
+        :param int money: The trader's money in cents.
+        :param Dict[int, float] depot: The trader's positions.
+        :param int equity: Money plus the coins valued at the trade's price.
+    """
+    date: datetime
+    money: int
+    depot: Dict[int, float]
+    equity: int
+
+@dataclass
+class BacktestReport:
+    """The outcome of a `Backtest`. Equity is money plus coins valued at the
+    last seen price, all amounts of money are in cents."""
+    start_equity: int = 0
+    end_equity: int = 0
+    money: int = 0
+    coins: float = 0.0
+    last_price: int = 0
+    events: int = 0
+    missed: int = 0
+    max_drawdown: int = 0
+    trades: List[Trade] = field(default_factory=list)
+    depot_evolution: List[DepotSnapshot] = field(default_factory=list)
+
+    @property
+    def profit(self):
+        return self.end_equity - self.start_equity
+
+    def __str__(self):
+        return ("%i events, %i trades, %i missed, profit %.2f €, "
+                "max drawdown %.2f €, money %.2f €, %f coins at %.2f €" % (
+                    self.events, len(self.trades), self.missed,
+                    self.profit / 100,
+                    self.max_drawdown / 100, self.money / 100, self.coins,
+                    self.last_price / 100))
+
+class Backtest:
+    """Evaluates trader conditions against recorded offers and removals.
+
+    :param TraderConditions conditions: The conditions to evaluate.
+    :param int money: The money the trader starts with in cents.
+    :param dict depot: The positions the trader starts with, in units if the
+    conditions are in fixed-point mode.
+    :param float fee: The fee charged by the simulated broker.
+    :param LatencyModel latency: How long trades take to reach the offers.
+    :param RemovalIndex removals: When the replayed offers get removed,
+    required to apply the `latency`.
+    :param MarketStatistics statistics: Kept up to date with the offers and
+    removals of all pairs and made available to the trader. Order books are maintained
+    for its spreads, unless it has some already.
+    :param Strategy strategy: Decides on the offers, see `gann.strategy`.
+    """
+    def __init__(self,
+                 conditions: TraderConditions = TraderConditions(),
+                 money: int = 1000_00,
+                 depot=None,
+                 fee: float = BITCOIN_DE_FEE,
+                 latency: LatencyModel = None,
+                 removals: RemovalIndex = None,
+                 statistics=None,
+                 strategy=None):
+        self.broker = SimulatedBroker(fee, latency, removals)
+        self.trader = Trader(broker=self.broker,
+                             depot=depot,
+                             money=money,
+                             conditions=conditions,
+                             strategy=strategy)
+
+        self.statistics = statistics
+        self.order_books = None
+        if statistics is not None:
+            if statistics.order_books is None:
+                self.order_books = statistics.order_books = OrderBooks()
+            self.trader.order_book = statistics.order_books.book(
+                conditions.trading_pair)
+            self.trader.statistics = statistics.pair(conditions.trading_pair)
+
+    def coins(self):
+        return self.trader.conditions.from_units(
+            sum(self.trader.depot.values()))
+
+    def run(self, events):
+        """Feeds the events to the trader and reports the results.
+
+        :param events: Offers and removals in time order, e.g. as returned by
+        `gann.serialization.deserialize_from`.
+        """
+        trader = self.trader
+        broker = self.broker
+        trading_pair = trader.conditions.trading_pair
+        statistics = self.statistics
+        order_books = self.order_books
+
+        report = BacktestReport()
+        coins = self.coins()
+        last_price = 0
+        peak = None
+        max_drawdown = 0
+
+        for event in events:
+            report.events += 1
+            if isinstance(event, (Removal, CompactRemoval)):
+                broker.remove(event)
+                if order_books is not None:
+                    order_books.remove(event)
+                if statistics is not None:
+                    statistics.remove(event)
+                continue
+
+            if statistics is not None:
+                if order_books is not None:
+                    order_books.add(event)
+                statistics.add(event)
+
+            if event.trading_pair != trading_pair:
+                continue
+
+            last_price = event.price
+            if trader.process_offer(event):
+                coins = self.coins()
+                report.depot_evolution.append(DepotSnapshot(
+                    event.date, trader.money, dict(trader.depot),
+                    int(trader.money + coins * last_price)))
+
+            equity = trader.money + coins * last_price
+            if peak is None:
+                peak = equity
+                report.start_equity = int(equity)
+            elif equity > peak:
+                peak = equity
+            elif peak - equity > max_drawdown:
+                max_drawdown = peak - equity
+
+        report.end_equity = int(trader.money + coins * last_price)
+        report.money = trader.money
+        report.coins = coins
+        report.last_price = last_price
+        report.max_drawdown = int(max_drawdown)
+        report.trades = list(broker.trades)
+        report.missed = broker.missed
+        log.info("Backtest of %s finished: %s", trader.conditions, report)
+        return report
@@ -0,0 +1,166 @@
+"""Measures the throughput and latency of the hot paths on synthetic data.
+
+Each benchmark times every single call, so that besides the events per
+second the median and the 99th percentile of the latency are known. Results
+are plain dicts, which `bin/benchmark` stores as JSON to compare commits.
+"""
+import io
+import platform
+import subprocess
+import time
+
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from gann.offer import Offer, offer_bitcoin_de
+from gann.serialization import (deserialize_from, serialize_header,
+                                serialize_offer, serialize_removal)
+from gann.synthetic import SyntheticMarket
+from gann.trader import Trader
+from gann.trader_conditions import TraderConditions
+from gann.trader_runner import TraderRunner
+from gann.trading_pair import TradingPair
+
+DEPOT_SIZES = (1, 10, 100, 1000, 10000)
+TRADER_COUNTS = (1, 10, 100, 1000)
+
+@dataclass
+class BenchmarkResult:
+    """Timings of a benchmark, latencies are in microseconds."""
+    name: str
+    parameter: int
+    events: int
+    seconds: float
+    events_per_second: float
+    p50: float
+    p99: float
+
+    def __str__(self):
+        return "%-24s %6s %12.0f events/s  p50 %8.2f us  p99 %8.2f us" % (
+            self.name, self.parameter if self.parameter is not None else '',
+            self.events_per_second, self.p50, self.p99)
+
+class RejectingBroker:
+    """Declines every trade, so that traders keep their depots and each
+    offer is decided on the same state."""
+    def try_buy(self, offer, amount):
+        return 0
+
+    def try_sell(self, offer, amount):
+        return 0
+
+def measure(name, function, inputs, parameter=None):
+    """Calls `function` with each of `inputs` and times each call."""
+    clock = time.perf_counter_ns
+    durations = np.empty(len(inputs), dtype=np.int64)
+    for i, value in enumerate(inputs):
+        started = clock()
+        function(value)
+        durations[i] = clock() - started
+
+    seconds = durations.sum() / 1e9
+    return BenchmarkResult(
+        name=name,
+        parameter=parameter,
+        events=len(inputs),
+        seconds=float(seconds),
+        events_per_second=len(inputs) / seconds if seconds else 0.0,
+        p50=float(np.percentile(durations, 50)) / 1e3,
+        p99=float(np.percentile(durations, 99)) / 1e3)
+
+def bench_offer_bitcoin_de(events, seed=0):
+    market = SyntheticMarket(seed)
+    data = [market.websocket_data(offer) for offer in market.offers(events)]
+    return [measure('offer_bitcoin_de', offer_bitcoin_de, data)]
+
+def bench_serialization(events, seed=0):
+    """Serializing single events and deserializing a whole stream."""
+    market = SyntheticMarket(seed)
+    stream = list(market.events(events))
+    offers = [event for event in stream if isinstance(event, Offer)]
+    results = [measure('serialize_offer', serialize_offer, offers)]
+
+    buffer = serialize_header() + b''.join(
+        serialize_offer(event) if isinstance(event, Offer)
+        else serialize_removal(event) for event in stream)
+    iterator = deserialize_from(io.BytesIO(buffer))
+    results.append(measure('deserialize_from', lambda _: next(iterator),
+                           stream))
+    return results
+
+def bench_process_offer(events, depot_sizes=DEPOT_SIZES, seed=0):
+    """A trader deciding on offers of its pair with depots of the given
+    sizes."""
+    results = []
+    for size in depot_sizes:
+        market = SyntheticMarket(seed)
+        offers = list(market.offers(events, TradingPair.BTCEUR))
+        trader = Trader(broker=RejectingBroker(), money=1000000_00,
+                        depot=market.depot(size),
+                        conditions=TraderConditions(min_profit_str='1%'))
+        results.append(measure('Trader.process_offer', trader.process_offer,
+                               offers, size))
+    return results
+
+def bench_runner(events, trader_counts=TRADER_COUNTS, seed=0):
+    """A runner with the given number of differently configured traders on
+    the pairs of the synthetic market."""
+    results = []
+    pairs = [TradingPair.BTCEUR, TradingPair.ETHEUR, TradingPair.LTCEUR]
+    for count in trader_counts:
+        market = SyntheticMarket(seed)
+        offers = list(market.offers(events))
+        traders = [Trader(broker=RejectingBroker(), money=1000_00,
+                          depot=(market.depot(10, pairs[i % len(pairs)])
+                                 if i % 2 else None),
+                          conditions=TraderConditions(
+                              step_price=10_00 * (i % 7 + 1),
+                              turnaround_price=5_00 * (i % 5 + 1),
+                              min_profit_str='%i%%' % (i % 4 + 1),
+                              trading_pair=pairs[i % len(pairs)]))
+                   for i in range(count)]
+        runner = TraderRunner(traders, [io.StringIO() for _ in traders])
+        results.append(measure('TraderRunner.add_order', runner.add_order,
+                               offers, count))
+    return results
+
+def git_commit():
+    """The commit gann is checked out at or `None`."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              cwd=Path(__file__).parent,
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(events=100_000, depot_sizes=DEPOT_SIZES, trader_counts=TRADER_COUNTS,
+        seed=0):
+    """Runs all benchmarks and returns their results along with what they
+    ran on as JSON compatible dict."""
+    results = (bench_offer_bitcoin_de(events, seed)
+               + bench_serialization(events, seed)
+               + bench_process_offer(events, depot_sizes, seed)
+               + bench_runner(events, trader_counts, seed))
+    return {'commit': git_commit(),
+            'date': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'events': events,
+            'seed': seed,
+            'results': [asdict(result) for result in results]}
+
+def compare(baseline, current):
+    """Yields the names, parameters and the relative change of events per
+    second of the benchmarks in both runs."""
+    previous = {(result['name'], result['parameter']): result
+                for result in baseline['results']}
+    for result in current['results']:
+        before = previous.get((result['name'], result['parameter']))
+        if before is None or not before['events_per_second']:
+            continue
+        yield (result['name'], result['parameter'],
+               result['events_per_second'] / before['events_per_second'] - 1)
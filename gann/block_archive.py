@@ -0,0 +1,229 @@
+"""Compressed archives of events, stored in columnar blocks.
+
+A block archive starts with a `FILE_HEADER_STRUCT` followed by blocks. Each
+block starts with a `BLOCK_HEADER_STRUCT` telling how many events it holds,
+how it is compressed, the range of their timestamps and which trading pairs
+occur, so that readers can skip blocks without decompressing them. The
+payload holds the columns of `RECORD_DTYPE` one after another, timestamps
+and prices stored as differences to their predecessors, which compresses
+several times better than the records one by one.
+"""
+import lzma
+import struct
+import time
+import zlib
+
+from collections import namedtuple
+from enum import Enum, unique
+
+import numpy as np
+
+from gann.serialization import (serialize_offer, serialize_removal,
+                                RECORD_DTYPE,
+                                INDEXES_TRADING_PAIRS_INDEXES)
+from gann.trading_pair import TradingPair
+
+FILE_MAGIC = b'GANNBLK\0'
+FILE_VERSION = 1
+BLOCK_MAGIC = b'GBLK'
+
+# magic, version
+FILE_HEADER_STRUCT = struct.Struct('<8sH6x')
+# magic, codec, number of events, compressed size, size of the columns,
+# minimal timestamp, maximal timestamp, bit mask of trading pair indexes
+BLOCK_HEADER_STRUCT = struct.Struct('<4sB3xIIIddQ')
+
+# Columns stored as differences of their 64 bit patterns
+DELTA_COLUMNS = ('timestamp', 'price')
+
+# By default a block is written after this many events or seconds
+BLOCK_EVENTS = 65536
+BLOCK_SECONDS = 300.0
+
+@unique
+class Codec(Enum):
+    """How the payload of a block is compressed."""
+    NONE = 0
+    ZLIB = 1
+    LZMA = 2
+
+    def __str__(self):
+        return self.name.lower()
+
+BlockHeader = namedtuple('BlockHeader', [
+    'offset', 'codec', 'count', 'compressed_size', 'raw_size',
+    'min_timestamp', 'max_timestamp', 'trading_pairs'])
+
+def is_block_format(header):
+    """Tells if `header` is the beginning of a block archive."""
+    return header[:len(FILE_MAGIC)] == FILE_MAGIC
+
+def trading_pairs_mask(trading_pairs):
+    """The bit mask of the given trading pairs as used in block headers."""
+    mask = 0
+    for trading_pair in trading_pairs:
+        mask |= 1 << INDEXES_TRADING_PAIRS_INDEXES[trading_pair]
+    return mask
+
+def encode_columns(records):
+    """Stores the columns of an array of `RECORD_DTYPE` one after another."""
+    columns = []
+    for name in RECORD_DTYPE.names:
+        column = np.ascontiguousarray(records[name])
+        if name in DELTA_COLUMNS:
+            column = np.diff(column.view('<i8'), prepend=np.int64(0))
+        columns.append(column.tobytes())
+    return b''.join(columns)
+
+def decode_columns(raw, count):
+    """Restores an array of `RECORD_DTYPE` from `encode_columns`."""
+    records = np.zeros(count, dtype=RECORD_DTYPE)
+    position = 0
+    for name in RECORD_DTYPE.names:
+        dtype = RECORD_DTYPE.fields[name][0]
+        column = np.frombuffer(raw, dtype=dtype, count=count, offset=position)
+        if name in DELTA_COLUMNS:
+            column = np.cumsum(column.view('<i8')).view(dtype)
+        records[name] = column
+        position += dtype.itemsize * count
+    return records
+
+def compress(raw, codec):
+    if codec == Codec.ZLIB:
+        return zlib.compress(raw, 6)
+    if codec == Codec.LZMA:
+        return lzma.compress(raw, preset=6)
+    return raw
+
+def decompress(payload, codec):
+    if codec == Codec.ZLIB:
+        return zlib.decompress(payload)
+    if codec == Codec.LZMA:
+        return lzma.decompress(payload)
+    return bytes(payload)
+
+class BlockWriter:
+    """Buffers offers and removals and writes them as compressed blocks.
+
+    It can be used in place of an `EventWriter`.
+
+    :param buffer: A binary, writable buffer, which is either empty or
+    contains a block archive.
+    :param Codec codec: How to compress blocks.
+    :param int block_events: Write a block after this many events.
+    :param float block_seconds: Write a block once its first event is this
+    many seconds old.
+    :param clock: Returns monotonic timestamps in seconds.
+    """
+    def __init__(self, buffer, codec: Codec = Codec.ZLIB,
+                 block_events: int = BLOCK_EVENTS,
+                 block_seconds: float = BLOCK_SECONDS,
+                 clock=time.monotonic):
+        self.buffer = buffer
+        self.codec = codec
+        self.block_events = block_events
+        self.block_seconds = block_seconds
+        self.clock = clock
+
+        self.pending = bytearray()
+        self.count = 0
+        self.started = None
+
+        if buffer.tell() == 0:
+            buffer.write(FILE_HEADER_STRUCT.pack(FILE_MAGIC, FILE_VERSION))
+
+    def write_record(self, record):
+        """Buffers a serialized record and writes the block if it is due."""
+        if self.count == 0:
+            self.started = self.clock()
+        self.pending += record
+        self.count += 1
+
+        if (self.count >= self.block_events
+            or self.clock() - self.started >= self.block_seconds):
+            self.flush()
+
+    def write_offer(self, offer):
+        self.write_record(serialize_offer(offer))
+
+    def write_removal(self, removal):
+        self.write_record(serialize_removal(removal))
+
+    def flush(self):
+        """Writes the buffered events as one block."""
+        if self.count == 0:
+            return
+
+        records = np.frombuffer(self.pending, dtype=RECORD_DTYPE)
+        raw = encode_columns(records)
+        payload = compress(raw, self.codec)
+        mask = 0
+        for index in np.unique(records['trading_pair']):
+            mask |= 1 << int(index)
+
+        self.buffer.write(BLOCK_HEADER_STRUCT.pack(
+            BLOCK_MAGIC, self.codec.value, self.count, len(payload),
+            len(raw), float(records['timestamp'].min()),
+            float(records['timestamp'].max()), mask))
+        self.buffer.write(payload)
+        self.buffer.flush()
+
+        self.pending = bytearray()
+        self.count = 0
+
+    def close(self):
+        self.flush()
+
+def read_block_headers(data):
+    """Yields the `BlockHeader` of each complete block of a block archive."""
+    position = FILE_HEADER_STRUCT.size
+    while position + BLOCK_HEADER_STRUCT.size <= len(data):
+        (magic, codec, count, compressed_size, raw_size, min_timestamp,
+         max_timestamp, trading_pairs) = BLOCK_HEADER_STRUCT.unpack_from(
+             data, position)
+        end = position + BLOCK_HEADER_STRUCT.size + compressed_size
+        # A block which is still being written
+        if magic != BLOCK_MAGIC or end > len(data):
+            return
+        yield BlockHeader(position + BLOCK_HEADER_STRUCT.size, Codec(codec),
+                          count, compressed_size, raw_size, min_timestamp,
+                          max_timestamp, trading_pairs)
+        position = end
+
+def read_block(data, header):
+    """Decompresses a block into an array of `RECORD_DTYPE`."""
+    payload = data[header.offset:header.offset + header.compressed_size]
+    return decode_columns(decompress(payload, header.codec), header.count)
+
+def read_blocks(data, start=None, end=None, trading_pair=None):
+    """Yields an array of `RECORD_DTYPE` for each block which may contain
+    events with `start <= timestamp < end` of `trading_pair`, trimmed to the
+    time range. Other blocks are not decompressed.
+
+    :param data: The content of a block archive.
+    :param float start: A timestamp.
+    :param float end: A timestamp.
+    :param TradingPair trading_pair: Skip blocks without this pair, or
+    without any of the pairs, if several are given.
+    """
+    if trading_pair is None:
+        mask = None
+    elif isinstance(trading_pair, TradingPair):
+        mask = trading_pairs_mask([trading_pair])
+    else:
+        mask = trading_pairs_mask(trading_pair)
+
+    for header in read_block_headers(data):
+        if start is not None and header.max_timestamp < start:
+            continue
+        if end is not None and header.min_timestamp >= end:
+            continue
+        if mask is not None and not header.trading_pairs & mask:
+            continue
+
+        records = read_block(data, header)
+        if start is not None:
+            records = records[records['timestamp'] >= start]
+        if end is not None:
+            records = records[records['timestamp'] < end]
+        yield records
@@ -2,11 +2,13 @@ import hashlib
 import hmac
 import json
 import logging
+import threading
 import time
 from enum import Enum, unique
 from typing import Dict
 from urllib.parse import urlencode
 import requests
+from requests.adapters import HTTPAdapter
 
 from gann.offer import Offer, OfferType, PaymentOption
 
@@ -19,60 +21,141 @@ class PaymentOptionTrade(Enum):
   SEPA=2
   SEPA_INSTANT=3
 
+# Requests without post parameters sign the digest of an empty string
+EMPTY_MD5 = hashlib.md5(b'').hexdigest()
+
+class Signer:
+    """Signs requests to the API of *bitcoin.de*.
+
+    The HMAC is keyed once and copied for each signature. The part of a
+    message before the nonce only depends on the method and uri, so it can
+    be hashed ahead of time with `presign`.
+
+    :param api_key: The key identifying the account.
+    :param secret: The secret to sign with.
+    :param init_nonce: The nonce to count up from.
+    """
+    def __init__(self, api_key: str, secret: str, init_nonce: int):
+        self.api_key = api_key
+        self.template = hmac.new(secret.encode('utf-8'),
+                                 digestmod=hashlib.sha256)
+        self.last_nonce = init_nonce
+        self.lock = threading.Lock()
+
+    def nonce(self):
+        """A nonce greater than all previous ones, even if several threads
+        ask at once."""
+        with self.lock:
+            self.last_nonce += 1
+            return str(self.last_nonce)
+
+    def presign(self, method: str, uri: str):
+        """The HMAC fed with the part of a message preceding the nonce."""
+        mac = self.template.copy()
+        mac.update(('%s#%s#%s#' % (method, uri, self.api_key)).encode('utf-8'))
+        return mac
+
+    def headers(self, presigned, post_params: Dict = None):
+        """The headers of a request signed with the HMAC of `presign`.
+
+        :param post_params: The parameters to post, if any."""
+        nonce = self.nonce()
+        if post_params:
+            post_params_md5 = hashlib.md5(urlencode(
+                sorted(post_params.items())).encode('utf-8')).hexdigest()
+        else:
+            post_params_md5 = EMPTY_MD5
+
+        mac = presigned.copy()
+        mac.update(('%s#%s' % (nonce, post_params_md5)).encode('utf-8'))
+        return {"X-API-KEY": self.api_key,
+                "X-API-NONCE": nonce,
+                "X-API-SIGNATURE": mac.hexdigest()}
+
 class BrokerBitcoinDe:
     """A Broker to interact with the *bitcoin.de* market place."""
     API_URL = "https://api.bitcoin.de/v4/"
     def __init__(self, trading_log, api_key: str, secret: str,
-                 init_nonce: int = int(time.time())):
+                 init_nonce: int = int(time.time()),
+                 session: requests.Session = None,
+                 pool_size: int = 4):
+        """
+        :param session: The session to send requests with. By default one
+        keeping up to `pool_size` connections to the API alive is created, so
+        that trades and their fee lookups do not wait for new TLS
+        handshakes.
+        """
         self.trading_log = trading_log
         self.api_key = api_key
         self.secret = secret
-        self.last_nonce = init_nonce
+        self.signer = Signer(api_key, secret, init_nonce)
+        self.session = (session if session is not None
+                        else self.create_session(pool_size))
+        self.keep_alive_thread = None
+        # The url and presigned HMAC of the last offer prepared for a trade
+        self.prepared = None
+
+    @property
+    def last_nonce(self):
+        return self.signer.last_nonce
+
+    @classmethod
+    def create_session(cls, pool_size: int):
+        """Creates a session pooling up to `pool_size` connections to the
+        API, one for each trade which may be executed concurrently."""
+        session = requests.Session()
+        session.mount(cls.API_URL, HTTPAdapter(pool_connections=1,
+                                               pool_maxsize=pool_size,
+                                               pool_block=False))
+        return session
+
+    def warm_up(self):
+        """Opens a connection to the API ahead of time, so that the next trade
+        can reuse it."""
+        try:
+            self.session.head(self.API_URL, timeout=10)
+        except requests.RequestException as e:
+            log.warning("Failed to connect to %s: %s", self.API_URL, e)
+
+    def keep_alive(self, interval: float = 30):
+        """Keeps a pooled connection open by warming it up every `interval`
+        seconds in a background thread."""
+        def run():
+            while True:
+                self.warm_up()
+                time.sleep(interval)
+
+        self.keep_alive_thread = threading.Thread(
+            target=run, name='broker keep alive', daemon=True)
+        self.keep_alive_thread.start()
 
     def nonce(self):
-        self.last_nonce += 1
-        return str(self.last_nonce)
+        return self.signer.nonce()
 
     def post_headers(self, uri: str, post_params: Dict):
-        """Creates the post headers for an uri and post parameters
-
-        :param:"""
-        nonce = self.nonce();
-        sorted_post_params = dict(sorted(post_params.items()))
-        post_params_str = urlencode(sorted_post_params)
-        post_params_md5 = hashlib.md5(post_params_str.encode("utf-8"))
-        message = '#'.join(['POST',
-                            uri,
-                            self.api_key,
-                            nonce,
-                            post_params_md5.digest().hex()])
-
-        signature = hmac.digest(self.secret.encode("utf-8"),
-                                msg=message.encode("utf-8"),
-                                digest='sha256').hex()
-
-        return {"X-API-KEY": self.api_key,
-                "X-API-NONCE": nonce,
-                "X-API-SIGNATURE": signature}
+        """Creates the post headers for an uri and post parameters"""
+        return self.signer.headers(self.signer.presign('POST', uri),
+                                   post_params)
 
     def get_headers(self, uri: str):
-        nonce = self.nonce()
+        return self.signer.headers(self.signer.presign('GET', uri))
 
-        # No Post params -> empty string
-        post_params_md5 = hashlib.md5(str().encode("utf-8"))
-        message = '#'.join(['GET',
-                            uri,
-                            self.api_key,
-                            nonce,
-                            post_params_md5.digest().hex()])
+    def prepare(self, offer: Offer):
+        """Presigns a trade of `offer`, so that trading it only has to sign
+        the nonce and amount. `Trader.process_offer` calls it before the
+        strategy decides on the offer, only the last prepared offer is
+        kept.
 
-        signature = hmac.digest(self.secret.encode("utf-8"),
-                                msg=message.encode("utf-8"),
-                                digest='sha256').hex()
+        :returns: The url to trade the offer at and the presigned HMAC."""
+        prepared = self.prepared
+        if prepared is not None and prepared[0] is offer:
+            return prepared[1:]
 
-        return {"X-API-KEY": self.api_key,
-                "X-API-NONCE": nonce,
-                "X-API-SIGNATURE": signature}
+        url = (self.API_URL + offer.trading_pair.value
+               + "/trades/" + offer.order_id)
+        prepared = self.prepared = (offer, url,
+                                    self.signer.presign('POST', url))
+        return prepared[1:]
 
     def gained_coins_after_fees(self, offer: Offer):
         """ Returns the amount of coins recefied for a succesful `SELL`-order.
@@ -87,7 +170,7 @@ class BrokerBitcoinDe:
                + offer.order_id
                )
 
-        result = requests.get(url, headers=self.get_headers(url))
+        result = self.session.get(url, headers=self.get_headers(url))
 
         if result.status_code != 200:
             log.warning("Failed to get last trades coins amount due to %i: %s",
@@ -114,7 +197,7 @@ class BrokerBitcoinDe:
                + offer.trading_pair.value + "/trades/"
                + offer.order_id)
 
-        result = requests.get(url, headers=self.get_headers(url))
+        result = self.session.get(url, headers=self.get_headers(url))
 
         if result.status_code != 200:
             log.warning("Failed to get last trades moiny after fees amount due"
@@ -135,15 +218,15 @@ class BrokerBitcoinDe:
         if offer.payment_option == PaymentOption.SEPA_ONLY:
             return False
 
-        url = (self.API_URL + offer.trading_pair.value
-               + "/trades/" + offer.order_id)
+        url, presigned = self.prepare(offer)
         data = {'type': "buy",
                 'payment_option': PaymentOptionTrade.EXPRESS.value,
                 'amount_currency_to_trade': amount}
 
-        result = requests.post(url,
-                               headers=self.post_headers(url, data),
-                               data=data)
+        result = self.session.post(url,
+                                   headers=self.signer.headers(presigned,
+                                                               data),
+                                   data=data)
 
         if result.status_code == 201:
             print("Successfully bought %f %s of %s" % (
@@ -157,12 +240,13 @@ class BrokerBitcoinDe:
         return False
 
     def try_sell(self, offer: Offer, amount: float):
-        url = (self.API_URL + offer.trading_pair.value
-               + "/trades/" + offer.order_id)
+        url, presigned = self.prepare(offer)
         data = {'type': "sell",
                 'payment_option': 1,
                 'amount_currency_to_trade': amount}
-        result = requests.post(url, data, headers=self.post_headers(url, data))
+        result = self.session.post(url, data,
+                                   headers=self.signer.headers(presigned,
+                                                               data))
 
         if result.status_code == 201:
             print("Successfully sold %f %s of %s" % (
@@ -0,0 +1,123 @@
+from bisect import bisect_left, bisect_right, insort
+from itertools import accumulate
+
+class Depot(dict):
+    """The positions of a trader: amounts of coins by the price in cents they
+    were bought for.
+
+    It is a `dict`, so it compares and serializes to JSON like the plain
+    dicts used before, but additionally keeps its prices sorted and caches
+    the cumulative amounts and costs of its positions from the cheapest on.
+
+    :param positions: Initial positions as mapping of prices to amounts.
+    """
+    def __init__(self, positions=None):
+        super().__init__()
+        self._prices = []
+        self._cumulative = None
+        self._changed = None
+        if positions is not None:
+            self.update(positions)
+
+    def __setitem__(self, price, amount):
+        if not super().__contains__(price):
+            insort(self._prices, price)
+        super().__setitem__(price, amount)
+        self._cumulative = None
+        if self._changed is not None:
+            self._changed.add(price)
+
+    def __delitem__(self, price):
+        super().__delitem__(price)
+        del self._prices[bisect_left(self._prices, price)]
+        self._cumulative = None
+        if self._changed is not None:
+            self._changed.add(price)
+
+    def __iter__(self):
+        """Iterates the prices from the cheapest on."""
+        return iter(self._prices)
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def update(self, *args, **kwargs):
+        for price, amount in dict(*args, **kwargs).items():
+            self[price] = amount
+
+    def setdefault(self, price, amount=None):
+        if price not in self:
+            self[price] = amount
+        return self[price]
+
+    def pop(self, price, *default):
+        if price not in self:
+            return super().pop(price, *default)
+        amount = self[price]
+        del self[price]
+        return amount
+
+    def popitem(self):
+        """Removes and returns the most expensive position."""
+        if not self._prices:
+            raise KeyError('popitem(): depot is empty')
+        price = self._prices[-1]
+        return price, self.pop(price)
+
+    def clear(self):
+        if self._changed is not None:
+            self._changed.update(self._prices)
+        super().clear()
+        self._prices.clear()
+        self._cumulative = None
+
+    def prices(self):
+        """The prices of all positions from the cheapest on. Must not be
+        modified."""
+        return self._prices
+
+    def cheapest(self):
+        """The price of the cheapest position."""
+        return self._prices[0]
+
+    def cumulative(self):
+        """Returns two lists, the cumulative amounts and the cumulative costs
+        of the positions from the cheapest on. Element `i` is the sum over the
+        `i + 1` cheapest positions. Must not be modified."""
+        if self._cumulative is None:
+            amounts = [super(Depot, self).__getitem__(price)
+                       for price in self._prices]
+            self._cumulative = (
+                list(accumulate(amounts)),
+                list(accumulate(amount * price for amount, price
+                                in zip(amounts, self._prices))))
+        return self._cumulative
+
+    def count_within(self, amount):
+        """Returns how many of the cheapest positions sum up to at most
+        `amount`."""
+        return bisect_right(self.cumulative()[0], amount)
+
+    def remove_cheapest(self, count):
+        """Removes the `count` cheapest positions."""
+        for price in self._prices[:count]:
+            super().__delitem__(price)
+        if self._changed is not None:
+            self._changed.update(self._prices[:count])
+        del self._prices[:count]
+        self._cumulative = None
+
+    def take_changes(self):
+        """Returns the prices of the positions set or removed since the last
+        call and starts tracking them, if not done yet. The first call
+        returns all prices."""
+        if self._changed is None:
+            changed = set(self._prices)
+        else:
+            changed = self._changed
+        self._changed = set()
+        return changed
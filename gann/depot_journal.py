@@ -0,0 +1,203 @@
+"""Persists a trader's money and depot as snapshot plus append-only journal.
+
+The snapshot is the depot JSON file used before, `{"money": ..., "depot":
+{price: amount, ...}}`. Each trade appends a line to the journal next to it,
+holding the money and only the positions the trade set or removed:
+
+    {"money": 12345, "set": {"1000000": 0.5}, "del": [990000]}
+
+A line with a `depot` key replaces all positions instead. Journal entries
+state absolute values, so replaying one twice does no harm. Once the journal
+got long enough, it is compacted: the current state is written to a new
+snapshot, which atomically replaces the old one, and the journal is emptied.
+"""
+import json
+import logging
+import os
+import time
+
+from enum import Enum, unique
+from pathlib import Path
+
+from gann.depot import Depot
+from gann.fixed_point import depot_to_coins, depot_to_units
+from gann.trading_pair import TradingPair
+
+log = logging.getLogger('gann')
+
+@unique
+class FsyncPolicy(Enum):
+    """When journal entries are forced to disk."""
+    # After every entry, a trade is not lost on power failure.
+    ALWAYS = 'always'
+    # At most once per interval, trades of the interval may get lost.
+    INTERVAL = 'interval'
+    # Leave it to the operating system, survives crashes of the process only.
+    NEVER = 'never'
+
+    def __str__(self):
+        return str(self.value)
+
+def _fsync_directory(path):
+    """Makes a rename within the directory of `path` durable."""
+    try:
+        descriptor = os.open(path.parent, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+def load_snapshot(path):
+    """Reads money and depot of a depot JSON file, raises `ValueError` if it
+    is malformed."""
+    data = json.loads(Path(path).read_text() or '{}')
+    depot = Depot()
+    for price, amount in data.get('depot', dict()).items():
+        try:
+            depot[int(price)] = amount
+        except ValueError:
+            raise ValueError("%s can not be parsed as an int." % price)
+    return data.get('money', 0.0), depot
+
+class DepotJournal:
+    """Journals the changes of a trader's depot.
+
+    :param snapshot_path: The depot JSON file.
+    :param journal_path: Where to append the changes, `snapshot_path` with the
+    suffix `.journal` by default.
+    :param FsyncPolicy fsync: When to force entries to disk.
+    :param float fsync_interval: Seconds between syncs of the `INTERVAL`
+    policy.
+    :param int compact_every: Compact after this many journal entries.
+    :param clock: Returns monotonic timestamps in seconds.
+    :param TradingPair units: The depots recovered and recorded count
+    amounts in the smallest units of this pair's coin, as those of traders
+    in fixed-point mode do. The files hold coins nevertheless.
+    """
+    def __init__(self, snapshot_path, journal_path=None,
+                 fsync: FsyncPolicy = FsyncPolicy.ALWAYS,
+                 fsync_interval: float = 1.0,
+                 compact_every: int = 1000,
+                 clock=time.monotonic,
+                 units: TradingPair = None):
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = Path(journal_path if journal_path is not None
+                                 else self.snapshot_path.with_suffix(
+                                         '.journal'))
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.clock = clock
+        self.units = units
+
+        self.entries = 0
+        self.last_sync = clock()
+        self._depot = None
+        self._journal = None
+
+    def recover(self):
+        """Reads the snapshot and replays the journal on top of it.
+
+        :returns: A tuple of the money and the `Depot`.
+        """
+        money, depot = load_snapshot(self.snapshot_path)
+        self.entries = 0
+        if self.journal_path.exists():
+            with self.journal_path.open('r') as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn write of the last entry during a crash
+                        log.warning("Ignoring incomplete entry in %s: %s",
+                                    self.journal_path, line.strip())
+                        break
+                    money = entry['money']
+                    if 'depot' in entry:
+                        depot.clear()
+                        positions = entry['depot']
+                    else:
+                        positions = entry.get('set', dict())
+                        for price in entry.get('del', []):
+                            depot.pop(int(price), None)
+                    for price, amount in positions.items():
+                        depot[int(price)] = amount
+                    self.entries += 1
+        if self.units is not None:
+            depot = Depot(depot_to_units(depot, self.units))
+        return money, depot
+
+    def _coins(self, depot, prices):
+        """The amounts of coins of positions of a depot by prices."""
+        positions = {price: depot[price] for price in prices}
+        if self.units is not None:
+            positions = depot_to_coins(positions, self.units)
+        return {str(price): amount for price, amount in positions.items()}
+
+    def record(self, money, depot: Depot):
+        """Appends the changes of the depot since the last call along with
+        the money and compacts the journal if it is due."""
+        entry = {'money': money}
+        changed = depot.take_changes()
+        if depot is not self._depot:
+            # A depot never seen before, it replaces all positions
+            self._depot = depot
+            entry['depot'] = self._coins(depot, depot)
+        else:
+            entry['set'] = self._coins(depot, [price for price in changed
+                                               if price in depot])
+            entry['del'] = [price for price in changed if price not in depot]
+
+        if self._journal is None:
+            self._journal = self.journal_path.open('a')
+        self._journal.write(json.dumps(entry) + '\n')
+        self._journal.flush()
+        self.entries += 1
+        self.sync()
+
+        if self.entries >= self.compact_every:
+            self.compact(money, depot)
+
+    def sync(self, force=False):
+        """Forces the journal to disk according to the fsync policy."""
+        if self._journal is None:
+            return
+        now = self.clock()
+        if (force or self.fsync == FsyncPolicy.ALWAYS
+            or (self.fsync == FsyncPolicy.INTERVAL
+                and now - self.last_sync >= self.fsync_interval)):
+            os.fsync(self._journal.fileno())
+            self.last_sync = now
+
+    def compact(self, money, depot):
+        """Writes a new snapshot of the given state and empties the journal."""
+        temporary = self.snapshot_path.with_name(
+            self.snapshot_path.name + '.tmp')
+        with temporary.open('w') as snapshot:
+            json.dump({'money': money,
+                       'depot': self._coins(depot, depot)}, snapshot)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temporary, self.snapshot_path)
+        _fsync_directory(self.snapshot_path)
+
+        # A crash before truncating replays entries already in the snapshot,
+        # which leads to the same state.
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = self.journal_path.open('w')
+        os.fsync(self._journal.fileno())
+        self.entries = 0
+        self._depot = depot
+        depot.take_changes()
+
+    def close(self, money=None, depot=None):
+        """Syncs the journal and compacts it, if a state is given."""
+        if money is not None and depot is not None:
+            self.compact(money, depot)
+        self.sync(force=True)
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
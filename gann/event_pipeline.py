@@ -0,0 +1,239 @@
+"""Decouples receiving market events from deciding on them."""
+import logging
+import threading
+import time
+
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum, unique
+
+from gann.metrics import DISABLED
+from gann.offer import compact_offer_bitcoin_de
+from gann.removal import compact_removal_bitcoin_de
+
+log = logging.getLogger('gann')
+
+@unique
+class BackpressurePolicy(Enum):
+    """What to do if events arrive faster than they are processed."""
+    # Make the receiver wait until there is room in the queue. Before the
+    # worker started and after it stopped, the oldest offers are dropped.
+    BLOCK = 'block'
+    # Skip offers, which waited longer than the maximal age, and drop the
+    # oldest offers if the queue is full.
+    DROP_STALE = 'drop_stale'
+    # Drop queued offers, once they are removed or offered again, and the
+    # oldest offers if the queue is full.
+    COALESCE = 'coalesce'
+
+    def __str__(self):
+        return str(self.value)
+
+@unique
+class EventKind(Enum):
+    ADDED = 'add_order'
+    REMOVED = 'remove_order'
+
+@dataclass
+class PipelineMetrics:
+    """Counters of an `EventPipeline`, ages are in seconds."""
+    received: int = 0
+    processed: int = 0
+    dropped_stale: int = 0
+    dropped_full: int = 0
+    coalesced: int = 0
+    depth: int = 0
+    max_depth: int = 0
+    age_sum: float = 0.0
+    max_age: float = 0.0
+
+    def mean_age(self):
+        return self.age_sum / self.processed if self.processed else 0.0
+
+    def __str__(self):
+        return ("received %i, processed %i, dropped %i stale and %i on a "
+                "full queue, coalesced %i, depth %i (max %i), age at decision "
+                "%.1f ms (max %.1f ms)" % (
+                    self.received, self.processed, self.dropped_stale,
+                    self.dropped_full, self.coalesced, self.depth,
+                    self.max_depth, self.mean_age() * 1000,
+                    self.max_age * 1000))
+
+class _QueuedEvent:
+    """A raw event waiting in the queue."""
+    __slots__ = ('received', 'kind', 'data', 'alive', 'received_ns')
+
+    def __init__(self, received, kind, data, received_ns=None):
+        self.received = received
+        self.kind = kind
+        self.data = data
+        self.alive = True
+        self.received_ns = received_ns
+
+class EventPipeline:
+    """Queues raw events of bitcoin.de's websocket, so that the receiving
+    thread returns immediately, and lets a worker thread parse them and pass
+    them to a `TraderRunner`.
+
+    :param runner: Receives the parsed offers and removals.
+    :param int max_size: How many events may wait at most.
+    :param BackpressurePolicy policy: How to keep up with bursts.
+    :param float max_age: Offers older than this many seconds are skipped by
+    the `DROP_STALE` policy.
+    :param clock: Returns monotonic timestamps in seconds.
+    :param Metrics latencies: Records the time events wait and take to be
+    parsed.
+    """
+    def __init__(self, runner, max_size: int = 1000,
+                 policy: BackpressurePolicy = BackpressurePolicy.DROP_STALE,
+                 max_age: float = 0.5,
+                 clock=time.monotonic,
+                 latencies=None):
+        self.runner = runner
+        self.max_size = max_size
+        self.policy = policy
+        self.max_age = max_age
+        self.clock = clock
+        self.metrics = PipelineMetrics()
+        self.latencies = latencies if latencies is not None else DISABLED
+
+        self._events = deque()
+        self._offers = dict()
+        self._condition = threading.Condition()
+        self._running = False
+        self._worker = None
+
+    def add_order(self, data):
+        self.put(EventKind.ADDED, data)
+
+    def remove_order(self, data):
+        self.put(EventKind.REMOVED, data)
+
+    def put(self, kind: EventKind, data):
+        """Queues a raw event, called by the receiving thread."""
+        latencies = self.latencies
+        event = _QueuedEvent(self.clock(), kind, data,
+                             latencies.clock() if latencies.enabled else None)
+        metrics = self.metrics
+
+        with self._condition:
+            metrics.received += 1
+
+            if self.policy == BackpressurePolicy.COALESCE:
+                queued = self._offers.pop(data.get('order_id'), None)
+                if queued is not None and queued.alive:
+                    queued.alive = False
+                    metrics.depth -= 1
+                    metrics.coalesced += 1
+                    # The offer is gone before anyone looked at it
+                    if kind == EventKind.REMOVED:
+                        return
+
+            while metrics.depth >= self.max_size:
+                # Without a worker, nobody would ever make room
+                if (self.policy == BackpressurePolicy.BLOCK
+                    and self._running):
+                    self._condition.wait()
+                elif not self._drop_oldest():
+                    # Removals are never dropped, the queue grows instead
+                    break
+
+            self._events.append(event)
+            if (self.policy == BackpressurePolicy.COALESCE
+                and kind == EventKind.ADDED):
+                self._offers[data.get('order_id')] = event
+            metrics.depth += 1
+            if metrics.depth > metrics.max_depth:
+                metrics.max_depth = metrics.depth
+            self._condition.notify_all()
+
+    def _drop_oldest(self):
+        """Drops the oldest queued offer. Removals are kept, since the order
+        books and traders would keep their offers otherwise.
+
+        :returns: `False` if only removals are queued."""
+        events = self._events
+        while events and not events[0].alive:
+            events.popleft()
+        for event in events:
+            if event.alive and event.kind == EventKind.ADDED:
+                event.alive = False
+                self.metrics.depth -= 1
+                self.metrics.dropped_full += 1
+                self._offers.pop(event.data.get('order_id'), None)
+                return True
+        return False
+
+    def _take(self):
+        """Waits for the next live event, `None` once stopped."""
+        with self._condition:
+            while True:
+                while self._events:
+                    event = self._events.popleft()
+                    if not event.alive:
+                        continue
+                    event.alive = False
+                    self.metrics.depth -= 1
+                    if (self.policy == BackpressurePolicy.COALESCE
+                        and event.kind == EventKind.ADDED):
+                        self._offers.pop(event.data.get('order_id'), None)
+                    self._condition.notify_all()
+                    return event
+                if not self._running:
+                    return None
+                self._condition.wait()
+
+    def process(self, event: _QueuedEvent):
+        """Parses an event and passes it to the runner."""
+        age = self.clock() - event.received
+        metrics = self.metrics
+
+        latencies = self.latencies
+        if event.kind == EventKind.ADDED:
+            if (self.policy == BackpressurePolicy.DROP_STALE
+                and age > self.max_age):
+                metrics.dropped_stale += 1
+                if latencies.enabled:
+                    latencies.increment('offers_dropped_total',
+                                        reason='stale')
+                return
+            if latencies.enabled and event.received_ns is not None:
+                started = latencies.clock()
+                latencies.observe('queue', started - event.received_ns)
+                offer = compact_offer_bitcoin_de(event.data)
+                latencies.since('parse', started)
+                self.runner.add_order(offer, event.received_ns)
+            else:
+                self.runner.add_order(compact_offer_bitcoin_de(event.data))
+        else:
+            self.runner.remove_order(
+                compact_removal_bitcoin_de(event.data))
+
+        metrics.processed += 1
+        metrics.age_sum += age
+        if age > metrics.max_age:
+            metrics.max_age = age
+
+    def run(self):
+        """Processes events until `stop` is called."""
+        while (event := self._take()) is not None:
+            try:
+                self.process(event)
+            except Exception as e:
+                log.exception("Failed to process %s %s: %s",
+                              event.kind.value, event.data, e)
+
+    def start(self):
+        """Starts processing events in a worker thread."""
+        self._running = True
+        self._worker = threading.Thread(target=self.run,
+                                        name='decision worker', daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout: float = None):
+        """Processes the queued events and stops the worker thread."""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout)
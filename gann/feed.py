@@ -0,0 +1,264 @@
+"""Fans the market events out from one connection to several traders.
+
+`bin/feed` receives and parses bitcoin.de's events once and publishes them
+through a `FeedServer` on a Unix socket. Each `bin/trader --feed` process
+reads them with a `FeedClient` and decides on them with its own
+`TraderRunner`, so that traders of several accounts share one connection and
+spread their decisions across cores.
+
+The stream sent to each client is a version 2 file without index: the
+header followed by one record of `RECORD_STRUCT` per event.
+"""
+import logging
+import os
+import socket
+import threading
+
+from collections import deque
+
+import numpy as np
+
+from gann.serialization import (is_current_format, iter_events,
+                                serialize_header, serialize_offer,
+                                serialize_removal, HEADER_STRUCT,
+                                RECORD_DTYPE, RECORD_STRUCT)
+
+log = logging.getLogger('gann')
+
+# How many records a client receives at once at most
+RECEIVE_RECORDS = 256
+# Bytes the kernel buffers per client, each record sent takes up far more
+# than its 64 bytes
+SEND_BUFFER = 4 * 1024 * 1024
+# Records queued per client at most before it is disconnected
+MAX_BACKLOG = 100000
+
+class _Subscriber:
+    """A connected client with the records not yet sent to it.
+
+    Each client is sent its records by a thread of its own, so that a slow
+    client does not hold up publishing or the other clients.
+    """
+    def __init__(self, server, connection):
+        self.server = server
+        self.connection = connection
+        self.pending = deque()
+        self.closing = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.send, name='feed send',
+                                       daemon=True)
+
+    def enqueue(self, record: bytes) -> bool:
+        """Queues a record, unless the client is too far behind."""
+        with self.condition:
+            if len(self.pending) >= self.server.max_backlog:
+                return False
+            self.pending.append(record)
+            self.condition.notify()
+            return True
+
+    def finish(self):
+        """Lets the thread send what is pending and then close."""
+        with self.condition:
+            self.closing = True
+            self.condition.notify()
+
+    def abort(self):
+        """Drops what is pending and wakes the thread, even while sending."""
+        with self.condition:
+            self.closing = True
+            self.pending.clear()
+            self.condition.notify()
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def send(self):
+        try:
+            while True:
+                with self.condition:
+                    while not self.pending and not self.closing:
+                        self.condition.wait()
+                    if not self.pending:
+                        return
+                    records = b''.join(self.pending)
+                    self.pending.clear()
+                try:
+                    self.connection.sendall(records)
+                except OSError as e:
+                    self.server.disconnect(self, e)
+                    return
+        finally:
+            self.connection.close()
+
+class FeedServer:
+    """Publishes events to all clients connected to a Unix socket.
+
+    Clients, which do not take an event within `send_timeout` seconds or
+    fall more than `max_backlog` records behind, are disconnected, so that a
+    stuck trader does not hold up the others.
+
+    :param path: Where to create the socket.
+    :param float send_timeout: How long to wait for a slow client.
+    :param int send_buffer: The size of the kernel's buffer per client,
+    limited by the system's maximum.
+    :param int max_backlog: How many records to queue for a client at most.
+    """
+    def __init__(self, path, send_timeout: float = 1.0,
+                 send_buffer: int = SEND_BUFFER,
+                 max_backlog: int = MAX_BACKLOG):
+        self.path = str(path)
+        self.send_timeout = send_timeout
+        self.send_buffer = send_buffer
+        self.max_backlog = max_backlog
+        self.clients = []
+        self.lock = threading.Lock()
+        self.published = 0
+        self.disconnected = 0
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(self.path)
+        self.socket.listen()
+        self.accept_thread = threading.Thread(target=self.accept,
+                                              name='feed accept', daemon=True)
+        self.accept_thread.start()
+
+    def accept(self):
+        """Accepts clients until the server is closed."""
+        header = serialize_header()
+        while True:
+            try:
+                client, _ = self.socket.accept()
+            except OSError:
+                return
+            client.settimeout(self.send_timeout)
+            client.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+                              self.send_buffer)
+            try:
+                client.sendall(header)
+            except OSError as e:
+                log.warning("Failed to greet feed client: %s", e)
+                client.close()
+                continue
+            subscriber = _Subscriber(self, client)
+            with self.lock:
+                self.clients.append(subscriber)
+            subscriber.thread.start()
+            log.info("Feed client connected, %i clients", len(self.clients))
+
+    def disconnect(self, subscriber, reason):
+        """Drops a client, once, for the given reason."""
+        with self.lock:
+            if subscriber not in self.clients:
+                return
+            self.clients.remove(subscriber)
+            self.disconnected += 1
+        log.warning("Disconnecting feed client: %s", reason)
+        subscriber.abort()
+
+    def publish(self, record: bytes):
+        """Queues a serialized record for all clients without waiting for
+        any of them."""
+        with self.lock:
+            self.published += 1
+            behind = [subscriber for subscriber in self.clients
+                      if not subscriber.enqueue(record)]
+        for subscriber in behind:
+            self.disconnect(subscriber, "more than %i records behind"
+                            % self.max_backlog)
+
+    def publish_offer(self, offer):
+        self.publish(serialize_offer(offer))
+
+    def publish_removal(self, removal):
+        self.publish(serialize_removal(removal))
+
+    def close(self):
+        """Stops accepting and closes the clients once they were sent what
+        is queued for them, waiting at most `send_timeout` for each."""
+        self.socket.close()
+        with self.lock:
+            subscribers = list(self.clients)
+        for subscriber in subscribers:
+            subscriber.finish()
+        for subscriber in subscribers:
+            subscriber.thread.join()
+        with self.lock:
+            self.clients.clear()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+class FeedClient:
+    """Receives the events of a `FeedServer`.
+
+    :param path: The server's socket.
+    :param float timeout: How often to check whether the client got closed
+    while waiting for events.
+    """
+    def __init__(self, path, timeout: float = 1.0):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(str(path))
+        self.socket.settimeout(timeout)
+        self.closed = False
+        self.buffer = bytearray(RECEIVE_RECORDS * RECORD_STRUCT.size)
+        self.filled = 0
+
+        header = self._receive_exactly(HEADER_STRUCT.size)
+        if header is None or not is_current_format(header):
+            self.socket.close()
+            raise ValueError("%s does not publish events" % path)
+
+    def _receive_exactly(self, size):
+        data = bytearray()
+        while len(data) < size:
+            try:
+                chunk = self.socket.recv(size - len(data))
+            except socket.timeout:
+                if self.closed:
+                    return None
+                continue
+            if not chunk:
+                return None
+            data += chunk
+        return bytes(data)
+
+    def records(self):
+        """Lazily yields the received records as arrays of `RECORD_DTYPE`,
+        as many at once as have arrived, until the server or the client
+        closes."""
+        view = memoryview(self.buffer)
+        size = RECORD_STRUCT.size
+        while not self.closed:
+            try:
+                received = self.socket.recv_into(view[self.filled:])
+            except socket.timeout:
+                continue
+            except OSError:
+                if self.closed:
+                    return
+                raise
+            if received == 0:
+                return
+            self.filled += received
+
+            complete = self.filled - self.filled % size
+            if complete:
+                yield np.frombuffer(bytes(view[:complete]),
+                                    dtype=RECORD_DTYPE)
+                rest = self.filled - complete
+                view[:rest] = view[complete:self.filled]
+                self.filled = rest
+
+    def events(self, compact=True):
+        """Lazily yields the received offers and removals, see `iter_events`
+        for `compact`."""
+        for records in self.records():
+            yield from iter_events(records, compact=compact)
+
+    def close(self):
+        """Stops receiving, may be called from other threads."""
+        self.closed = True
+        self.socket.close()
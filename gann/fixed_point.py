@@ -0,0 +1,44 @@
+"""Amounts of coins as integers.
+
+In fixed-point mode amounts are counted in the smallest unit of a trading
+pair's coin, like satoshis for bitcoins, so that traders compare and sum
+them without rounding errors. Prices stay integer cents per coin, thus the
+cost of an amount is `units * price / units_per_coin(pair)` cents.
+"""
+from gann.trading_pair import TradingPair
+
+# How many decimal places of a coin amount are kept
+COIN_DECIMALS = {
+    TradingPair.BTCEUR: 8,
+    TradingPair.ETHEUR: 8,
+    TradingPair.BSVEUR: 8,
+    TradingPair.BCHEUR: 8,
+    TradingPair.BTGEUR: 8,
+    TradingPair.LTCEUR: 8,
+    TradingPair.XRPEUR: 6,
+    TradingPair.DOGEEUR: 8,
+    TradingPair.UNKNOWN: 8,
+}
+
+def units_per_coin(trading_pair: TradingPair):
+    return 10 ** COIN_DECIMALS[trading_pair]
+
+def to_units(amount: float, trading_pair: TradingPair):
+    """Converts an amount of coins into the smallest units."""
+    return round(amount * units_per_coin(trading_pair))
+
+def from_units(units: int, trading_pair: TradingPair):
+    """Converts an amount of the smallest units into coins."""
+    return units / units_per_coin(trading_pair)
+
+def depot_to_units(depot, trading_pair: TradingPair):
+    """Converts the amounts of a depot, as stored by traders not in
+    fixed-point mode, into the smallest units."""
+    return {price: to_units(amount, trading_pair)
+            for price, amount in depot.items()}
+
+def depot_to_coins(depot, trading_pair: TradingPair):
+    """Converts the amounts of a depot of a trader in fixed-point mode into
+    coins."""
+    return {price: from_units(units, trading_pair)
+            for price, units in depot.items()}
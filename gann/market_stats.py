@@ -0,0 +1,249 @@
+"""Rolling statistics of the offers of each trading pair.
+
+The statistics are updated incrementally with each offer and removal in
+amortized logarithmic time, so that the same code keeps them up to date in
+the live trader and in replays:
+
+- the volume weighted average price (VWAP) and the lowest and highest price
+  of the offers within a sliding time window, which are still open. The
+  extremes are kept in heaps, from which expired and removed offers are
+  dropped once they come to the top,
+- an exponentially weighted moving average (EWMA) of the prices, which
+  decays with time rather than with the number of offers,
+- the realized volatility, the square root of the summed squared log returns
+  within the window. Returns are taken between offers of the same type, so
+  that alternating bids and asks do not count as volatility,
+
+the latter two describing the prices offered over time, which removals do
+not undo,
+- the spread of the order book, if one is maintained alongside.
+"""
+import heapq
+import math
+
+from collections import deque
+
+from gann.trading_pair import TradingPair
+
+# Seconds of offers the windowed statistics cover by default
+WINDOW = 5 * 60
+# Seconds after which an offer weighs half in the EWMA by default
+HALFLIFE = 60
+
+class _Sample:
+    """An offer of the window."""
+    __slots__ = ('order_id', 'timestamp', 'price', 'amount',
+                 'squared_return', 'open')
+
+    def __init__(self, order_id, timestamp, price, amount, squared_return):
+        self.order_id = order_id
+        self.timestamp = timestamp
+        self.price = price
+        self.amount = amount
+        self.squared_return = squared_return
+        # Cleared once the offer expired or got removed
+        self.open = True
+
+class PairStatistics:
+    """The statistics of the offers of one trading pair.
+
+    :param float window: The seconds covered by the windowed statistics.
+    :param float halflife: The seconds after which an offer's weight in the
+    EWMA halves.
+    :param OrderBook order_book: The order book of the pair, if someone
+    maintains one.
+    """
+    def __init__(self, window: float = WINDOW, halflife: float = HALFLIFE,
+                 order_book=None):
+        self.window = window
+        self.decay = math.log(2) / halflife
+        self.order_book = order_book
+
+        # The samples of the window in time order
+        self.samples = deque()
+        # The open samples by order id
+        self.open = dict()
+        self.weighted_prices = 0.0
+        self.volume = 0.0
+        self.squared_returns = 0.0
+        # Heaps of (price, sequence, sample) and (-price, sequence, sample)
+        # for the lowest and highest price, possibly holding closed samples
+        self.lows = []
+        self.highs = []
+
+        self.ewma_prices = 0.0
+        self.ewma_weights = 0.0
+        self.last_prices = dict()
+        self.now = None
+        self.count = 0
+
+    def add(self, offer):
+        """Accounts for an offer, which is expected not to be older than the
+        previous ones. An offer added again replaces the previous one."""
+        self.remove(offer)
+        timestamp = offer.timestamp
+        price = offer.price
+        amount = offer.amount
+
+        if self.now is not None and timestamp > self.now:
+            weight = math.exp(-self.decay * (timestamp - self.now))
+            self.ewma_prices *= weight
+            self.ewma_weights *= weight
+        if self.now is None or timestamp > self.now:
+            self.now = timestamp
+        self.ewma_prices += price
+        self.ewma_weights += 1.0
+
+        previous = self.last_prices.get(offer.type)
+        squared_return = (math.log(price / previous) ** 2
+                          if previous and price > 0 else 0.0)
+        self.last_prices[offer.type] = price
+
+        sample = _Sample(offer.order_id, timestamp, price, amount,
+                         squared_return)
+        self.samples.append(sample)
+        self.open[offer.order_id] = sample
+        self.weighted_prices += price * amount
+        self.volume += amount
+        self.squared_returns += squared_return
+
+        heapq.heappush(self.lows, (price, self.count, sample))
+        heapq.heappush(self.highs, (-price, self.count, sample))
+
+        self.count += 1
+        self.expire(self.now)
+
+    def remove(self, removal) -> bool:
+        """Stops counting an offer towards VWAP and extremes, if it is in
+        the window.
+
+        :param removal: The removal or anything else with the offer's
+        `order_id`.
+        :return: Whether the offer was in the window.
+        """
+        sample = self.open.pop(removal.order_id, None)
+        if sample is None:
+            return False
+        self._close(sample)
+        if not self.open:
+            self.weighted_prices = self.volume = 0.0
+        self._prune()
+        return True
+
+    def _close(self, sample):
+        sample.open = False
+        self.weighted_prices -= sample.price * sample.amount
+        self.volume -= sample.amount
+
+    def _prune(self):
+        """Pops closed samples off the heaps' tops and rebuilds heaps, which
+        got mostly closed."""
+        for heap in (self.lows, self.highs):
+            while heap and not heap[0][2].open:
+                heapq.heappop(heap)
+            if len(heap) > 2 * len(self.open) + 64:
+                heap[:] = [entry for entry in heap if entry[2].open]
+                heapq.heapify(heap)
+
+    def expire(self, now: float):
+        """Drops the offers, which are out of the window at `now`."""
+        horizon = now - self.window
+        samples = self.samples
+        while samples and samples[0].timestamp <= horizon:
+            sample = samples.popleft()
+            self.squared_returns -= sample.squared_return
+            if sample.open:
+                del self.open[sample.order_id]
+                self._close(sample)
+        if not samples:
+            # Do not carry rounding errors of the running sums along
+            self.squared_returns = 0.0
+        if not samples or not self.open:
+            self.weighted_prices = self.volume = 0.0
+        self._prune()
+
+    @property
+    def vwap(self):
+        """The average price of the window weighted by amounts or `None`."""
+        return self.weighted_prices / self.volume if self.volume > 0 else None
+
+    @property
+    def ewma(self):
+        """The time weighted average price or `None`."""
+        return (self.ewma_prices / self.ewma_weights if self.ewma_weights
+                else None)
+
+    @property
+    def low(self):
+        """The lowest price of the window or `None`."""
+        return self.lows[0][0] if self.lows else None
+
+    @property
+    def high(self):
+        """The highest price of the window or `None`."""
+        return -self.highs[0][0] if self.highs else None
+
+    @property
+    def volatility(self):
+        """The realized volatility of the window."""
+        return math.sqrt(max(self.squared_returns, 0.0))
+
+    @property
+    def spread(self):
+        """The spread of the order book or `None`."""
+        return (self.order_book.spread() if self.order_book is not None
+                else None)
+
+    def snapshot(self):
+        """The statistics as JSON compatible dict."""
+        return {'offers': len(self.open),
+                'vwap': self.vwap,
+                'ewma': self.ewma,
+                'low': self.low,
+                'high': self.high,
+                'volatility': self.volatility,
+                'spread': self.spread}
+
+class MarketStatistics:
+    """The statistics of each trading pair.
+
+    :param float window: See `PairStatistics`.
+    :param float halflife: See `PairStatistics`.
+    :param OrderBooks order_books: The order books to take spreads from, if
+    someone maintains them, see `TraderRunner`.
+    """
+    def __init__(self, window: float = WINDOW, halflife: float = HALFLIFE,
+                 order_books=None):
+        self.window = window
+        self.halflife = halflife
+        self.order_books = order_books
+        self.pairs = dict()
+
+    def pair(self, trading_pair: TradingPair):
+        """The statistics of a trading pair, created on first use."""
+        statistics = self.pairs.get(trading_pair)
+        if statistics is None:
+            statistics = self.pairs[trading_pair] = PairStatistics(
+                self.window, self.halflife,
+                self.order_books.book(trading_pair)
+                if self.order_books is not None else None)
+        return statistics
+
+    def add(self, offer):
+        self.pair(offer.trading_pair).add(offer)
+
+    def remove(self, removal):
+        """Stops counting a removed offer, looking it up in all pairs if the
+        removal does not tell its trading pair."""
+        statistics = self.pairs.get(removal.trading_pair)
+        if statistics is not None:
+            statistics.remove(removal)
+            return
+        for statistics in self.pairs.values():
+            if statistics.remove(removal):
+                return
+
+    def snapshot(self):
+        """The statistics of all pairs as JSON compatible dict."""
+        return {trading_pair.value: statistics.snapshot()
+                for trading_pair, statistics in self.pairs.items()}
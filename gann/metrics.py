@@ -0,0 +1,260 @@
+"""Latency histograms and counters of the live trader.
+
+Latencies are recorded in nanoseconds into log-linear histograms, like HDR
+histograms do: values are grouped into buckets whose width grows with the
+value, so that each bucket is within about 1% of the values it counts, no
+matter if they are microseconds or seconds, while recording stays a few
+integer operations.
+
+Everything is exposed in Prometheus' text format, either over HTTP or by
+writing it to a file periodically. Code on the hot path checks
+`Metrics.enabled` first, so that disabled metrics cost next to nothing.
+"""
+import http.server
+import logging
+import os
+import threading
+import time
+
+from pathlib import Path
+
+log = logging.getLogger('gann')
+
+# Bits of the values kept per bucket, 2^7 buckets per power of two
+SUB_BUCKET_BITS = 7
+# Highest trackable value is about 2^40 ns, roughly 18 minutes
+MAX_VALUE_BITS = 40
+
+# Upper bounds in seconds of the buckets exposed to Prometheus
+EXPOSED_BUCKETS = tuple(factor * 10.0 ** exponent
+                        for exponent in range(-6, 1)
+                        for factor in (1, 2.5, 5)) + (10.0,)
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+class Histogram:
+    """Counts values in log-linear buckets.
+
+    :param int sub_bucket_bits: The precision, buckets are within
+    `2 ** -(sub_bucket_bits - 1)` of their values.
+    :param int max_value_bits: Larger values are counted as the largest
+    trackable one.
+    """
+    def __init__(self, sub_bucket_bits: int = SUB_BUCKET_BITS,
+                 max_value_bits: int = MAX_VALUE_BITS):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_buckets = 1 << sub_bucket_bits
+        self.half = self.sub_buckets >> 1
+        self.max_value = (1 << max_value_bits) - 1
+        self.counts = [0] * self.index(self.max_value) + [0]
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def index(self, value: int):
+        """The bucket of a non-negative integer value."""
+        if value < self.sub_buckets:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return self.sub_buckets + (shift - 1) * self.half \
+            + (value >> shift) - self.half
+
+    def lowest(self, index: int):
+        """The smallest value of a bucket."""
+        if index < self.sub_buckets:
+            return index
+        shift, offset = divmod(index - self.sub_buckets, self.half)
+        return (offset + self.half) << (shift + 1)
+
+    def highest(self, index: int):
+        """The largest value of a bucket."""
+        return self.lowest(index + 1) - 1
+
+    def record(self, value: int):
+        value = min(max(int(value), 0), self.max_value)
+        self.counts[self.index(value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, quantile: float):
+        """The value, which `quantile` of the recorded values do not exceed,
+        at the precision of the buckets."""
+        if self.count == 0:
+            return 0
+        rank = max(int(quantile * self.count + 0.5), 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.highest(index), self.max)
+        return self.max
+
+    def count_below(self, value: int):
+        """How many values were at most `value`, counting the bucket of
+        `value` completely."""
+        return sum(self.counts[:self.index(min(value, self.max_value)) + 1])
+
+class Metrics:
+    """The latency histograms by stage and counters by name and labels.
+
+    :param bool enabled: Whether to record anything at all.
+    :param clock: Returns monotonic timestamps in nanoseconds.
+    """
+    def __init__(self, enabled: bool = True, clock=time.monotonic_ns):
+        self.enabled = enabled
+        self.clock = clock
+        self.histograms = dict()
+        self.counters = dict()
+        self.lock = threading.Lock()
+        self.server = None
+        self.dumper = None
+
+    def observe(self, stage: str, nanoseconds: int):
+        """Records a latency of a stage."""
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.record(nanoseconds)
+
+    def since(self, stage: str, started: int):
+        """Records the time passed since `started`, a timestamp of `clock`."""
+        self.observe(stage, self.clock() - started)
+
+    def increment(self, name: str, amount: int = 1, **labels):
+        """Increments a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def counter(self, name: str, **labels):
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render(self):
+        """All metrics in Prometheus' text format."""
+        lines = []
+        with self.lock:
+            if self.histograms:
+                lines.append('# TYPE gann_latency_seconds histogram')
+            for stage, histogram in sorted(self.histograms.items()):
+                for bound in EXPOSED_BUCKETS:
+                    lines.append(
+                        'gann_latency_seconds_bucket{stage="%s",le="%g"} %i'
+                        % (stage, bound,
+                           histogram.count_below(int(bound * 1e9))))
+                lines.append(
+                    'gann_latency_seconds_bucket{stage="%s",le="+Inf"} %i'
+                    % (stage, histogram.count))
+                lines.append('gann_latency_seconds_sum{stage="%s"} %.9f'
+                             % (stage, histogram.sum / 1e9))
+                lines.append('gann_latency_seconds_count{stage="%s"} %i'
+                             % (stage, histogram.count))
+
+            if self.histograms:
+                lines.append('# TYPE gann_latency_quantile_seconds gauge')
+            for stage, histogram in sorted(self.histograms.items()):
+                for quantile in QUANTILES:
+                    lines.append(
+                        'gann_latency_quantile_seconds'
+                        '{stage="%s",quantile="%g"} %.9f'
+                        % (stage, quantile,
+                           histogram.percentile(quantile) / 1e9))
+
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append('# TYPE gann_%s counter' % name)
+                for (counter, labels), value in sorted(
+                        self.counters.items()):
+                    if counter != name:
+                        continue
+                    text = ','.join('%s="%s"' % label for label in labels)
+                    lines.append('gann_%s%s %i' % (
+                        name, '{%s}' % text if text else '', value))
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port: int, host: str = '127.0.0.1'):
+        """Serves the metrics over HTTP in a background thread."""
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever,
+                         name='metrics server', daemon=True).start()
+        return self.server
+
+    def dump(self, path):
+        """Writes the metrics to a file, replacing it atomically."""
+        path = Path(path)
+        temporary = path.with_name(path.name + '.tmp')
+        temporary.write_text(self.render())
+        os.replace(temporary, path)
+
+    def dump_every(self, path, interval: float):
+        """Writes the metrics to a file every `interval` seconds in a
+        background thread."""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.dump(path)
+                except OSError as e:
+                    log.warning("Failed to write metrics to %s: %s", path, e)
+
+        self.dumper = threading.Thread(target=run, name='metrics dump',
+                                       daemon=True)
+        self.dumper.start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+# Used wherever no metrics are given
+DISABLED = Metrics(enabled=False)
+
+class InstrumentedBroker:
+    """Wraps a broker to time its trades and count their outcomes.
+
+    :param broker: The broker to forward to.
+    :param Metrics metrics: Where to record.
+    """
+    def __init__(self, broker, metrics: Metrics):
+        self.broker = broker
+        self.metrics = metrics
+
+    def _call(self, operation, function, offer, amount):
+        metrics = self.metrics
+        started = metrics.clock()
+        try:
+            result = function(offer, amount)
+        except Exception:
+            metrics.since('broker_' + operation, started)
+            metrics.increment('broker_requests_total', operation=operation,
+                              outcome='error')
+            raise
+        metrics.since('broker_' + operation, started)
+        metrics.increment('broker_requests_total', operation=operation,
+                          outcome='success' if result else 'failed')
+        return result
+
+    def try_buy(self, offer, amount):
+        return self._call('buy', self.broker.try_buy, offer, amount)
+
+    def try_sell(self, offer, amount):
+        return self._call('sell', self.broker.try_sell, offer, amount)
+
+    def __getattr__(self, name):
+        return getattr(self.broker, name)
@@ -1,5 +1,8 @@
+import time
+
 from dataclasses import dataclass
 from datetime import datetime
+from typing import NamedTuple
 
 from enum import Enum, unique
 from gann.trading_pair import TradingPair
@@ -20,6 +23,13 @@ class OfferType(Enum):
     def __str__(self):
         return str(self.value)
 
+# Enum lookups by value are slow, these are used for every event
+PAYMENT_OPTIONS = tuple(PaymentOption)
+OFFER_TYPES_BY_VALUES = {offer_type.value: offer_type
+                         for offer_type in OfferType}
+TRADING_PAIRS_BY_VALUES = {trading_pair.value: trading_pair
+                           for trading_pair in TradingPair}
+
 def offer_bitcoin_de(offer_dict):
     """Factory method to create an offer using the data  provided by
     bitcoin.de's websocket.
@@ -31,10 +41,23 @@ def offer_bitcoin_de(offer_dict):
         float(offer_dict['amount']),
         float(offer_dict['min_amount']),
         int(float(offer_dict['price']) * 100),
-        OfferType(offer_dict['order_type']),
-        TradingPair(offer_dict['trading_pair']),
+        OFFER_TYPES_BY_VALUES[offer_dict['order_type']],
+        TRADING_PAIRS_BY_VALUES[offer_dict['trading_pair']],
         datetime.now(),
-        list(PaymentOption)[int(offer_dict['payment_option'])]
+        PAYMENT_OPTIONS[int(offer_dict['payment_option'])]
+    )
+
+def compact_offer_bitcoin_de(offer_dict):
+    """Like `offer_bitcoin_de`, but creates a `CompactOffer`."""
+    return CompactOffer(
+        offer_dict['order_id'],
+        float(offer_dict['amount']),
+        float(offer_dict['min_amount']),
+        int(float(offer_dict['price']) * 100),
+        OFFER_TYPES_BY_VALUES[offer_dict['order_type']],
+        TRADING_PAIRS_BY_VALUES[offer_dict['trading_pair']],
+        time.time(),
+        PAYMENT_OPTIONS[int(offer_dict['payment_option'])]
     )
 
 @dataclass(frozen=True)
@@ -72,3 +95,35 @@ class Offer:
                                                         self.price/100.0,
                                                         self.trading_pair.value)
 
+    @property
+    def timestamp(self):
+        """`date` as seconds since the epoch."""
+        return self.date.timestamp()
+
+class CompactOffer(NamedTuple):
+    """An offer as plain tuple, which is cheaper to create and smaller than
+    an `Offer`. It has the same attributes, but keeps the point in time it
+    appeared as seconds since the epoch and creates the `date` on access.
+
+    Use it where many offers are created and most are only looked at, like
+    when receiving or replaying events. `to_offer` converts it.
+    """
+    order_id: str
+    amount: float
+    min_amount: float
+    price: int
+    type: OfferType
+    trading_pair: TradingPair
+    timestamp: float
+    payment_option: PaymentOption = PaymentOption.NA
+
+    @property
+    def date(self):
+        return datetime.fromtimestamp(self.timestamp)
+
+    def to_offer(self):
+        return Offer(self.order_id, self.amount, self.min_amount, self.price,
+                     self.type, self.trading_pair, self.date,
+                     self.payment_option)
+
+    __str__ = Offer.__str__
@@ -0,0 +1,142 @@
+"""Live order books built from offers and their removals."""
+from bisect import bisect_left, insort
+
+from gann.offer import Offer, OfferType
+from gann.removal import Removal
+from gann.trading_pair import TradingPair
+
+class BookSide:
+    """The offers of one side of an order book, grouped by price."""
+    def __init__(self):
+        self._prices = []
+        self._levels = dict()
+        self._depths = dict()
+
+    def add(self, order_id: str, price: int, amount: float):
+        level = self._levels.get(price)
+        if level is None:
+            level = self._levels[price] = dict()
+            self._depths[price] = 0.0
+            insort(self._prices, price)
+        level[order_id] = amount
+        self._depths[price] += amount
+
+    def remove(self, order_id: str, price: int):
+        level = self._levels[price]
+        self._depths[price] -= level.pop(order_id)
+        if not level:
+            del self._levels[price]
+            del self._depths[price]
+            del self._prices[bisect_left(self._prices, price)]
+
+    def lowest(self):
+        return self._prices[0] if self._prices else None
+
+    def highest(self):
+        return self._prices[-1] if self._prices else None
+
+    def depth(self, price: int):
+        """The amount of coins offered at exactly `price`."""
+        return self._depths.get(price, 0.0)
+
+    def levels(self, descending=False):
+        """Yields tuples of prices and the amount offered at them."""
+        prices = reversed(self._prices) if descending else self._prices
+        for price in prices:
+            yield price, self._depths[price]
+
+    def __len__(self):
+        return sum(len(level) for level in self._levels.values())
+
+class OrderBook:
+    """The offers of one trading pair, which have not been removed yet.
+
+    Bids are the offers of those who want to buy coins (`OfferType.BUY`),
+    asks those of who want to sell them (`OfferType.SELL`).
+
+    :param TradingPair trading_pair: The pair of the offers.
+    """
+    def __init__(self, trading_pair: TradingPair):
+        self.trading_pair = trading_pair
+        self.bids = BookSide()
+        self.asks = BookSide()
+        self.offers = dict()
+
+    def side(self, offer_type: OfferType):
+        return self.bids if offer_type == OfferType.BUY else self.asks
+
+    def add(self, offer: Offer):
+        # bitcoin.de sends offers again from time to time
+        if offer.order_id in self.offers:
+            self.remove_order(offer.order_id)
+        self.offers[offer.order_id] = offer
+        self.side(offer.type).add(offer.order_id, offer.price, offer.amount)
+
+    def remove_order(self, order_id: str):
+        """Removes an offer, returns it or `None` if it is unknown."""
+        offer = self.offers.pop(order_id, None)
+        if offer is not None:
+            self.side(offer.type).remove(order_id, offer.price)
+        return offer
+
+    def best_bid(self):
+        """The highest price someone wants to buy for or `None`."""
+        return self.bids.highest()
+
+    def best_ask(self):
+        """The lowest price someone wants to sell for or `None`."""
+        return self.asks.lowest()
+
+    def spread(self):
+        """The difference of best ask and best bid or `None`."""
+        bid = self.best_bid()
+        ask = self.best_ask()
+        if bid is None or ask is None:
+            return None
+        return ask - bid
+
+    def depth(self, offer_type: OfferType, price: int):
+        """The amount of coins offered at a price."""
+        return self.side(offer_type).depth(price)
+
+    def snapshot(self, levels: int = None):
+        """The best price levels of both sides as JSON compatible dict."""
+        bids = list(self.bids.levels(descending=True))[:levels]
+        asks = list(self.asks.levels())[:levels]
+        return {'trading_pair': self.trading_pair.value,
+                'bids': [[price, amount] for price, amount in bids],
+                'asks': [[price, amount] for price, amount in asks]}
+
+    def __len__(self):
+        return len(self.offers)
+
+class OrderBooks:
+    """An order book for each trading pair."""
+    def __init__(self):
+        self.books = dict()
+        self.trading_pairs = dict()
+
+    def book(self, trading_pair: TradingPair):
+        book = self.books.get(trading_pair)
+        if book is None:
+            book = self.books[trading_pair] = OrderBook(trading_pair)
+        return book
+
+    def add(self, offer: Offer):
+        previous = self.trading_pairs.get(offer.order_id)
+        if previous is not None and previous != offer.trading_pair:
+            self.books[previous].remove_order(offer.order_id)
+        self.trading_pairs[offer.order_id] = offer.trading_pair
+        self.book(offer.trading_pair).add(offer)
+
+    def remove(self, removal: Removal):
+        """Removes an offer, returns it or `None` if it is unknown."""
+        # Removals do not always tell their trading pair
+        trading_pair = self.trading_pairs.pop(removal.order_id, None)
+        if trading_pair is None:
+            return None
+        return self.books[trading_pair].remove_order(removal.order_id)
+
+    def snapshot(self, levels: int = None):
+        """The best price levels of all books as JSON compatible list."""
+        return [book.snapshot(levels) for book in self.books.values()]
@@ -0,0 +1,302 @@
+"""An on-disk index of the order ids of a sniffed `Archive`.
+
+bitcoin.de re-emits offers and the sniffer reconnects and rotates files, so
+the same order id shows up several times across the archive's files. The
+index maps each order id to where the offer was added first and where it was
+removed first, along with how often either happened, so that tools can
+deduplicate events, compute lifetimes of offers or join offers with their
+removals in bounded memory.
+
+The ids are hash-partitioned into buckets, each stored as `.npy` array of
+`ORDER_INDEX_DTYPE` sorted by order id. Lookups map a bucket into memory and
+binary search it. Locations are given as the number of a file of the
+index's manifest and the number of the record within the file.
+
+Building the index spills the ids of each bucket into a temporary file first
+and sorts one bucket at a time, so memory is bounded by the size of the
+largest bucket rather than by the size of the archive.
+"""
+import json
+import logging
+import tempfile
+
+from pathlib import Path
+
+import numpy as np
+
+from gann.query import ArchiveFile, archive_file_date
+from gann.serialization import EVENT_TYPE
+
+log = logging.getLogger('gann')
+
+ORDER_INDEX_VERSION = 1
+# Default number of buckets the ids are partitioned into
+BUCKETS = 256
+# Records read from an archive's file at once while building
+CHUNK_SIZE = 1 << 20
+# Name of the index within an archive's directory by default
+ORDER_INDEX_NAME = 'order_index'
+MANIFEST_NAME = 'manifest.json'
+
+# Locations of offers never added or removed within the archive
+NOWHERE = -1
+
+ORDER_INDEX_DTYPE = np.dtype([
+    ('order_id', 'S6'),
+    # Where and when the offer was added first
+    ('added_file', '<i4'),
+    ('added_record', '<i8'),
+    ('added_at', '<f8'),
+    # How often the offer was added
+    ('adds', '<u4'),
+    # Where and when the offer was removed first
+    ('removed_file', '<i4'),
+    ('removed_record', '<i8'),
+    ('removed_at', '<f8'),
+    # How often the offer was removed
+    ('removals', '<u4')])
+
+# The events of one bucket before they are sorted
+_SPILL_DTYPE = np.dtype([
+    ('order_id', 'S6'),
+    ('event', 'u1'),
+    ('file', '<i4'),
+    ('record', '<i8'),
+    ('timestamp', '<f8')])
+
+def bucket_of(order_ids, buckets):
+    """The buckets of an array of order ids by their FNV-1a hash."""
+    raw = np.frombuffer(np.ascontiguousarray(order_ids, dtype='S6').tobytes(),
+                        dtype=np.uint8).reshape(-1, 6)
+    hashes = np.full(len(raw), 2166136261, dtype=np.uint64)
+    for column in raw.T:
+        hashes = ((hashes ^ column) * np.uint64(16777619)) \
+            & np.uint64(0xffffffff)
+    return (hashes % np.uint64(buckets)).astype(np.intp)
+
+def _bucket_path(directory, bucket):
+    return directory / ('bucket_%05i.npy' % bucket)
+
+def _first_of_groups(groups, count):
+    """The position of the first element of each group of a sorted array of
+    group numbers, `-1` for absent groups, and the size of each group."""
+    first = np.full(count, -1, dtype=np.intp)
+    numbers, positions = np.unique(groups, return_index=True)
+    first[numbers] = positions
+    return first, np.bincount(groups, minlength=count)
+
+def _entries(spill):
+    """Reduces the events of a bucket to its sorted entries."""
+    spill = spill[np.argsort(spill['order_id'], kind='stable')]
+    order_ids = spill['order_id']
+    # Events of the same id are in time order, the first ones start groups
+    starts = np.ones(len(spill), dtype=bool)
+    starts[1:] = order_ids[1:] != order_ids[:-1]
+    groups = np.cumsum(starts) - 1
+
+    entries = np.zeros(int(starts.sum()), dtype=ORDER_INDEX_DTYPE)
+    entries['order_id'] = order_ids[starts]
+
+    for event, prefix, counter in ((EVENT_TYPE.ADDED, 'added_', 'adds'),
+                                   (EVENT_TYPE.REMOVED, 'removed_',
+                                    'removals')):
+        mask = spill['event'] == event.value
+        first, counts = _first_of_groups(groups[mask], len(entries))
+        found = first >= 0
+        events = spill[mask]
+        entries[prefix + 'file'] = NOWHERE
+        entries[prefix + 'record'] = NOWHERE
+        entries[prefix + 'at'] = np.nan
+        entries[prefix + 'file'][found] = events['file'][first[found]]
+        entries[prefix + 'record'][found] = events['record'][first[found]]
+        entries[prefix + 'at'][found] = events['timestamp'][first[found]]
+        entries[counter] = counts
+    return entries
+
+def build_order_index(archive, directory=None, buckets=BUCKETS,
+                      chunk_size=CHUNK_SIZE):
+    """Indexes the order ids of all files of an archive, replacing an
+    existing index. Files are expected in time order, as `Archive` lists
+    them, so that the first events of each id are the earliest.
+
+    :param Archive archive: The archive to index.
+    :param directory: Where to store the index, `order_index` within the
+    archive's directory by default.
+    :param int buckets: How many buckets to partition the ids into.
+    :param int chunk_size: How many records to read at once.
+    :returns: The `OrderIndex`.
+    """
+    directory = Path(directory if directory is not None
+                     else archive.directory / ORDER_INDEX_NAME)
+    directory.mkdir(parents=True, exist_ok=True)
+    for path in directory.glob('bucket_*.npy'):
+        path.unlink()
+
+    files = []
+    with tempfile.TemporaryDirectory(dir=directory) as temporary:
+        spills = Path(temporary)
+        for number, file in enumerate(archive.files):
+            records = file.records()
+            files.append((str(file.path.relative_to(archive.directory)),
+                          len(records)))
+            for offset in range(0, len(records), chunk_size):
+                chunk = records[offset:offset + chunk_size]
+                spill = np.empty(len(chunk), dtype=_SPILL_DTYPE)
+                spill['order_id'] = chunk['order_id']
+                spill['event'] = chunk['event']
+                spill['file'] = number
+                spill['record'] = np.arange(offset, offset + len(chunk))
+                spill['timestamp'] = chunk['timestamp']
+
+                targets = bucket_of(spill['order_id'], buckets)
+                order = np.argsort(targets, kind='stable')
+                spill = spill[order]
+                targets = targets[order]
+                bounds = np.searchsorted(targets, np.arange(buckets + 1))
+                for bucket in np.flatnonzero(np.diff(bounds)):
+                    with (spills / str(bucket)).open('ab') as output:
+                        spill[bounds[bucket]:bounds[bucket + 1]].tofile(
+                            output)
+
+        ids = 0
+        for bucket in range(buckets):
+            path = spills / str(bucket)
+            spill = (np.fromfile(path, dtype=_SPILL_DTYPE) if path.exists()
+                     else np.empty(0, dtype=_SPILL_DTYPE))
+            entries = _entries(spill)
+            np.save(_bucket_path(directory, bucket), entries)
+            ids += len(entries)
+
+    with (directory / MANIFEST_NAME).open('w') as manifest:
+        json.dump({'version': ORDER_INDEX_VERSION,
+                   'archive': str(Path(archive.directory).resolve()),
+                   'buckets': buckets,
+                   'files': files}, manifest)
+    log.info("Indexed %i order ids of %i files", ids, len(files))
+    return OrderIndex(directory)
+
+class OrderIndex:
+    """An index written by `build_order_index`.
+
+    :param directory: The index's directory.
+    :param archive: The indexed archive's directory, if it moved since
+    indexing.
+    """
+    def __init__(self, directory, archive=None):
+        self.directory = Path(directory)
+        manifest = json.loads((self.directory / MANIFEST_NAME).read_text())
+        if manifest.get('version') != ORDER_INDEX_VERSION:
+            raise ValueError("Order index %s is of another version"
+                             % self.directory)
+        self.archive = Path(archive if archive is not None
+                            else manifest['archive'])
+        self.buckets = manifest['buckets']
+        # The indexed files and their number of records by file numbers
+        self.files = [ArchiveFile(self.archive / name,
+                                  archive_file_date(name))
+                      for name, _ in manifest['files']]
+        self.counts = [count for _, count in manifest['files']]
+        self._buckets = dict()
+
+    def bucket(self, bucket):
+        """The entries of a bucket, mapped into memory."""
+        entries = self._buckets.get(bucket)
+        if entries is None:
+            entries = self._buckets[bucket] = np.load(
+                _bucket_path(self.directory, bucket), mmap_mode='r')
+        return entries
+
+    def entries(self):
+        """Lazily yields the entries of each bucket, all ids once in the
+        end."""
+        for bucket in range(self.buckets):
+            yield self.bucket(bucket)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.entries())
+
+    def lookup(self, order_id):
+        """The entry of an order id or `None`, if it's not in the archive."""
+        key = (order_id.encode('utf-8') if isinstance(order_id, str)
+               else order_id)[:6]
+        entries = self.bucket(int(bucket_of(np.array([key], dtype='S6'),
+                                            self.buckets)[0]))
+        i = int(np.searchsorted(entries['order_id'], key))
+        if i < len(entries) and entries['order_id'][i] == key:
+            return entries[i]
+        return None
+
+    def locate(self, order_ids):
+        """The entries of an array of order ids along with a mask of the ids
+        found. Entries of ids not found are undefined."""
+        result = np.zeros(len(order_ids), dtype=ORDER_INDEX_DTYPE)
+        found = np.zeros(len(order_ids), dtype=bool)
+        targets = bucket_of(order_ids, self.buckets)
+        for bucket in np.unique(targets):
+            members = np.flatnonzero(targets == bucket)
+            keys = order_ids[members]
+            entries = self.bucket(int(bucket))
+            if not len(entries):
+                continue
+            positions = np.minimum(np.searchsorted(entries['order_id'], keys),
+                                   len(entries) - 1)
+            matches = entries['order_id'][positions] == keys
+            result[members[matches]] = entries[positions[matches]]
+            found[members[matches]] = True
+        return result, found
+
+    def record(self, file, record):
+        """A single record of the archive by its location."""
+        return self.files[file].records()[record]
+
+    def added(self, entry):
+        """The record of an entry's first add or `None`."""
+        if entry['added_file'] == NOWHERE:
+            return None
+        return self.record(entry['added_file'], entry['added_record'])
+
+    def removed(self, entry):
+        """The record of an entry's first removal or `None`."""
+        if entry['removed_file'] == NOWHERE:
+            return None
+        return self.record(entry['removed_file'], entry['removed_record'])
+
+    def deduplicated(self, chunk_size=CHUNK_SIZE):
+        """Lazily yields the records of the indexed files without re-emitted
+        offers and repeated removals, one array of `RECORD_DTYPE` per chunk
+        of a file."""
+        for number, file in enumerate(self.files):
+            records = file.records()[:self.counts[number]]
+            for offset in range(0, len(records), chunk_size):
+                chunk = records[offset:offset + chunk_size]
+                entries, _ = self.locate(chunk['order_id'])
+                positions = np.arange(offset, offset + len(chunk))
+                added = chunk['event'] == EVENT_TYPE.ADDED.value
+                keep = np.where(
+                    added,
+                    (entries['added_file'] == number)
+                    & (entries['added_record'] == positions),
+                    (entries['removed_file'] == number)
+                    & (entries['removed_record'] == positions))
+                if keep.all():
+                    yield chunk
+                elif keep.any():
+                    yield chunk[keep]
+
+    def joined(self):
+        """Lazily yields the entries of the offers, which were added and
+        removed within the archive, per bucket."""
+        for entries in self.entries():
+            yield entries[(entries['added_file'] != NOWHERE)
+                          & (entries['removed_file'] != NOWHERE)]
+
+    def lifetimes(self):
+        """Lazily yields the seconds from adding offers until removing them
+        per bucket, see `joined`."""
+        for entries in self.joined():
+            yield entries['removed_at'] - entries['added_at']
+
+def open_order_index(archive_directory):
+    """Opens the index stored within an archive's directory."""
+    return OrderIndex(Path(archive_directory) / ORDER_INDEX_NAME,
+                      archive_directory)
@@ -0,0 +1,325 @@
+"""Time range queries over directories of files written by `bin/sniffer`.
+
+The sniffer either writes all events into the directory itself or shards
+them into one subdirectory per trading pair, like `btceur`, or per trading
+pair and offer type, like `btceur_buy`. Queries only read the shards which
+may contain matching events.
+
+bitcoin.de does not tell the trading pair of removals. The sniffer takes it
+from the removed offer, if it saw the offer. Removals of offers it did not
+see keep the pair `TradingPair.UNKNOWN` and end up in the `unknown` shards,
+so queries of a trading pair include them, unless only asking for offers."""
+import mmap
+import re
+
+from bisect import bisect_right
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from gann.block_archive import is_block_format, read_blocks
+from gann.offer import OFFER_TYPES_BY_VALUES, TRADING_PAIRS_BY_VALUES
+from gann.removal import CompactRemoval, Removal
+from gann.trading_pair import TradingPair
+from gann.serialization import (concatenate_records, deserialize_records,
+                                is_current_format,
+                                iter_events, seek_time, records_view,
+                                EVENT_TYPE, HEADER_STRUCT, RECORD_DTYPE,
+                                INDEXES_BY_OFFER_TYPES,
+                                INDEXES_TRADING_PAIRS_INDEXES)
+
+ARCHIVE_FILE_PATTERN = re.compile(
+    r'^sniffed_since_(\d{4}-\d{2}-\d{2}_\d{2}:\d{2}:\d{2})(_\d+)?$')
+ARCHIVE_DATE_FORMAT = '%Y-%m-%d_%H:%M:%S'
+
+def archive_file_date(path):
+    """Returns the creation date encoded in the name of a sniffed file or
+    `None` if `path` is not named like one."""
+    match = ARCHIVE_FILE_PATTERN.match(Path(path).name)
+    if match is None:
+        return None
+    return datetime.strptime(match.group(1), ARCHIVE_DATE_FORMAT)
+
+def shard_name(trading_pair, offer_type=None):
+    """The name of the subdirectory holding the events of a trading pair and
+    optionally only those of an offer type."""
+    if offer_type is None:
+        return trading_pair.value
+    return '%s_%s' % (trading_pair.value, offer_type.value)
+
+def shard_of(event, by_type=False):
+    """The trading pair and, if `by_type`, the offer type of the shard an
+    offer or a removal belongs to, see `shard_name`."""
+    if not by_type:
+        return event.trading_pair, None
+    offer_type = (event.offer_type if isinstance(event, (Removal,
+                                                         CompactRemoval))
+                  else event.type)
+    return event.trading_pair, offer_type
+
+def parse_shard_name(name):
+    """Returns the trading pair and offer type, which may be `None`, of a
+    shard's subdirectory or `None` if `name` is not named like one."""
+    pair, _, offer_type = name.partition('_')
+    if pair not in TRADING_PAIRS_BY_VALUES:
+        return None
+    if not offer_type:
+        return TRADING_PAIRS_BY_VALUES[pair], None
+    if offer_type not in OFFER_TYPES_BY_VALUES:
+        return None
+    return TRADING_PAIRS_BY_VALUES[pair], OFFER_TYPES_BY_VALUES[offer_type]
+
+def _files_between(files, start=None, end=None):
+    """Returns the files of a sorted list, which may contain events of the
+    time range."""
+    starts = [file.created.timestamp() for file in files]
+    first = 0
+    last = len(files)
+    if start is not None:
+        first = max(bisect_right(starts, _timestamp(start)) - 1, 0)
+    if end is not None:
+        last = bisect_right(starts, _timestamp(end))
+    return files[first:last]
+
+def _timestamp(date):
+    """Accepts datetimes and timestamps alike."""
+    if isinstance(date, datetime):
+        return date.timestamp()
+    return date
+
+class ArchiveFile:
+    """A single sniffed file, mapped into memory on first use.
+
+    :param Path path: The file's location.
+    :param datetime created: When the sniffer started writing it.
+    :param TradingPair trading_pair: The only trading pair of the file's
+    events, if it's part of a shard.
+    :param OfferType offer_type: The only offer type of the file's events,
+    if it's part of a shard by offer type.
+    """
+    def __init__(self, path, created, trading_pair=None, offer_type=None):
+        self.path = path
+        self.created = created
+        self.trading_pair = trading_pair
+        self.offer_type = offer_type
+        self._data = None
+        self._records = None
+
+    def data(self):
+        """The memory mapped content of the file."""
+        if self._data is None:
+            with self.path.open('rb') as file:
+                if file.seek(0, 2) == 0:
+                    self._data = b''
+                else:
+                    self._data = mmap.mmap(file.fileno(), 0,
+                                           access=mmap.ACCESS_READ)
+        return self._data
+
+    def records(self):
+        """All records of the file as array of `RECORD_DTYPE`. For files of
+        the current layout it's a view on the mapped memory, legacy files
+        and block archives are converted once."""
+        if self._records is None:
+            data = self.data()
+            if len(data) == 0:
+                self._records = np.empty(0, dtype=RECORD_DTYPE)
+            elif is_block_format(data[:HEADER_STRUCT.size]):
+                self._records = concatenate_records(list(read_blocks(data)))
+            elif is_current_format(data[:HEADER_STRUCT.size]):
+                self._records = records_view(data)
+            else:
+                self._records = deserialize_records(data)
+        return self._records
+
+    def between(self, start=None, end=None, trading_pair=None):
+        """Returns a view of the records with `start <= timestamp < end`.
+
+        For block archives, blocks without `trading_pair`, or without any of
+        several pairs, are skipped and a copy of the other blocks' records is
+        returned."""
+        data = self.data()
+        if is_block_format(data[:HEADER_STRUCT.size]):
+            return concatenate_records(list(read_blocks(data, start, end,
+                                                 trading_pair)))
+
+        records = self.records()
+        current = (len(data) > 0
+                   and is_current_format(data[:HEADER_STRUCT.size]))
+
+        first = 0
+        last = len(records)
+        if start is not None:
+            first = (seek_time(data, start) if current else int(
+                np.searchsorted(records['timestamp'], start, side='left')))
+        if end is not None:
+            last = (seek_time(data, end) if current else int(
+                np.searchsorted(records['timestamp'], end, side='left')))
+        return records[first:max(first, last)]
+
+    def close(self):
+        """Unmaps the file, which is mapped again on next use. Arrays still
+        viewing its memory keep it mapped until they are gone."""
+        data = self._data
+        self._data = None
+        self._records = None
+        if isinstance(data, mmap.mmap):
+            try:
+                data.close()
+            except BufferError:
+                pass
+
+    def __repr__(self):
+        return "ArchiveFile(%s)" % self.path
+
+def _sorted_files(directory, trading_pair=None, offer_type=None):
+    files = []
+    for path in directory.iterdir():
+        created = archive_file_date(path)
+        if created is not None and path.is_file():
+            files.append(ArchiveFile(path, created, trading_pair, offer_type))
+    return sorted(files, key=lambda file: (file.created, file.path.name))
+
+class Archive:
+    """All sniffed files of a directory and its shards, ordered by their
+    creation date.
+
+    Each file is expected to hold the events of its shard from its creation
+    until the creation of the shard's next file in time order, which allows
+    to pick the files of a time range by their names and binary search within
+    them.
+
+    :param directory: The directory the sniffer writes to.
+    """
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        # The files of each shard by trading pair and offer type, files of
+        # the directory itself are found at `(None, None)`
+        self.shards = dict()
+        files = _sorted_files(self.directory)
+        if files:
+            self.shards[None, None] = files
+        for path in sorted(self.directory.iterdir()):
+            shard = parse_shard_name(path.name)
+            if shard is not None and path.is_dir():
+                files = _sorted_files(path, *shard)
+                if files:
+                    self.shards[shard] = files
+
+        self.files = sorted((file for files in self.shards.values()
+                             for file in files),
+                            key=lambda file: (file.created, file.path.name))
+
+    def close(self):
+        """Unmaps all files, see `ArchiveFile.close`."""
+        for file in self.files:
+            file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def files_between(self, start=None, end=None):
+        """Returns the files which may contain events of the time range."""
+        return _files_between(self.files, start, end)
+
+    def shards_of(self, trading_pair=None, offer_type=None, event=None):
+        """Returns the files of each shard, which may contain events of the
+        trading pair, offer type and event type. Shards of removals of an
+        unknown trading pair are included for all pairs."""
+        return [files for (pair, shard_type), files in self.shards.items()
+                if (pair is None or trading_pair is None
+                    or pair == trading_pair
+                    or (pair == TradingPair.UNKNOWN
+                        and event != EVENT_TYPE.ADDED))
+                and (shard_type is None or offer_type is None
+                     or shard_type == offer_type)]
+
+    def _select(self, file, start, end, trading_pair, offer_type, event):
+        """The records of a file in the time range matching the filters,
+        which do not hold for the whole file anyway."""
+        # Removals of an unknown pair may be of any pair
+        unknown = trading_pair is not None and event != EVENT_TYPE.ADDED
+        records = file.between(start, end,
+                               (trading_pair, TradingPair.UNKNOWN)
+                               if unknown else trading_pair)
+
+        mask = None
+        if trading_pair is not None and file.trading_pair != trading_pair:
+            mask = records['trading_pair'] \
+                == INDEXES_TRADING_PAIRS_INDEXES[trading_pair]
+            if unknown:
+                mask |= ((records['trading_pair']
+                          == INDEXES_TRADING_PAIRS_INDEXES[
+                              TradingPair.UNKNOWN])
+                         & (records['event'] == EVENT_TYPE.REMOVED.value))
+        if offer_type is not None and file.offer_type is None:
+            matches = records['type'] \
+                == INDEXES_BY_OFFER_TYPES[offer_type]
+            mask = matches if mask is None else mask & matches
+        if event is not None:
+            matches = records['event'] == event.value
+            mask = matches if mask is None else mask & matches
+        if mask is not None:
+            records = records[mask]
+        return records
+
+    def records(self, start=None, end=None, trading_pair=None,
+                offer_type=None, event=None):
+        """Lazily yields one array of `RECORD_DTYPE` per file with the records
+        of the given time range, which match all given filters.
+
+        Without filters the arrays are views on the mapped files, otherwise
+        copies of the matching records. Filters, which select whole shards,
+        do not count. If several shards are involved, the arrays hold the
+        merged records of each time span between the files' creation dates.
+
+        :param start: Include events at or after this datetime or timestamp.
+        :param end: Include events before this datetime or timestamp.
+        :param TradingPair trading_pair: Only events of this trading pair and
+        removals of an unknown pair.
+        :param OfferType offer_type: Only events of this offer type.
+        :param EVENT_TYPE event: Only offers or only removals.
+        """
+        start = _timestamp(start)
+        end = _timestamp(end)
+        filters = (trading_pair, offer_type, event)
+
+        shards = self.shards_of(trading_pair, offer_type, event)
+        if len(shards) == 1:
+            for file in _files_between(shards[0], start, end):
+                records = self._select(file, start, end, *filters)
+                if len(records):
+                    yield records
+            return
+
+        # Merge the shards span by span, so that only the files of one span
+        # are read at a time
+        bounds = sorted({file.created.timestamp()
+                         for files in shards for file in files
+                         if (start is None or file.created.timestamp() > start)
+                         and (end is None or file.created.timestamp() < end)})
+        for low, high in zip([start] + bounds, bounds + [end]):
+            chunks = [self._select(file, low, high, *filters)
+                      for files in shards
+                      for file in _files_between(files, low, high)]
+            records = concatenate_records([chunk for chunk in chunks
+                                           if len(chunk)])
+            if len(records):
+                yield records[np.argsort(records['timestamp'],
+                                         kind='stable')]
+
+    def events(self, *args, compact=False, **kwargs):
+        """Lazily yields offers and removals matching the criteria of
+        `records` in time order, see `iter_events` for `compact`."""
+        for records in self.records(*args, **kwargs):
+            yield from iter_events(records, compact=compact)
+
+    def offers(self, start=None, end=None, trading_pair=None,
+               offer_type=None, compact=False):
+        """Lazily yields offers matching the criteria in time order."""
+        return self.events(start, end, trading_pair, offer_type,
+                           EVENT_TYPE.ADDED, compact=compact)
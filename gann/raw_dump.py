@@ -0,0 +1,219 @@
+"""Converts raw dumps of bitcoin.de's websocket into version 2 files.
+
+A raw dump holds one event per line, either as JSON or as printed python
+dict, like `{'added': {...}}` or `{'removed': {...}}` with the data sent by
+the websocket. An optional top level `timestamp` tells when the event was
+received, lines without one get the modification time of their file.
+
+Files are split into chunks of whole lines, which are parsed by a pool of
+processes and written in their original order.
+"""
+import ast
+import json
+import logging
+import os
+import time
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+from gann.offer import OfferType
+from gann.serialization import (EventWriter, EVENT_TYPE, RECORD_DTYPE,
+                                RECORD_STRUCT, INDEXES_BY_OFFER_TYPES,
+                                INDEXES_TRADING_PAIRS_INDEXES)
+from gann.trading_pair import TradingPair
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+log = logging.getLogger('gann')
+
+# How many bytes of a raw dump a single job parses
+CHUNK_SIZE = 16 * 1024 * 1024
+
+_OFFER_TYPES = {offer_type.value: INDEXES_BY_OFFER_TYPES[offer_type]
+                for offer_type in OfferType}
+_TRADING_PAIRS = {trading_pair.value:
+                  INDEXES_TRADING_PAIRS_INDEXES[trading_pair]
+                  for trading_pair in TradingPair}
+
+@dataclass
+class ConversionStats:
+    """What a conversion did, durations are in seconds."""
+    bytes_read: int = 0
+    lines: int = 0
+    events: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+
+    def add(self, other):
+        self.bytes_read += other.bytes_read
+        self.lines += other.lines
+        self.events += other.events
+        self.errors += other.errors
+
+    def __str__(self):
+        seconds = max(self.seconds, 1e-9)
+        return ("%i events of %i lines (%i errors) in %.1f s, %.1f MB/s, "
+                "%.0f events/s" % (
+                    self.events, self.lines, self.errors, self.seconds,
+                    self.bytes_read / seconds / 1e6, self.events / seconds))
+
+def _literal_eval(line):
+    # Printed python dicts use single quotes
+    return ast.literal_eval(line.decode('utf-8'))
+
+class LineParser:
+    """Parses the lines of a raw dump into dicts, `None` for blank lines.
+
+    A dump is written in one format, so the parser sticks to the format of
+    the last line it parsed and only tries the other one, if that fails.
+    """
+    def __init__(self):
+        self.parsers = (loads, _literal_eval)
+
+    def __call__(self, line):
+        line = line.strip()
+        if not line:
+            return None
+        first, second = self.parsers
+        try:
+            return first(line)
+        except (ValueError, SyntaxError):
+            event = second(line)
+            self.parsers = (second, first)
+            return event
+
+def parse_line(line):
+    """Parses a single line of a raw dump, see `LineParser`."""
+    return LineParser()(line)
+
+def offer_record(data, timestamp):
+    """Packs the data of an `added` event like `offer_bitcoin_de` would."""
+    return RECORD_STRUCT.pack(
+        timestamp,
+        int(float(data['price']) * 100),
+        float(data['amount']),
+        float(data['min_amount']),
+        data['order_id'].encode('utf-8'),
+        b'',
+        EVENT_TYPE.ADDED.value,
+        _OFFER_TYPES[data['order_type']],
+        _TRADING_PAIRS[data['trading_pair']],
+        int(data['payment_option']))
+
+def removal_record(data, timestamp):
+    """Packs the data of a `removed` event like `removal_bitcoin_de` would."""
+    return RECORD_STRUCT.pack(
+        timestamp,
+        int(float(data.get('price', 0)) * 100),
+        float(data.get('amount', float('nan'))),
+        0.0,
+        data['order_id'].encode('utf-8'),
+        data.get('reason', '').encode('utf-8'),
+        EVENT_TYPE.REMOVED.value,
+        _OFFER_TYPES[data['order_type']],
+        _TRADING_PAIRS[data.get('trading_pair', 'unknown')],
+        0)
+
+def chunk_ranges(path, chunk_size=CHUNK_SIZE):
+    """Splits a file into `(start, end)` byte ranges of whole lines."""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as file:
+        start = 0
+        while start < size:
+            file.seek(min(start + chunk_size, size))
+            file.readline()
+            end = min(file.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def convert_chunk(path, start, end, timestamp):
+    """Parses the lines of a byte range of a raw dump.
+
+    :param str path: The raw dump.
+    :param int start: Where the first line starts.
+    :param int end: Where the last line ends.
+    :param float timestamp: For lines without a timestamp.
+    :returns: A tuple of the serialized records and `ConversionStats`.
+    """
+    stats = ConversionStats(bytes_read=end - start)
+    records = []
+    with open(path, 'rb') as file:
+        file.seek(start)
+        lines = file.read(end - start).splitlines()
+
+    parse = LineParser()
+    for line in lines:
+        stats.lines += 1
+        try:
+            event = parse(line)
+            if event is None:
+                continue
+            received = float(event.get('timestamp', timestamp))
+            if 'added' in event:
+                records.append(offer_record(event['added'], received))
+            elif 'removed' in event:
+                records.append(removal_record(event['removed'], received))
+            else:
+                continue
+            stats.events += 1
+        except Exception as e:
+            stats.errors += 1
+            log.debug("%s while parsing line '%s'", e, line)
+
+    return b''.join(records), stats
+
+def convert(inputs, output, processes=None, chunk_size=CHUNK_SIZE,
+            progress=None):
+    """Converts raw dumps into a version 2 file.
+
+    :param inputs: Paths of raw dumps, converted in the given order.
+    :param output: A binary, writable buffer.
+    :param int processes: How many processes parse in parallel, all cores by
+    default.
+    :param int chunk_size: How many bytes a process parses at once.
+    :param progress: Called with the `ConversionStats` after each chunk.
+    :returns: The `ConversionStats` of all inputs.
+    """
+    processes = processes or os.cpu_count() or 1
+    started = time.monotonic()
+    stats = ConversionStats()
+    writer = EventWriter(output)
+
+    jobs = [(path, start, end, os.path.getmtime(path))
+            for path in inputs
+            for start, end in chunk_ranges(path, chunk_size)]
+
+    with ProcessPoolExecutor(processes) as executor:
+        # Keep a few chunks in flight, write them in order
+        window = processes * 2
+        pending = deque()
+        jobs = iter(jobs)
+        while True:
+            while len(pending) < window:
+                job = next(jobs, None)
+                if job is None:
+                    break
+                pending.append(executor.submit(convert_chunk, *job))
+            if not pending:
+                break
+
+            records, chunk_stats = pending.popleft().result()
+            writer.write_records(np.frombuffer(records, dtype=RECORD_DTYPE))
+            stats.add(chunk_stats)
+            stats.seconds = time.monotonic() - started
+            if progress is not None:
+                progress(stats)
+
+    writer.close()
+    stats.seconds = time.monotonic() - started
+    return stats
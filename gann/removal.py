@@ -1,7 +1,12 @@
+import time
+
 from dataclasses import dataclass
 from datetime import datetime
+from typing import NamedTuple
 
-from gann.offer import OfferType
+from gann.offer import (OfferType, OFFER_TYPES_BY_VALUES,
+                        TRADING_PAIRS_BY_VALUES)
+from gann.trading_pair import TradingPair
 
 def removal_bitcoin_de(removal_dict):
     """Factory method to create a removal using the data  provided by
@@ -11,11 +16,27 @@ def removal_bitcoin_de(removal_dict):
     and offer_type. All values should be strings.
     """
     return Removal( removal_dict['order_id']
-                    , OfferType(removal_dict['order_type'])
+                    , OFFER_TYPES_BY_VALUES[removal_dict['order_type']]
                     , removal_dict.get('reason', '')
                     , int(removal_dict.get('price', 0) * 100)  # Euro vs cents
                     , removal_dict.get('amount', float('nan'))
+                    , datetime.now()
+                    , TRADING_PAIRS_BY_VALUES[
+                        removal_dict.get('trading_pair', 'unknown')]
                    )
+
+def compact_removal_bitcoin_de(removal_dict):
+    """Like `removal_bitcoin_de`, but creates a `CompactRemoval`."""
+    return CompactRemoval( removal_dict['order_id']
+                           , OFFER_TYPES_BY_VALUES[removal_dict['order_type']]
+                           , removal_dict.get('reason', '')
+                           , int(removal_dict.get('price', 0) * 100)
+                           , removal_dict.get('amount', float('nan'))
+                           , time.time()
+                           , TRADING_PAIRS_BY_VALUES[
+                               removal_dict.get('trading_pair', 'unknown')]
+                          )
+
 @dataclass(frozen=True)
 class Removal:
     """Describes an offer, which has been removed
@@ -29,6 +50,8 @@ class Removal:
         :param int price of the offer, can be null if it was not sold.
         :param float amount which was sol, can be null if it was not sold
         :param datetime date Point in time when the offer was removed.
+        :param TradingPair trading_pair the removed offer was about, `UNKNOWN`
+        if the source did not tell.
     """
     order_id: str
     offer_type: OfferType
@@ -36,9 +59,35 @@ class Removal:
     price: int = 0
     amount: float = float('nan')
     date: datetime = datetime.now()
+    trading_pair: TradingPair = TradingPair.UNKNOWN
 
     def __str__(self):
         return "Removal %s %4s %s" % (self.order_id,
                                      self.offer_type,
                                      self.reason)
 
+
+    @property
+    def timestamp(self):
+        """`date` as seconds since the epoch."""
+        return self.date.timestamp()
+
+class CompactRemoval(NamedTuple):
+    """A removal as plain tuple, see `gann.offer.CompactOffer`."""
+    order_id: str
+    offer_type: OfferType
+    reason: str
+    price: int
+    amount: float
+    timestamp: float
+    trading_pair: TradingPair = TradingPair.UNKNOWN
+
+    @property
+    def date(self):
+        return datetime.fromtimestamp(self.timestamp)
+
+    def to_removal(self):
+        return Removal(self.order_id, self.offer_type, self.reason,
+                       self.price, self.amount, self.date, self.trading_pair)
+
+    __str__ = Removal.__str__
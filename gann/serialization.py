@@ -1,16 +1,40 @@
+"""Binary serialization of offers and removals.
+
+Two on-disk layouts exist:
+
+* The legacy layout (version 1) writes an `EVENT_TYPE_STRUCT` followed by
+  either an `OFFER_STRUCT` or a `REMOVAL_STRUCT`. It has no header, records
+  differ in size and it uses the native byte order and alignment.
+* The current layout (version 2) starts with a `HEADER_STRUCT`, followed by
+  little-endian `RECORD_STRUCT`s of a fixed size, so that event N can be
+  found without reading the preceding ones. Finished files end with a sparse
+  index block mapping timestamps to record numbers and a `FOOTER_STRUCT`
+  pointing to it.
+
+`deserialize_from` and the columnar readers understand both layouts,
+`serialize_offer_to` and `serialize_removal_to` write the current one.
+"""
+from bisect import bisect_left
 from enum import Enum, unique
 from datetime import datetime
 
+import mmap
+import os
 import struct
-from gann.offer import OfferType, Offer, PaymentOption
+
+import numpy as np
+
+from gann.offer import CompactOffer, OfferType, Offer, PaymentOption
 from gann.trading_pair import TradingPair
-from gann.removal import Removal
+from gann.removal import CompactRemoval, Removal
 
 @unique
 class EVENT_TYPE (Enum):
     """Specifies if an offer is created or removed."""
     ADDED = 0
     REMOVED = 1
+    # Marks the beginning of the index block of a version 2 file.
+    INDEX = 2
 
 EVENT_TYPES_BY_INDEXES = dict(zip(
     list(range(len(list(EVENT_TYPE)))),
@@ -42,16 +66,42 @@ PAYMENT_OPTIONS_BY_INDEXES = dict(zip(
     list(PaymentOption)
 ))
 
+# Legacy layout (version 1)
 EVENT_TYPE_STRUCT = struct.Struct('i')
 OFFER_STRUCT = struct.Struct('6pddiiidi')
 REMOVAL_STRUCT = struct.Struct('6pi20pidd')
 
+# Current layout (version 2)
+FORMAT_MAGIC = b'GANN'
+FORMAT_VERSION = 2
+INDEX_MAGIC = b'GIDX'
+# Every how many records an index entry is written by default.
+INDEX_INTERVAL = 4096
+
+# magic, version, record size, index interval
+HEADER_STRUCT = struct.Struct('<4sHHI4x')
+# timestamp, price, amount, min_amount, order_id, reason, event type,
+# offer type, trading pair, payment option
+RECORD_STRUCT = struct.Struct('<dqdd6s20sBBBB2x')
+# timestamp, record number
+INDEX_ENTRY_STRUCT = struct.Struct('<dQ')
+# magic, offset of the index block, number of index entries
+FOOTER_STRUCT = struct.Struct('<4sQQ')
+
+RECORD_DTYPE = np.dtype({
+    'names': ['timestamp', 'price', 'amount', 'min_amount', 'order_id',
+              'reason', 'event', 'type', 'trading_pair', 'payment_option'],
+    'formats': ['<f8', '<i8', '<f8', '<f8', 'S6', 'S20', 'u1', 'u1', 'u1',
+                'u1'],
+    'offsets': [0, 8, 16, 24, 32, 38, 58, 59, 60, 61],
+    'itemsize': RECORD_STRUCT.size})
+
 def deserialize_event(buffer):
     """Serializes the one event from the given buffer"""
     event_bin = EVENT_TYPE_STRUCT.unpack(buffer)
     return EVENT_TYPES_BY_INDEXES[event_bin[0]]
 
-def deserialize_offer(buffer):
+def deserialize_offer_v1(buffer):
     """Deserialze a offer by reading binary data from a given buffer."""
     offer_bin = OFFER_STRUCT.unpack(buffer)
     return Offer(
@@ -65,7 +115,7 @@ def deserialize_offer(buffer):
         payment_option=PAYMENT_OPTIONS_BY_INDEXES[offer_bin[7]]
     )
 
-def deserialize_removal(buffer):
+def deserialize_removal_v1(buffer):
     """Deserialze a removal by reading binary data from a given buffer."""
     removal_bin = REMOVAL_STRUCT.unpack(buffer)
     return Removal(
@@ -77,8 +127,8 @@ def deserialize_removal(buffer):
         , date=datetime.fromtimestamp(removal_bin[5])
     )
 
-def serialize_offer(offer):
-    """Serialize a given offer into binary."""
+def serialize_offer_v1(offer):
+    """Serialize a given offer into the legacy binary layout."""
     return EVENT_TYPE_STRUCT.pack(EVENT_TYPE.ADDED.value) + OFFER_STRUCT.pack(
         offer.order_id.encode('utf-8'),
         offer.amount,
@@ -86,11 +136,11 @@ def serialize_offer(offer):
         offer.price,
         INDEXES_BY_OFFER_TYPES[offer.type],
         INDEXES_TRADING_PAIRS_INDEXES[offer.trading_pair],
-        offer.date.timestamp(),
+        offer.timestamp,
         offer.payment_option.value)
 
-def serialize_removal(removal):
-    """Serialize a given removal into binary."""
+def serialize_removal_v1(removal):
+    """Serialize a given removal into the legacy binary layout."""
     return (EVENT_TYPE_STRUCT.pack(EVENT_TYPE.REMOVED.value)
             + REMOVAL_STRUCT.pack(
                 removal.order_id.encode()
@@ -98,22 +148,429 @@ def serialize_removal(removal):
                 , removal.reason.encode()
                 , removal.price
                 , removal.amount
-                , removal.date.timestamp())
+                , removal.timestamp)
             )
 
+def serialize_header(index_interval=INDEX_INTERVAL):
+    """Serialize the header a version 2 file starts with."""
+    return HEADER_STRUCT.pack(FORMAT_MAGIC, FORMAT_VERSION,
+                              RECORD_STRUCT.size, index_interval)
+
+def serialize_offer(offer):
+    """Serialize a given offer into a binary record."""
+    return RECORD_STRUCT.pack(
+        offer.timestamp,
+        offer.price,
+        offer.amount,
+        offer.min_amount,
+        offer.order_id.encode('utf-8'),
+        b'',
+        EVENT_TYPE.ADDED.value,
+        INDEXES_BY_OFFER_TYPES[offer.type],
+        INDEXES_TRADING_PAIRS_INDEXES[offer.trading_pair],
+        offer.payment_option.value)
+
+def serialize_removal(removal):
+    """Serialize a given removal into a binary record."""
+    return RECORD_STRUCT.pack(
+        removal.timestamp,
+        removal.price,
+        removal.amount,
+        0.0,
+        removal.order_id.encode('utf-8'),
+        removal.reason.encode('utf-8'),
+        EVENT_TYPE.REMOVED.value,
+        INDEXES_BY_OFFER_TYPES[removal.offer_type],
+        INDEXES_TRADING_PAIRS_INDEXES[removal.trading_pair],
+        0)
+
+def deserialize_record(buffer):
+    """Deserialize an offer or a removal from a binary record."""
+    return _event_from_fields(RECORD_STRUCT.unpack(buffer))
+
+def _event_from_fields(fields):
+    """Creates an offer or a removal from unpacked `RECORD_STRUCT` fields."""
+    (timestamp, price, amount, min_amount, order_id, reason, event_type,
+     offer_type, trading_pair, payment_option) = fields
+
+    if event_type == EVENT_TYPE.ADDED.value:
+        return Offer(
+            order_id=order_id.rstrip(b'\0').decode('utf-8'),
+            amount=amount,
+            min_amount=min_amount,
+            price=price,
+            type=OFFER_TYPES_BY_INDEXES[offer_type],
+            trading_pair=TRADING_PAIRS_BY_INDEXES[trading_pair],
+            date=datetime.fromtimestamp(timestamp),
+            payment_option=PAYMENT_OPTIONS_BY_INDEXES[payment_option])
+
+    return Removal(
+        order_id=order_id.rstrip(b'\0').decode('utf-8'),
+        offer_type=OFFER_TYPES_BY_INDEXES[offer_type],
+        reason=reason.rstrip(b'\0').decode('utf-8'),
+        price=price,
+        amount=amount,
+        date=datetime.fromtimestamp(timestamp),
+        trading_pair=TRADING_PAIRS_BY_INDEXES[trading_pair])
+
+def _compact_event_from_fields(fields):
+    """Like `_event_from_fields`, but creates a `CompactOffer` or a
+    `CompactRemoval`."""
+    (timestamp, price, amount, min_amount, order_id, reason, event_type,
+     offer_type, trading_pair, payment_option) = fields
+
+    if event_type == EVENT_TYPE.ADDED.value:
+        return CompactOffer(
+            order_id.rstrip(b'\0').decode('utf-8'), amount, min_amount, price,
+            OFFER_TYPES_BY_INDEXES[offer_type],
+            TRADING_PAIRS_BY_INDEXES[trading_pair], timestamp,
+            PAYMENT_OPTIONS_BY_INDEXES[payment_option])
+
+    return CompactRemoval(
+        order_id.rstrip(b'\0').decode('utf-8'),
+        OFFER_TYPES_BY_INDEXES[offer_type],
+        reason.rstrip(b'\0').decode('utf-8'), price, amount, timestamp,
+        TRADING_PAIRS_BY_INDEXES[trading_pair])
+
+def iter_events(records, chunk_size=65536, compact=False):
+    """Lazily creates offers and removals from an array of `RECORD_DTYPE`.
+
+    :param records: The array to read.
+    :param int chunk_size: How many records are copied out of `records` at
+    once.
+    :param bool compact: Create `CompactOffer`s and `CompactRemoval`s, which
+    is considerably faster."""
+    create = _compact_event_from_fields if compact else _event_from_fields
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size].tobytes()
+        for fields in RECORD_STRUCT.iter_unpack(chunk):
+            yield create(fields)
+
+def _write_header_if_empty(buffer):
+    """Starts a version 2 file, if nothing has been written to `buffer` yet."""
+    if buffer.tell() == 0:
+        buffer.write(serialize_header())
 
 def serialize_offer_to(offer, buffer):
     """Serializes an offer to the given buffer"""
+    _write_header_if_empty(buffer)
     buffer.write(serialize_offer(offer))
 
 def serialize_removal_to(removal, buffer):
     """Serializes a removal to the given buffer."""
+    _write_header_if_empty(buffer)
     buffer.write(serialize_removal(removal))
 
+def is_current_format(header):
+    """Tells if `header` is the beginning of a version 2 file."""
+    return (len(header) >= HEADER_STRUCT.size
+            and header[:len(FORMAT_MAGIC)] == FORMAT_MAGIC)
+
 def deserialize_from(buffer):
     """Reads and deserialzes offers and removals from a given buffer."""
-    while next_offer_event := buffer.read(EVENT_TYPE_STRUCT.size):
+    header = buffer.read(HEADER_STRUCT.size)
+    if not header:
+        return
+
+    if is_current_format(header):
+        while len(record := buffer.read(RECORD_STRUCT.size)) \
+              == RECORD_STRUCT.size:
+            # The index block follows the last record
+            if record[RECORD_DTYPE.fields['event'][1]] \
+               == EVENT_TYPE.INDEX.value:
+                return
+            yield deserialize_record(record)
+        return
+
+    # Legacy data starts right away, so the header's bytes are read again
+    # rather than seeking back, which pipes and sockets can not.
+    pending = header
+
+    def read(size):
+        nonlocal pending
+        data, pending = pending[:size], pending[size:]
+        if len(data) < size:
+            data += buffer.read(size - len(data))
+        return data
+
+    while next_offer_event := read(EVENT_TYPE_STRUCT.size):
         if deserialize_event(next_offer_event) == EVENT_TYPE.ADDED:
-            yield deserialize_offer(buffer.read(OFFER_STRUCT.size))
+            yield deserialize_offer_v1(read(OFFER_STRUCT.size))
         else:
-            yield deserialize_removal(buffer.read(REMOVAL_STRUCT.size))
+            yield deserialize_removal_v1(read(REMOVAL_STRUCT.size))
+
+class EventWriter:
+    """Writes offers and removals as version 2 records to a buffer and
+    maintains the sparse timestamp index, which is appended by `close`.
+
+    :param buffer: A binary, writable buffer, which is either empty or
+    contains unfinished version 2 data.
+    :param int index_interval: Every how many records an index entry should
+    be created.
+    """
+    def __init__(self, buffer, index_interval=INDEX_INTERVAL):
+        self.buffer = buffer
+        self.index_interval = index_interval
+        self.index = []
+
+        position = buffer.tell()
+        if position == 0:
+            buffer.write(serialize_header(index_interval))
+            position = HEADER_STRUCT.size
+        self.count = (position - HEADER_STRUCT.size) // RECORD_STRUCT.size
+
+    def write_record(self, record, timestamp):
+        """Writes a serialized record with the given timestamp."""
+        if self.count % self.index_interval == 0:
+            self.index.append((timestamp, self.count))
+        self.buffer.write(record)
+        self.count += 1
+
+    def write_offer(self, offer):
+        self.write_record(serialize_offer(offer), offer.timestamp)
+
+    def write_removal(self, removal):
+        self.write_record(serialize_removal(removal),
+                          removal.timestamp)
+
+    def write_records(self, records):
+        """Writes an array of `RECORD_DTYPE` at once."""
+        first = (-self.count) % self.index_interval
+        for number in range(first, len(records), self.index_interval):
+            self.index.append((float(records['timestamp'][number]),
+                               self.count + number))
+        self.buffer.write(records.tobytes())
+        self.count += len(records)
+
+    def close(self):
+        """Appends the index block and the footer. No records must be
+        written afterwards."""
+        index_offset = HEADER_STRUCT.size + self.count * RECORD_STRUCT.size
+        self.buffer.write(RECORD_STRUCT.pack(
+            0.0, len(self.index), 0.0, 0.0, b'', b'',
+            EVENT_TYPE.INDEX.value, 0, 0, 0))
+        for timestamp, number in self.index:
+            self.buffer.write(INDEX_ENTRY_STRUCT.pack(timestamp, number))
+        self.buffer.write(FOOTER_STRUCT.pack(INDEX_MAGIC, index_offset,
+                                             len(self.index)))
+        self.buffer.flush()
+
+def read_index(data):
+    """Returns the index of a finished version 2 file as a tuple of the
+    offset of the index block and a list of `(timestamp, record number)`
+    tuples, or `None` if the file has not been finished."""
+    if len(data) < HEADER_STRUCT.size + FOOTER_STRUCT.size:
+        return None
+    magic, index_offset, count = FOOTER_STRUCT.unpack_from(
+        data, len(data) - FOOTER_STRUCT.size)
+    if (magic != INDEX_MAGIC
+        or index_offset < HEADER_STRUCT.size
+        or (index_offset - HEADER_STRUCT.size) % RECORD_STRUCT.size
+        or index_offset + RECORD_STRUCT.size > len(data)
+        or data[index_offset + RECORD_DTYPE.fields['event'][1]]
+        != EVENT_TYPE.INDEX.value):
+        return None
+    entries_offset = index_offset + RECORD_STRUCT.size
+    return (index_offset,
+            list(INDEX_ENTRY_STRUCT.iter_unpack(
+                data[entries_offset:
+                     entries_offset + count * INDEX_ENTRY_STRUCT.size])))
+
+def records_view(data):
+    """Returns the records of version 2 `data` as array of `RECORD_DTYPE`
+    without copying them. An incompletely written last record is left out."""
+    index = read_index(data)
+    end = index[0] if index is not None else len(data)
+    count = (end - HEADER_STRUCT.size) // RECORD_STRUCT.size
+    return np.frombuffer(data, dtype=RECORD_DTYPE, count=max(count, 0),
+                         offset=HEADER_STRUCT.size)
+
+def concatenate_records(chunks):
+    """Joins arrays of `RECORD_DTYPE` into one, keeping the padding of the
+    records, which `np.concatenate` would drop."""
+    records = np.empty(sum(len(chunk) for chunk in chunks),
+                       dtype=RECORD_DTYPE)
+    if chunks:
+        np.concatenate(chunks, out=records)
+    return records
+
+def seek_time(data, timestamp):
+    """Returns the number of the first record of the version 2 `data`, whose
+    timestamp is not smaller than `timestamp`. Records are expected to be
+    ordered by time, which is how they are written."""
+    records = records_view(data)
+    low, high = 0, len(records)
+
+    index = read_index(data)
+    if index is not None and index[1]:
+        timestamps = [entry[0] for entry in index[1]]
+        position = bisect_left(timestamps, timestamp)
+        if position > 0:
+            low = index[1][position - 1][1]
+        if position < len(index[1]):
+            high = index[1][position][1]
+
+    return low + int(np.searchsorted(records['timestamp'][low:high],
+                                     timestamp, side='left'))
+
+# Column layouts of `OFFER_STRUCT` and `REMOVAL_STRUCT` as NumPy dtypes. The
+# pascal strings are split into their length byte and their payload, the enum
+# columns hold the indexes used by the `*_BY_INDEXES` tables above.
+OFFER_V1_DTYPE = np.dtype({
+    'names': ['order_id', 'amount', 'min_amount', 'price', 'type',
+              'trading_pair', 'timestamp', 'payment_option'],
+    'formats': ['S5', '=f8', '=f8', '=i4', '=i4', '=i4', '=f8', '=i4'],
+    'offsets': [1, 8, 16, 24, 28, 32, 40, 48],
+    'itemsize': OFFER_STRUCT.size})
+
+REMOVAL_V1_DTYPE = np.dtype({
+    'names': ['order_id', 'type', 'reason', 'price', 'amount', 'timestamp'],
+    'formats': ['S5', '=i4', 'S19', '=i4', '=f8', '=f8'],
+    'offsets': [1, 8, 13, 32, 40, 48],
+    'itemsize': REMOVAL_STRUCT.size})
+
+# Sizes of whole legacy events in words of `EVENT_TYPE_STRUCT`.
+OFFER_EVENT_WORDS = (EVENT_TYPE_STRUCT.size + OFFER_STRUCT.size) \
+    // EVENT_TYPE_STRUCT.size
+REMOVAL_EVENT_WORDS = (EVENT_TYPE_STRUCT.size + REMOVAL_STRUCT.size) \
+    // EVENT_TYPE_STRUCT.size
+
+def _event_offsets_v1(data):
+    """Finds the records of legacy `data` and returns their byte offsets and
+    whether they are offers as two arrays in file order.
+
+    Where an event starts depends on the sizes of all events before it. So
+    the words are split into blocks of the size of a removal, each holding
+    the start of the event reaching into it. Offers are a word shorter, so
+    which word of a block the events continue at in the next one only
+    depends on the word they started at and on the kinds of the events.
+    These transitions are tables of a column per word, which are combined
+    pairwise up to a single one for all blocks and then resolved top down,
+    starting from the first word. That takes a few operations on arrays of
+    about the size of the data rather than a step per event."""
+    block = REMOVAL_EVENT_WORDS
+    count = len(data) // EVENT_TYPE_STRUCT.size
+    words = np.frombuffer(data, dtype=np.dtype(EVENT_TYPE_STRUCT.format),
+                          count=count)
+    blocks = max(-(-count // block), 1)
+    # Padding reads as removals, which are cut off in the end
+    is_added = np.zeros(blocks * block, dtype=np.bool_)
+    is_added[:count] = words == EVENT_TYPE.ADDED.value
+    added = is_added.view(np.uint8).reshape(blocks, block)
+
+    # An offer starting a block is followed by another event at its last
+    # word, any other event continues at the same word of the next block
+    # or one before.
+    tables = np.arange(block, dtype=np.uint8) - added
+    tables[:, 0] = np.where(added[:, 0], block - 1 - added[:, -1], 0)
+    levels = [tables]
+    while len(tables) > 1:
+        # Picks the columns of the second table of each pair by the first,
+        # an odd table is left as it is
+        paired = len(tables) & ~1
+        pairs = tables[:paired].reshape(-1, 2 * block)
+        combined = pairs.ravel()[np.arange(block, pairs.size, 2 * block)
+                                 [:, None] + pairs[:, :block]]
+        tables = (np.concatenate((combined, tables[paired:]))
+                  if paired < len(tables) else combined)
+        levels.append(tables)
+
+    entries = np.zeros(1, dtype=np.intp)
+    for tables in reversed(levels[:-1]):
+        # The second block of each pair is entered where the first is left
+        paired = len(tables) & ~1
+        below = np.empty(len(tables), dtype=np.intp)
+        below[0::2] = entries
+        below[1::2] = tables[0:paired:2][np.arange(paired // 2),
+                                         entries[:paired // 2]]
+        entries = below
+
+    firsts = np.arange(0, blocks * block, block) + entries
+    seconds = np.flatnonzero((entries == 0) & added[:, 0].view(np.bool_))
+    positions = np.insert(firsts, seconds + 1, firsts[seconds] + block - 1)
+    is_offer = is_added[positions]
+    # Drops the padding and a last event, which may have been cut off
+    ends = positions + np.where(is_offer, OFFER_EVENT_WORDS,
+                                REMOVAL_EVENT_WORDS)
+    complete = int(np.searchsorted(ends, count, side='right'))
+    return ((positions[:complete] + 1) * EVENT_TYPE_STRUCT.size,
+            is_offer[:complete])
+
+def _gather_v1(data, dtype, offsets):
+    """Copies the legacy records of `dtype` at the given byte `offsets` of
+    `data` into a new structured array."""
+    if len(offsets) == 0:
+        return np.empty(0, dtype=dtype)
+    # An overlapping view with a record starting at every word, so that the
+    # wanted ones can be picked by a single fancy index.
+    step = EVENT_TYPE_STRUCT.size
+    candidates = np.ndarray(shape=((len(data) - dtype.itemsize) // step + 1,),
+                            dtype=dtype, buffer=data, strides=(step,))
+    return candidates[offsets // step]
+
+def _records_v1(data):
+    """Converts legacy `data` into a new array of `RECORD_DTYPE`."""
+    offsets, is_offer = _event_offsets_v1(data)
+    records = np.zeros(len(offsets), dtype=RECORD_DTYPE)
+
+    rows = np.flatnonzero(is_offer)
+    offers = _gather_v1(data, OFFER_V1_DTYPE, offsets[rows])
+    for name in OFFER_V1_DTYPE.names:
+        records[name][rows] = offers[name]
+    records['event'][rows] = EVENT_TYPE.ADDED.value
+
+    rows = np.flatnonzero(~is_offer)
+    removals = _gather_v1(data, REMOVAL_V1_DTYPE, offsets[rows])
+    for name in REMOVAL_V1_DTYPE.names:
+        records[name][rows] = removals[name]
+    records['event'][rows] = EVENT_TYPE.REMOVED.value
+    records['trading_pair'][rows] = INDEXES_TRADING_PAIRS_INDEXES[
+        TradingPair.UNKNOWN]
+
+    return records
+
+def deserialize_records(data):
+    """Parses a whole buffer of serialized events into an array of
+    `RECORD_DTYPE` in file order. Version 2 data is returned without copying,
+    legacy data is converted.
+
+    :param data: A bytes like object containing serialized events."""
+    if is_current_format(data[:HEADER_STRUCT.size]):
+        return records_view(data)
+    return _records_v1(data)
+
+def deserialize_arrays(data):
+    """Parses a whole buffer of serialized events into two structured arrays.
+
+    :param data: A bytes like object containing serialized events.
+    :returns: A tuple of an array of offers and one of removals, both of
+    `RECORD_DTYPE` and in the order the events appear in `data`."""
+    records = deserialize_records(data)
+    events = records['event']
+    return (records[events == EVENT_TYPE.ADDED.value],
+            records[events == EVENT_TYPE.REMOVED.value])
+
+def load_arrays(path):
+    """Memory maps a file of serialized events and parses it into arrays.
+
+    See `deserialize_arrays`."""
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return (np.empty(0, dtype=RECORD_DTYPE),
+                    np.empty(0, dtype=RECORD_DTYPE))
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return deserialize_arrays(data)
+
+def convert_legacy(source, target, index_interval=INDEX_INTERVAL):
+    """Converts a legacy file into a finished version 2 file.
+
+    :param source: Path of the legacy file.
+    :param target: Path of the version 2 file to create.
+    :returns: The number of converted events."""
+    with open(source, 'rb') as legacy:
+        records = _records_v1(legacy.read())
+    with open(target, 'wb') as current:
+        writer = EventWriter(current, index_interval)
+        writer.write_records(records)
+        writer.close()
+    return len(records)
@@ -0,0 +1,225 @@
+"""Strategies decide which offers a `Trader` takes and how much of them.
+
+A strategy compiles a trader's `TraderConditions` into a flat decision record
+whenever they change, see `Trader.conditions`. Deciding on an offer then takes
+a few comparisons of precomputed numbers. The trader keeps doing the
+bookkeeping, talks to the broker and updates money and depot, so alternative
+strategies only implement the decisions and run in the `TraderRunner` and the
+`Backtest` the same way.
+
+Strategies keep no state of their own but the trader's, so a single instance
+may serve any number of traders.
+"""
+import math
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable
+
+# Leaves some room for rounding errors of the profit checks in `sell_floor`
+SELL_FLOOR_SLACK = 1 - 1e-9
+
+@dataclass(frozen=True)
+class Sale:
+    """What a strategy sells to an offer, amounts in the trader's units.
+
+    :param int consumed: The number of cheapest positions sold completely.
+    :param amount: The total amount to sell.
+    :param initial_spent: What the sold amount was bought for, as sum of
+    amounts times prices.
+    :param int left_price: The price of the position sold partly.
+    :param left_amount: What is left of the position sold partly.
+    """
+    consumed: int
+    amount: float
+    initial_spent: float
+    left_price: int = 0
+    left_amount: float = 0
+
+class Strategy(ABC):
+    """Decides on the offers of a trader's trading pair.
+
+    The bounds `buy_limit`, `sell_floor` and `price_range` let the
+    `TraderRunner` skip traders, which would not take an offer anyway. They
+    must never exclude an offer the strategy takes, the defaults exclude
+    none. Subclasses have to implement `buy` and `sell`.
+
+    When declining an offer, strategies may tell why by setting
+    `trader.rejection`, which the `TraderRunner` counts by reason.
+    """
+    def compile(self, conditions):
+        """Returns the decision record of conditions, which the trader keeps
+        as `Trader.decisions`."""
+        return conditions
+
+    @abstractmethod
+    def buy(self, trader, offer, amount, min_amount):
+        """Returns how many units to buy of an offer, whose amounts are given
+        in units, or `None`."""
+
+    @abstractmethod
+    def sell(self, trader, offer, amount):
+        """Returns the `Sale` to an offer of `amount` units or `None`. The
+        trader's depot is not empty."""
+
+    def buy_limit(self, trader):
+        """An upper bound of the prices `buy` buys at."""
+        return math.inf
+
+    def sell_floor(self, trader):
+        """A lower bound of the prices `sell` sells at."""
+        return -math.inf
+
+    def price_range(self, trader):
+        """Bounds of the cents an offer's minimal amount may cost at most and
+        its full amount at least to be bought."""
+        return -math.inf, math.inf
+
+def _enough_ratio(numerator, denominator, amount, price, spent):
+    return price * amount * denominator >= spent * numerator
+
+def _enough_factor(factor, amount, price, spent):
+    return price * amount >= spent * factor
+
+def _enough_absolute(amount_price, min_profit, amount, price, spent):
+    return amount * price >= spent / amount_price * min_profit + spent
+
+@dataclass(frozen=True)
+class ThresholdDecisions:
+    """The `TraderConditions` as compared against by `ThresholdStrategy`.
+
+    :param int max_price: What an offer's minimal amount may cost at most.
+    :param int min_price: What an offer's full amount has to cost at least.
+    :param int max_cost: `max_price` in cents times units.
+    :param int min_cost: `min_price` in cents times units.
+    :param int step_price: See `TraderConditions`.
+    :param int turnaround_price: See `TraderConditions`.
+    :param float profit_factor: See `TraderConditions.profit_factor`.
+    :param enough: Tells by `(amount, price, initial_spent)` if a sale
+    brings enough profit, same as `TraderConditions.enough` to the bit.
+    """
+    max_price: int
+    min_price: int
+    max_cost: int
+    min_cost: int
+    step_price: int
+    turnaround_price: int
+    profit_factor: float
+    enough: Callable
+
+class ThresholdStrategy(Strategy):
+    """Buys whenever the price declined by `step_price` since the last
+    purchase or by `turnaround_price` from the highest price of buy offers
+    seen, if the depot is empty. Sells the cheapest positions, as long as
+    they make `min_profit`."""
+
+    def compile(self, conditions):
+        if conditions.fixed_point:
+            if conditions.percentage:
+                enough = partial(_enough_ratio, 100 + conditions.min_profit,
+                                 100)
+            else:
+                enough = partial(
+                    _enough_ratio,
+                    conditions.amount_price + conditions.min_profit,
+                    conditions.amount_price)
+        elif conditions.percentage:
+            enough = partial(_enough_factor, 1 + conditions.min_profit / 100)
+        else:
+            enough = partial(_enough_absolute, conditions.amount_price,
+                             conditions.min_profit)
+
+        return ThresholdDecisions(
+            max_price=conditions.max_price(),
+            min_price=conditions.min_price(),
+            max_cost=conditions.max_price() * conditions.scale,
+            min_cost=conditions.min_price() * conditions.scale,
+            step_price=conditions.step_price,
+            turnaround_price=conditions.turnaround_price,
+            profit_factor=conditions.profit_factor(),
+            enough=enough)
+
+    def buy(self, trader, offer, amount, min_amount):
+        decisions = trader.decisions
+        price = offer.price
+
+        if price * min_amount > decisions.max_cost:
+            trader.rejection = 'max_price'
+            return None
+        if price * amount < decisions.min_cost:
+            trader.rejection = 'min_price'
+            return None
+        if price > self.buy_limit(trader):
+            trader.rejection = 'buy_limit'
+            return None
+
+        # Many platforms do not accept to obscure numbers.
+        purchase = trader.conditions.purchase_amount(price)
+
+        # If rounding was higher or lower than amount/min_amount
+        # use those values instead.
+        if purchase > amount:
+            purchase = amount
+        if purchase < min_amount:
+            purchase = min_amount
+        return purchase
+
+    def sell(self, trader, offer, amount):
+        depot = trader.depot
+        enough = trader.decisions.enough
+        price = offer.price
+
+        prices = depot.prices()
+        amounts, costs = depot.cumulative()
+
+        # The cheapest positions, which fit completely into the offer
+        fitting = depot.count_within(amount)
+
+        # The more positions are sold, the higher the average price they were
+        # bought for. So search the last one to still make enough profit.
+        low, high = 0, fitting
+        while low < high:
+            middle = (low + high) // 2
+            if enough(amounts[middle], price, costs[middle]):
+                low = middle + 1
+            else:
+                high = middle
+        consumed = low
+
+        sold = amounts[consumed - 1] if consumed else 0
+        initial_spent = costs[consumed - 1] if consumed else 0
+
+        # Sell the next position partly, if all fitting ones made enough
+        # profit, but the offer asks for more
+        if consumed == fitting and consumed < len(prices) and sold < amount:
+            left_price = prices[consumed]
+            left_amount = depot[left_price] - (amount - sold)
+            spent = initial_spent + left_price * (depot[left_price]
+                                                  - left_amount)
+
+            # Check if we would make enough profit with the deal
+            if enough(amount, price, spent):
+                return Sale(consumed, amount, spent, left_price, left_amount)
+
+        if not consumed:
+            trader.rejection = 'profit'
+            return None
+        return Sale(consumed, sold, initial_spent)
+
+    def buy_limit(self, trader):
+        if any(trader.depot):
+            return trader.last_purchase_price - trader.decisions.step_price
+        return trader.highest_price_buying - trader.decisions.turnaround_price
+
+    def sell_floor(self, trader):
+        if not any(trader.depot):
+            return math.inf
+        return (trader.depot.cheapest() * trader.decisions.profit_factor
+                * SELL_FLOOR_SLACK)
+
+    def price_range(self, trader):
+        return trader.decisions.min_price, trader.decisions.max_price
+
+# The strategy of traders, which are not given one
+THRESHOLDS = ThresholdStrategy()
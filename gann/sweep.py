@@ -0,0 +1,130 @@
+"""Evaluates many `TraderConditions` against the same events in parallel."""
+import dataclasses
+import itertools
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from gann.backtest import Backtest, RemovalIndex, BITCOIN_DE_FEE
+from gann.serialization import (concatenate_records, iter_events,
+                                RECORD_DTYPE)
+from gann.trader_conditions import TraderConditions
+
+# The fields of `TraderConditions` a sweep may vary.
+SWEEP_PARAMETERS = ('amount_price', 'amount_price_tolerance',
+                    'min_profit_str', 'step_price', 'turnaround_price')
+
+def parameter_grid(base: TraderConditions, **values):
+    """Returns conditions for every combination of the given values.
+
+    :param TraderConditions base: Provides all fields which are not varied.
+    :param values: Lists of values by names of `SWEEP_PARAMETERS`.
+    """
+    for name in values:
+        if name not in SWEEP_PARAMETERS:
+            raise ValueError("%s can not be swept" % name)
+
+    names = list(values)
+    return [dataclasses.replace(base, **dict(zip(names, combination)))
+            for combination in itertools.product(
+                    *(values[name] for name in names))]
+
+def load_records(archive, start=None, end=None, trading_pair=None):
+    """Reads the events of a time range of an `Archive` into one array of
+    `RECORD_DTYPE`. Given a `trading_pair`, only its events and removals of
+    an unknown pair are read, which is all its offers can be matched with,
+    and archives sharded by pair only read the pair's shards."""
+    return concatenate_records(list(archive.records(start, end,
+                                                    trading_pair)))
+
+@dataclass(frozen=True)
+class SweepResult:
+    """The outcome of one backtest of a sweep, amounts of money in cents."""
+    conditions: TraderConditions
+    profit: int
+    trades: int
+    max_drawdown: int
+    end_equity: int
+
+# The records shared by the parent, attached once per worker process.
+_worker_memory = None
+_worker_records = None
+# Built from the records on the first backtest with latency
+_worker_removals = None
+
+def _attach(name, count):
+    global _worker_memory, _worker_records
+    _worker_memory = shared_memory.SharedMemory(name=name)
+    _worker_records = np.ndarray(count, dtype=RECORD_DTYPE,
+                                 buffer=_worker_memory.buf)
+    # Shared by all workers, none may change it
+    _worker_records.setflags(write=False)
+
+def _backtest(job):
+    global _worker_removals
+    conditions, money, fee, latency, strategy = job
+    if latency is not None and _worker_removals is None:
+        _worker_removals = RemovalIndex.from_records(_worker_records)
+    report = Backtest(conditions, money=money, fee=fee, latency=latency,
+                      removals=_worker_removals if latency is not None
+                      else None, strategy=strategy).run(
+        iter_events(_worker_records, compact=True))
+    return SweepResult(conditions, report.profit, len(report.trades),
+                       report.max_drawdown, report.end_equity)
+
+def sweep(records, conditions, money=1000_00, fee=BITCOIN_DE_FEE,
+          processes=None, latency=None, strategy=None):
+    """Backtests each of `conditions` against `records` on all cores.
+
+    The records are copied once into shared memory, which the workers map
+    read-only instead of receiving copies.
+
+    :param records: Events as array of `RECORD_DTYPE`, e.g. from
+    `load_records`.
+    :param conditions: The conditions to evaluate.
+    :param int money: The money each trader starts with.
+    :param float fee: The fee charged by the simulated broker.
+    :param int processes: The number of workers, all cores by default.
+    :param LatencyModel latency: Delays trades, so that offers removed in the
+    meantime can not be filled.
+    :param Strategy strategy: Decides on the offers with each of the
+    conditions, has to be picklable.
+    :returns: A list of `SweepResult`, the most profitable first.
+    """
+    memory = shared_memory.SharedMemory(create=True,
+                                        size=max(records.nbytes, 1))
+    try:
+        np.ndarray(len(records), dtype=RECORD_DTYPE,
+                   buffer=memory.buf)[:] = records
+
+        with ProcessPoolExecutor(max_workers=processes,
+                                 initializer=_attach,
+                                 initargs=(memory.name, len(records))) \
+             as executor:
+            results = list(executor.map(
+                _backtest,
+                [(entry, money, fee, latency, strategy)
+                 for entry in conditions],
+                chunksize=max(1, len(conditions) // (64 * (processes or 4)))))
+    finally:
+        memory.close()
+        memory.unlink()
+
+    return sorted(results, key=lambda result: result.profit, reverse=True)
+
+def format_table(results, limit=None):
+    """Formats sweep results as a table with one row per conditions."""
+    lines = ["%10s %10s %10s %10s %10s %12s %6s %12s" % (
+        'amount', 'tolerance', 'profit', 'step', 'turnaround', 'gain €',
+        'trades', 'drawdown €')]
+    for result in results[:limit]:
+        conditions = result.conditions
+        lines.append("%10i %10i %10s %10i %10i %12.2f %6i %12.2f" % (
+            conditions.amount_price, conditions.amount_price_tolerance,
+            conditions.min_profit_str, conditions.step_price,
+            conditions.turnaround_price, result.profit / 100, result.trades,
+            result.max_drawdown / 100))
+    return "\n".join(lines)
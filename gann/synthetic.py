@@ -0,0 +1,143 @@
+"""Generates random, but realistic streams of bitcoin.de's market events.
+
+The distributions roughly follow what `bin/sniffer` records: prices walk
+randomly with log-normal steps, amounts are log-normal with most offers
+being small, the minimal amount is a fraction of the amount, most offers
+are about bitcoins and most get removed again within a few minutes.
+"""
+import random
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from gann.offer import Offer, OfferType, PaymentOption
+from gann.removal import Removal
+from gann.trading_pair import TradingPair
+
+# Share of the offers and the price in cents to start from per pair
+TRADING_PAIRS = {
+    TradingPair.BTCEUR: (0.70, 30000_00),
+    TradingPair.ETHEUR: (0.15, 2000_00),
+    TradingPair.LTCEUR: (0.05, 150_00),
+    TradingPair.BCHEUR: (0.04, 400_00),
+    TradingPair.XRPEUR: (0.03, 1_00),
+    TradingPair.DOGEEUR: (0.03, 10),
+}
+
+PAYMENT_OPTION_WEIGHTS = {
+    PaymentOption.EXPRESS_ONLY: 0.2,
+    PaymentOption.SEPA_ONLY: 0.3,
+    PaymentOption.EXPRESS_SEPA: 0.5,
+}
+
+REMOVAL_REASONS = ('canceled', 'order_executed', 'order_deleted')
+
+@dataclass
+class SyntheticMarket:
+    """A reproducible source of offers and removals.
+
+    :param int seed: Seed of the random numbers.
+    :param float volatility: Standard deviation of the relative price steps
+    between two offers of a pair.
+    :param float spread: Relative distance of offers from the mid price.
+    :param float removal_rate: Share of offers, which are removed later on.
+    :param float events_per_second: How densely events follow each other.
+    :param datetime start: When the first event happens.
+    """
+    seed: int = 0
+    volatility: float = 0.0005
+    spread: float = 0.01
+    removal_rate: float = 0.9
+    events_per_second: float = 20.0
+    start: datetime = datetime(2021, 1, 1)
+
+    def __post_init__(self):
+        self.random = random.Random(self.seed)
+        self.pairs = list(TRADING_PAIRS)
+        self.pair_weights = [TRADING_PAIRS[pair][0] for pair in self.pairs]
+        self.prices = {pair: float(TRADING_PAIRS[pair][1])
+                       for pair in self.pairs}
+        self.payment_options = list(PAYMENT_OPTION_WEIGHTS)
+        self.payment_weights = list(PAYMENT_OPTION_WEIGHTS.values())
+        self.now = self.start
+        self.order_id = 0
+
+    def _tick(self):
+        self.now += timedelta(
+            seconds=self.random.expovariate(self.events_per_second))
+
+    def offer(self, trading_pair: TradingPair = None):
+        """The next offer, of a random pair unless given."""
+        generator = self.random
+        self._tick()
+        if trading_pair is None:
+            trading_pair = generator.choices(self.pairs,
+                                             self.pair_weights)[0]
+
+        mid = self.prices[trading_pair] * generator.lognormvariate(
+            0, self.volatility)
+        self.prices[trading_pair] = mid
+        offer_type = generator.choice((OfferType.BUY, OfferType.SELL))
+        # Buyers offer less than the mid price, sellers ask for more
+        distance = generator.expovariate(1 / self.spread)
+        price = mid * (1 - distance if offer_type == OfferType.BUY
+                       else 1 + distance)
+
+        # Most offers are worth a few hundred euros
+        amount = round(generator.lognormvariate(5.5, 1.2) / price * 100, 4)
+        amount = max(amount, 0.0001)
+        min_amount = round(amount * generator.choice((0.0, 0.1, 0.25, 0.5,
+                                                      1.0)), 4)
+
+        self.order_id += 1
+        return Offer(
+            order_id='%06X' % self.order_id,
+            amount=amount,
+            min_amount=min_amount,
+            price=max(int(price), 1),
+            type=offer_type,
+            trading_pair=trading_pair,
+            date=self.now,
+            payment_option=generator.choices(self.payment_options,
+                                             self.payment_weights)[0])
+
+    def offers(self, count: int, trading_pair: TradingPair = None):
+        """Yields `count` offers."""
+        for _ in range(count):
+            yield self.offer(trading_pair)
+
+    def events(self, count: int, trading_pair: TradingPair = None):
+        """Yields `count` offers and removals in time order. Removals refer
+        to one of the recent offers."""
+        alive = []
+        for _ in range(count):
+            if alive and self.random.random() < self.removal_rate / (
+                    1 + self.removal_rate):
+                offer = alive.pop(self.random.randrange(len(alive)))
+                self._tick()
+                yield Removal(offer.order_id, offer.type,
+                              self.random.choice(REMOVAL_REASONS),
+                              offer.price, offer.amount, self.now,
+                              offer.trading_pair)
+            else:
+                offer = self.offer(trading_pair)
+                alive.append(offer)
+                yield offer
+
+    def websocket_data(self, offer: Offer):
+        """The data bitcoin.de's websocket sends for an offer."""
+        return {'order_id': offer.order_id,
+                'amount': str(offer.amount),
+                'min_amount': str(offer.min_amount),
+                'price': '%.2f' % (offer.price / 100),
+                'order_type': offer.type.value,
+                'trading_pair': offer.trading_pair.value,
+                'payment_option': str(offer.payment_option.value)}
+
+    def depot(self, positions: int, trading_pair=TradingPair.BTCEUR,
+              amount: float = 0.001):
+        """A depot with positions above the current price, like a trader has
+        after buying into a falling market."""
+        price = int(self.prices[trading_pair])
+        step = max(price // 1000, 1)
+        return {price + step * (i + 1): amount for i in range(positions)}
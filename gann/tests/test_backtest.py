@@ -0,0 +1,214 @@
+import unittest
+import io
+import logging
+import math
+import sys
+
+from datetime import datetime, timedelta
+
+from gann.backtest import (Backtest, LatencyModel, RemovalIndex,
+                           SimulatedBroker)
+from gann.offer import CompactOffer, Offer, OfferType
+from gann.removal import CompactRemoval, Removal
+from gann.serialization import EventWriter, records_view
+from gann.trader_conditions import TraderConditions
+from gann.trading_pair import TradingPair
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.INFO)
+
+START = datetime(2021, 3, 4, 12, 0, 0)
+
+class TestBacktest(unittest.TestCase):
+
+    def offer(self, offer_type, price, amount=1.0, order_id=None,
+              trading_pair=TradingPair.BTCEUR):
+        """Creates a new offer, one minute after the previous one."""
+        self.offer_id += 1
+
+        return Offer(
+            order_id=order_id or '#'+str(self.offer_id),
+            amount=amount,
+            min_amount=0.0,
+            price=price,
+            type=offer_type,
+            trading_pair=trading_pair,
+            date=START + timedelta(minutes=self.offer_id))
+
+    def setUp(self):
+        self.offer_id = 0
+
+    def test_buy_and_sell(self):
+        """Expect a buy on a dip and a profitable sale afterwards, including
+        fees."""
+        backtest = Backtest(TraderConditions(), money=1000_00, fee=0.005)
+
+        report = backtest.run([
+            self.offer(OfferType.BUY, 5000_00),
+            self.offer(OfferType.SELL, 4900_00),
+            self.offer(OfferType.SELL, 4000_00,
+                       trading_pair=TradingPair.ETHEUR),
+            self.offer(OfferType.BUY, 6000_00)])
+
+        self.assertEqual(4, report.events)
+        self.assertEqual([OfferType.BUY, OfferType.SELL],
+                         [trade.type for trade in report.trades])
+        coins = 0.0204 * 0.995
+        self.assertAlmostEqual(coins, report.trades[0].gained)
+        money = int(6000_00 * coins * 0.995)
+        self.assertAlmostEqual(1000_00 - 0.0204 * 4900_00 + money,
+                               report.money)
+        self.assertEqual(0, report.coins)
+        self.assertEqual(2, len(report.depot_evolution))
+        self.assertGreater(report.profit, 0)
+        self.assertEqual(6000_00, report.last_price)
+
+    def test_compact_events(self):
+        """Expect the same results for compact offers and removals."""
+        events = [self.offer(OfferType.BUY, 5000_00),
+                  self.offer(OfferType.SELL, 4900_00, order_id='#dip'),
+                  Removal('#dip', OfferType.SELL, 'canceled',
+                          date=START),
+                  self.offer(OfferType.SELL, 4800_00),
+                  self.offer(OfferType.BUY, 6000_00)]
+        compact = [CompactOffer(*(getattr(event, name) for name in
+                                  CompactOffer._fields[:6]),
+                                event.timestamp, event.payment_option)
+                   if isinstance(event, Offer) else
+                   CompactRemoval(event.order_id, event.offer_type,
+                                  event.reason, event.price, event.amount,
+                                  event.timestamp, event.trading_pair)
+                   for event in events]
+
+        expected = Backtest(TraderConditions()).run(events)
+        report = Backtest(TraderConditions()).run(compact)
+
+        self.assertTrue(report.trades)
+        self.assertEqual(expected.trades, report.trades)
+        self.assertEqual(expected.money, report.money)
+
+    def test_drawdown(self):
+        """Expect the drawdown to reflect the falling value of the depot."""
+        backtest = Backtest(TraderConditions(), money=0,
+                            depot={5000_00: 0.1})
+
+        report = backtest.run([
+            self.offer(OfferType.BUY, 5000_00, amount=0.001),
+            self.offer(OfferType.BUY, 4000_00, amount=0.001),
+            self.offer(OfferType.BUY, 4500_00, amount=0.001)])
+
+        self.assertEqual(0, len(report.trades))
+        self.assertEqual(100_00, report.max_drawdown)
+        self.assertEqual(-50_00, report.profit)
+
+    def test_removed_offers_can_not_be_filled(self):
+        """Expect no trade with an offer which has been removed already."""
+        backtest = Backtest(TraderConditions(), money=1000_00)
+
+        report = backtest.run([
+            self.offer(OfferType.BUY, 5000_00),
+            Removal('gone', OfferType.SELL, 'canceled'),
+            self.offer(OfferType.SELL, 4900_00, order_id='gone')])
+
+        self.assertEqual(0, len(report.trades))
+        self.assertEqual(1000_00, report.money)
+
+    def test_offers_are_not_filled_twice(self):
+        """Expect the simulated broker to fill each offer only up to its
+        amount."""
+        broker = SimulatedBroker()
+        offer = self.offer(OfferType.SELL, 4900_00, amount=1.0)
+
+        self.assertTrue(broker.try_buy(offer, 0.6))
+        self.assertFalse(broker.try_buy(offer, 0.6))
+        self.assertTrue(broker.try_buy(offer, 0.4))
+
+    def test_removal_index(self):
+        """Expect the first removal of each offer since a time to be found by
+        id, from events and records alike."""
+        events = [self.offer(OfferType.SELL, 4900_00, order_id='AAAAAA'),
+                  Removal('BBBBBB', OfferType.SELL, 'canceled',
+                          date=START + timedelta(minutes=3)),
+                  Removal('AAAAAA', OfferType.SELL, 'canceled',
+                          date=START + timedelta(minutes=2)),
+                  Removal('AAAAAA', OfferType.SELL, 'canceled',
+                          date=START + timedelta(minutes=5))]
+        buffer = io.BytesIO()
+        writer = EventWriter(buffer)
+        for event in events:
+            if isinstance(event, Offer):
+                writer.write_offer(event)
+            else:
+                writer.write_removal(event)
+        writer.close()
+
+        for index in (RemovalIndex.from_events(events),
+                      RemovalIndex.from_records(
+                          records_view(buffer.getvalue()))):
+            self.assertEqual(3, len(index))
+            self.assertEqual((START + timedelta(minutes=2)).timestamp(),
+                             index.removed_at('AAAAAA'))
+            self.assertEqual((START + timedelta(minutes=5)).timestamp(),
+                             index.removed_at('AAAAAA', (
+                                 START + timedelta(minutes=3)).timestamp()))
+            self.assertEqual(math.inf, index.removed_at('AAAAAA', (
+                START + timedelta(minutes=6)).timestamp()))
+            self.assertEqual((START + timedelta(minutes=3)).timestamp(),
+                             index.removed_at('BBBBBB'))
+            self.assertEqual(math.inf, index.removed_at('CCCCCC'))
+
+    def test_latency(self):
+        """Expect offers removed before the trade arrives not to be
+        filled."""
+        events = [self.offer(OfferType.BUY, 5000_00),
+                  self.offer(OfferType.SELL, 4900_00, order_id='#dip'),
+                  Removal('#dip', OfferType.SELL, 'order_executed',
+                          date=START + timedelta(minutes=2, seconds=1)),
+                  self.offer(OfferType.BUY, 6000_00)]
+        removals = RemovalIndex.from_events(events)
+
+        fast = Backtest(TraderConditions(),
+                        latency=LatencyModel(decision=0.1, broker=0.5),
+                        removals=removals).run(events)
+        slow = Backtest(TraderConditions(),
+                        latency=LatencyModel(decision=0.1, broker=1.0),
+                        removals=removals).run(events)
+
+        self.assertEqual(2, len(fast.trades))
+        self.assertEqual(0, fast.missed)
+        self.assertEqual(0, len(slow.trades))
+        self.assertEqual(1, slow.missed)
+
+    def test_reemitted_offers(self):
+        """Expect an offer emitted again after its removal to be filled."""
+        events = [self.offer(OfferType.BUY, 5000_00),
+                  self.offer(OfferType.SELL, 4900_00, order_id='#again'),
+                  Removal('#again', OfferType.SELL, 'canceled',
+                          date=START + timedelta(minutes=2, seconds=1)),
+                  self.offer(OfferType.SELL, 4900_00, order_id='#again'),
+                  Removal('#again', OfferType.SELL, 'canceled',
+                          date=START + timedelta(minutes=3, seconds=30))]
+        removals = RemovalIndex.from_events(events)
+
+        report = Backtest(TraderConditions(),
+                          latency=LatencyModel(decision=0.1, broker=1.0),
+                          removals=removals).run(events)
+
+        self.assertEqual(1, report.missed)
+        self.assertEqual([START + timedelta(minutes=3)],
+                         [trade.date for trade in report.trades])
+
+    def test_latency_jitter(self):
+        """Expect random latencies around the median, reproducible by
+        seed."""
+        model = LatencyModel(0.01, 0.2, 0.5, seed=1)
+        latencies = [model.sample() for _ in range(1001)]
+
+        self.assertEqual(latencies[0], LatencyModel(0.01, 0.2, 0.5,
+                                                    seed=1).sample())
+        latencies.sort()
+        self.assertAlmostEqual(0.21, latencies[500], delta=0.02)
+        self.assertGreater(latencies[0], 0.01)
+
+    if __name__ == '__main__':
+        unittest.main()
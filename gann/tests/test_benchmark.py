@@ -0,0 +1,65 @@
+import unittest
+import json
+import logging
+import sys
+
+from gann.benchmark import compare, run
+from gann.offer import Offer, offer_bitcoin_de
+from gann.removal import Removal
+from gann.synthetic import SyntheticMarket
+from gann.trading_pair import TradingPair
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.WARNING)
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_reproducible_market(self):
+        """Expect the same events for the same seed."""
+        self.assertEqual(list(SyntheticMarket(3).events(100)),
+                         list(SyntheticMarket(3).events(100)))
+        self.assertNotEqual(list(SyntheticMarket(3).events(100)),
+                            list(SyntheticMarket(4).events(100)))
+
+    def test_plausible_events(self):
+        """Expect removals of earlier offers and sane offers."""
+        events = list(SyntheticMarket(1).events(2000))
+        offers = {event.order_id: event for event in events
+                  if isinstance(event, Offer)}
+        removals = [event for event in events if isinstance(event, Removal)]
+
+        self.assertGreater(len(removals), 500)
+        for removal in removals:
+            self.assertIn(removal.order_id, offers)
+        for offer in offers.values():
+            self.assertGreater(offer.price, 0)
+            self.assertGreater(offer.amount, 0)
+            self.assertLessEqual(offer.min_amount, offer.amount)
+        self.assertEqual([event.date for event in events],
+                         sorted(event.date for event in events))
+
+    def test_websocket_data(self):
+        """Expect the data of the websocket to parse to the offer."""
+        market = SyntheticMarket(2)
+        for offer in market.offers(100, TradingPair.ETHEUR):
+            parsed = offer_bitcoin_de(market.websocket_data(offer))
+            self.assertEqual(offer, Offer(**{**parsed.__dict__,
+                                             'date': offer.date}))
+
+    def test_run(self):
+        """Expect JSON compatible results of all benchmarks."""
+        results = json.loads(json.dumps(
+            run(events=200, depot_sizes=(1, 100), trader_counts=(1, 10))))
+
+        self.assertEqual(
+            ['offer_bitcoin_de', 'serialize_offer', 'deserialize_from',
+             'Trader.process_offer', 'Trader.process_offer',
+             'TraderRunner.add_order', 'TraderRunner.add_order'],
+            [result['name'] for result in results['results']])
+        for result in results['results']:
+            self.assertGreater(result['events_per_second'], 0)
+            self.assertLessEqual(result['p50'], result['p99'])
+        self.assertEqual(7, len(list(compare(results, results))))
+
+    if __name__ == '__main__':
+        unittest.main()
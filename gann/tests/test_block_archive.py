@@ -0,0 +1,143 @@
+import unittest
+import io
+import logging
+import sys
+import tempfile
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from gann.block_archive import (BlockWriter, Codec, decode_columns,
+                                encode_columns, read_block_headers,
+                                read_blocks, trading_pairs_mask)
+from gann.offer import Offer, OfferType
+from gann.query import Archive
+from gann.removal import Removal
+from gann.serialization import (concatenate_records, serialize_offer,
+                                RECORD_DTYPE)
+from gann.trading_pair import TradingPair
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.INFO)
+
+START = datetime(2021, 3, 4, 12, 0, 0)
+
+class TestBlockArchive(unittest.TestCase):
+
+    def offer(self, minute, trading_pair=TradingPair.BTCEUR):
+        """Creates a new offer appearing `minute` minutes after `START`."""
+        return Offer(
+            order_id='#'+str(minute),
+            amount=0.5 + minute / 100,
+            min_amount=0.1,
+            price=1000_00 + minute * 7,
+            type=OfferType.BUY if minute % 2 else OfferType.SELL,
+            trading_pair=trading_pair,
+            date=START + timedelta(minutes=minute))
+
+    def write(self, buffer, events, codec=Codec.ZLIB, block_events=4):
+        writer = BlockWriter(buffer, codec, block_events=block_events,
+                             block_seconds=3600, clock=lambda: 0)
+        for event in events:
+            if isinstance(event, Offer):
+                writer.write_offer(event)
+            else:
+                writer.write_removal(event)
+        return writer
+
+    def test_columns_roundtrip(self):
+        """Expect the delta encoded columns to restore the records."""
+        records = np.frombuffer(
+            b''.join(serialize_offer(self.offer(minute))
+                     for minute in range(10)),
+            dtype=RECORD_DTYPE)
+
+        restored = decode_columns(encode_columns(records), len(records))
+
+        self.assertEqual(records.tobytes(), restored.tobytes())
+
+    def test_codecs(self):
+        """Expect each codec to restore the written events."""
+        offers = [self.offer(minute) for minute in range(10)]
+        for codec in Codec:
+            buffer = io.BytesIO()
+            self.write(buffer, offers, codec).close()
+
+            data = buffer.getvalue()
+            records = concatenate_records(list(read_blocks(data)))
+
+            self.assertEqual(3, len(list(read_block_headers(data))))
+            self.assertEqual([offer.price for offer in offers],
+                             list(records['price']))
+
+    def test_compression(self):
+        """Expect sorted timestamps and prices to compress well."""
+        offers = [self.offer(minute) for minute in range(1000)]
+        buffer = io.BytesIO()
+        self.write(buffer, offers, Codec.LZMA, block_events=1000).close()
+
+        self.assertLess(len(buffer.getvalue()) * 3,
+                        sum(len(serialize_offer(offer)) for offer in offers))
+
+    def test_block_skipping(self):
+        """Expect blocks outside of the time range or without the trading
+        pair not to be decompressed."""
+        buffer = io.BytesIO()
+        self.write(buffer,
+                   [self.offer(minute) for minute in range(8)]
+                   + [self.offer(minute, TradingPair.ETHEUR)
+                      for minute in range(8, 12)]).close()
+        data = buffer.getvalue()
+
+        headers = list(read_block_headers(data))
+        self.assertEqual(trading_pairs_mask([TradingPair.ETHEUR]),
+                         headers[2].trading_pairs)
+
+        blocks = list(read_blocks(
+            data,
+            start=(START + timedelta(minutes=5)).timestamp(),
+            end=(START + timedelta(minutes=10)).timestamp()))
+        self.assertEqual([3, 2], [len(block) for block in blocks])
+
+        blocks = list(read_blocks(data, trading_pair=TradingPair.ETHEUR))
+        self.assertEqual([4], [len(block) for block in blocks])
+
+    def test_incomplete_block(self):
+        """Expect a block still being written to be ignored."""
+        buffer = io.BytesIO()
+        self.write(buffer, [self.offer(minute) for minute in range(8)])
+
+        data = buffer.getvalue()
+
+        self.assertEqual(2, len(list(read_blocks(data))))
+        self.assertEqual(1, len(list(read_blocks(data[:-1]))))
+
+    def test_archive(self):
+        """Expect block archives to be queried like other files."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'sniffed_since_2021-03-04_12:00:00'
+            with path.open('wb') as file:
+                self.write(file,
+                           [self.offer(minute) for minute in range(8)]
+                           + [Removal('#1', OfferType.BUY, 'canceled', 0, 0.0,
+                                      date=START + timedelta(minutes=9),
+                                      trading_pair=TradingPair.BTCEUR)]
+                           + [self.offer(minute, TradingPair.ETHEUR)
+                              for minute in range(10, 14)]).close()
+
+            archive = Archive(directory)
+
+            self.assertEqual(
+                [self.offer(minute) for minute in range(2, 6)],
+                list(archive.offers(START + timedelta(minutes=2),
+                                    START + timedelta(minutes=6))))
+            self.assertEqual(4, len(list(archive.offers(
+                trading_pair=TradingPair.ETHEUR))))
+            self.assertEqual(1, len(list(archive.events(
+                start=START + timedelta(minutes=9),
+                trading_pair=TradingPair.BTCEUR))))
+
+    if __name__ == '__main__':
+        unittest.main()
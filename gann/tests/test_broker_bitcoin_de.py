@@ -5,6 +5,7 @@ from unittest.mock import Mock
 import json
 import logging
 import sys
+import threading
 from typing import Dict
 
 from gann.broker_bitcoin_de import BrokerBitcoinDe
@@ -60,7 +61,67 @@ class TestBrokerBitcoinDe(unittest.TestCase):
         self.assertEqual('3', self.target.nonce())
         self.assertEqual('4', self.target.nonce())
 
-    @mock.patch('requests.get', Mock(return_value=MockResponse(
+    def test_concurrent_nonces(self):
+        """Expect unique nonces if several threads ask at once."""
+        nonces = []
+
+        def run():
+            nonces.extend(self.target.nonce() for _ in range(1000))
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(8000, len(set(nonces)))
+        self.assertEqual(8001, self.target.last_nonce)
+
+    def test_prepare(self):
+        """Expect prepared trades to be signed like any other post."""
+        offer = Offer(order_id='some id', amount=1, min_amount=0.1,
+                      price=100_00, type=OfferType.SELL,
+                      trading_pair=TradingPair.BTCEUR)
+        url, presigned = self.target.prepare(offer)
+        self.assertEqual(BrokerBitcoinDe.API_URL + 'btceur/trades/some id',
+                         url)
+        self.assertIs(presigned, self.target.prepare(offer)[1])
+
+        data = {'type': 'buy', 'amount_currency_to_trade': 0.2}
+        actual = self.target.signer.headers(presigned, data)
+        self.target.signer.last_nonce -= 1
+        self.assertEqual(self.target.post_headers(url, data), actual)
+
+    def test_pooled_session(self):
+        """Expect requests to the api to share a pool of connections."""
+        adapter = self.target.session.get_adapter(BrokerBitcoinDe.API_URL)
+        self.assertEqual(4, adapter._pool_maxsize)
+
+    def test_given_session(self):
+        """Expect a given session to be used for all requests."""
+        session = Mock()
+        session.post.return_value = MockResponse(201)
+        session.get.return_value = MockResponse(
+            200, {'trade': {'amount_currency_to_trade_after_fee': 0.19}})
+        target = BrokerBitcoinDe(trading_log=self.trading_log,
+                                 api_key='xxx', secret='yyy', init_nonce=1,
+                                 session=session)
+
+        actual = target.try_buy(
+            Offer(
+                order_id='some id3',
+                amount=1,
+                min_amount=0.1,
+                price=100_00,
+                type=OfferType.SELL,
+                trading_pair=TradingPair.BTGEUR),
+            amount=0.2)
+
+        self.assertEqual(actual, 0.19)
+        self.assertEqual(1, session.post.call_count)
+        self.assertEqual(1, session.get.call_count)
+
+    @mock.patch('requests.Session.get', Mock(return_value=MockResponse(
         200, {'trade': {'amount_currency_to_trade_after_fee': 0.0009}})))
     def test_gained_coins_after_fees(self):
 
@@ -75,7 +136,7 @@ class TestBrokerBitcoinDe(unittest.TestCase):
 
         self.assertEqual(actual, 0.0009)
 
-    @mock.patch('requests.get', Mock(return_value=MockResponse(
+    @mock.patch('requests.Session.get', Mock(return_value=MockResponse(
         200, {'trade': {'volume_currency_to_pay_after_fee': 90.0}})))
     def test_gained_money_after_fees(self):
         actual = self.target.gained_money_after_fees(
@@ -89,7 +150,7 @@ class TestBrokerBitcoinDe(unittest.TestCase):
 
         self.assertEqual(actual, 90_00)
 
-    @mock.patch('requests.post', Mock(return_value=MockResponse(
+    @mock.patch('requests.Session.post', Mock(return_value=MockResponse(
         422, {'errors': ['Order not possible'],
               'code': 51,
               'credits': 10})))
@@ -109,8 +170,8 @@ class TestBrokerBitcoinDe(unittest.TestCase):
         self.assertEqual(0, len(self.trading_log.content))
 
 
-    @mock.patch('requests.post', Mock(return_value=MockResponse(201)))
-    @mock.patch('requests.get', Mock(return_value=MockResponse(
+    @mock.patch('requests.Session.post', Mock(return_value=MockResponse(201)))
+    @mock.patch('requests.Session.get', Mock(return_value=MockResponse(
         200, {'trade': {'amount_currency_to_trade_after_fee': 0.19}})))
     def test_try_buy_success(self):
         """Expect the amount of bought coins if some buy request succeeded."""
@@ -127,7 +188,7 @@ class TestBrokerBitcoinDe(unittest.TestCase):
         self.assertEqual(actual, 0.19)
         self.assertEqual(1, len(self.trading_log.content))
 
-    @mock.patch('requests.post', Mock(return_value=MockResponse(
+    @mock.patch('requests.Session.post', Mock(return_value=MockResponse(
         422, {'errors': ['Order not possible'],
               'code': 51,
               'credits': 10})))
@@ -146,8 +207,8 @@ class TestBrokerBitcoinDe(unittest.TestCase):
         self.assertEqual(actual, False)
         self.assertEqual(0, len(self.trading_log.content))
 
-    @mock.patch('requests.post', Mock(return_value=MockResponse(201)))
-    @mock.patch('requests.get', Mock(return_value=MockResponse(
+    @mock.patch('requests.Session.post', Mock(return_value=MockResponse(201)))
+    @mock.patch('requests.Session.get', Mock(return_value=MockResponse(
         200, {'trade': {'volume_currency_to_pay_after_fee': 99.90}})))
     def test_try_sell_success(self):
         """Expect the recevied money (after fees) if a selling was
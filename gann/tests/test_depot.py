@@ -0,0 +1,69 @@
+import unittest
+import json
+import pickle
+
+from gann.depot import Depot
+
+class TestDepot(unittest.TestCase):
+
+    def setUp(self):
+        self.depot = Depot({5000_00: 0.01, 4000_00: 0.02, 4500_00: 0.03})
+
+    def test_prices_are_sorted(self):
+        """Expect the prices to be ordered, however they were added."""
+        self.depot[4200_00] = 0.5
+        del self.depot[4500_00]
+
+        self.assertEqual([4000_00, 4200_00, 5000_00], list(self.depot))
+        self.assertEqual(4000_00, self.depot.cheapest())
+        self.assertEqual((5000_00, 0.01), self.depot.popitem())
+        self.assertEqual(0.5, self.depot.pop(4200_00))
+        self.assertEqual([4000_00], self.depot.prices())
+
+    def test_cumulative(self):
+        """Expect the sums of amounts and costs from the cheapest on."""
+        amounts, costs = self.depot.cumulative()
+
+        self.assertEqual([0.02, 0.02 + 0.03, 0.02 + 0.03 + 0.01], amounts)
+        self.assertEqual([0.02 * 4000_00,
+                          0.02 * 4000_00 + 0.03 * 4500_00,
+                          0.02 * 4000_00 + 0.03 * 4500_00 + 0.01 * 5000_00],
+                         costs)
+        self.assertEqual(2, self.depot.count_within(0.05))
+
+        self.depot[3000_00] = 1
+        self.assertEqual(1, self.depot.cumulative()[0][0])
+        self.assertEqual(0, self.depot.count_within(0.05))
+
+    def test_remove_cheapest(self):
+        self.depot.remove_cheapest(2)
+
+        self.assertEqual({5000_00: 0.01}, self.depot)
+        self.assertEqual([0.01], self.depot.cumulative()[0])
+
+    def test_take_changes(self):
+        """Expect all prices first and then only the changed ones."""
+        self.assertEqual({4000_00, 4500_00, 5000_00},
+                         self.depot.take_changes())
+
+        self.depot[3000_00] = 1
+        self.depot.remove_cheapest(2)
+        del self.depot[5000_00]
+
+        self.assertEqual({3000_00, 4000_00, 5000_00},
+                         self.depot.take_changes())
+        self.assertEqual(set(), self.depot.take_changes())
+
+    def test_compatible_to_dict(self):
+        """Expect the depot to compare, serialize and pickle as dict."""
+        self.assertEqual({4000_00: 0.02, 4500_00: 0.03, 5000_00: 0.01},
+                         self.depot)
+        self.assertEqual({"400000": 0.02, "450000": 0.03, "500000": 0.01},
+                         json.loads(json.dumps(self.depot)))
+
+        copy = pickle.loads(pickle.dumps(self.depot))
+        copy[1] = 1.0
+        self.assertEqual([1, 4000_00, 4500_00, 5000_00], list(copy))
+
+    if __name__ == '__main__':
+        unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+import json
+import logging
+import sys
+import tempfile
+
+from pathlib import Path
+
+from gann.depot import Depot
+from gann.depot_journal import DepotJournal, FsyncPolicy
+from gann.offer import Offer, OfferType
+from gann.trader import Trader
+from gann.trader_conditions import TraderConditions
+from gann.trader_runner import TraderRunner
+from gann.trading_pair import TradingPair
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.ERROR)
+
+class TestBroker:
+    """ In these tests we guess, that all trades work"""
+    def __init__(self):
+        pass
+
+    def try_buy(self, offer, amount):
+        return amount
+
+    def try_sell(self, offer, amount):
+        return offer.price * amount
+
+class TestDepotJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.path = Path(self.temporary.name) / 'trader_depot.json'
+        self.path.write_text(json.dumps(
+            {"money": 1000_00, "depot": {"500000": 0.01}}))
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def journal(self, **kwargs):
+        return DepotJournal(self.path, fsync=FsyncPolicy.NEVER, **kwargs)
+
+    def test_recover_snapshot(self):
+        money, depot = self.journal().recover()
+
+        self.assertEqual(1000_00, money)
+        self.assertEqual({5000_00: 0.01}, depot)
+        self.assertIsInstance(depot, Depot)
+
+    def test_only_changes_are_appended(self):
+        """Expect an entry per trade holding only the changed positions."""
+        journal = self.journal()
+        money, depot = journal.recover()
+
+        journal.record(money, depot)
+        depot[4000_00] = 0.02
+        journal.record(900_00, depot)
+        del depot[5000_00]
+        journal.record(960_00, depot)
+
+        entries = [json.loads(line) for line in
+                   journal.journal_path.read_text().splitlines()]
+        self.assertEqual(
+            [{"money": 1000_00, "depot": {"500000": 0.01}},
+             {"money": 900_00, "set": {"400000": 0.02}, "del": []},
+             {"money": 960_00, "set": {}, "del": [500000]}],
+            entries)
+        # The snapshot is left alone until compaction
+        self.assertEqual({"money": 1000_00, "depot": {"500000": 0.01}},
+                         json.loads(self.path.read_text()))
+
+        self.assertEqual((960_00, {4000_00: 0.02}), self.journal().recover())
+
+    def test_incomplete_entry(self):
+        """Expect an entry torn by a crash to be ignored."""
+        journal = self.journal()
+        money, depot = journal.recover()
+        depot[4000_00] = 0.02
+        journal.record(900_00, depot)
+        journal.close()
+        with journal.journal_path.open('a') as file:
+            file.write('{"money": 80')
+
+        self.assertEqual((900_00, {4000_00: 0.02, 5000_00: 0.01}),
+                         self.journal().recover())
+
+    def test_compaction(self):
+        """Expect the snapshot to be replaced and the journal to be emptied,
+        once enough entries got written."""
+        journal = self.journal(compact_every=3)
+        money, depot = journal.recover()
+
+        for i in range(4):
+            depot[1000_00 * (i + 1)] = 0.01
+            journal.record(money - i, depot)
+
+        self.assertEqual(
+            {"money": 1000_00 - 2,
+             "depot": {"100000": 0.01, "200000": 0.01, "300000": 0.01,
+                       "500000": 0.01}},
+            json.loads(self.path.read_text()))
+        self.assertEqual(1, len(
+            journal.journal_path.read_text().splitlines()))
+        self.assertEqual((1000_00 - 3, depot), self.journal().recover())
+
+    def test_replay_after_compaction(self):
+        """Expect a journal, which was not emptied after writing the snapshot,
+        to lead to the same state."""
+        journal = self.journal()
+        money, depot = journal.recover()
+        depot[4000_00] = 0.02
+        journal.record(900_00, depot)
+        entries = journal.journal_path.read_text()
+        journal.close(900_00, depot)
+        journal.journal_path.write_text(entries)
+
+        self.assertEqual((900_00, {4000_00: 0.02, 5000_00: 0.01}),
+                         self.journal().recover())
+
+    def test_runner(self):
+        """Expect the runner to append to a journal after a trade."""
+        journal = self.journal()
+        money, depot = journal.recover()
+        trader = Trader(broker=TestBroker(), depot=depot, money=money,
+                        conditions=TraderConditions())
+        runner = TraderRunner([trader], [journal])
+
+        runner.add_order(Offer('1', 0.01, 0.0, 6000_00, OfferType.BUY,
+                               TradingPair.BTCEUR))
+
+        self.assertEqual((1060_00, {}), self.journal().recover())
+
+    def test_fixed_point(self):
+        """Expect depots in units to be journaled and stored as coins."""
+        journal = self.journal(units=TradingPair.BTCEUR, compact_every=2)
+        money, depot = journal.recover()
+        self.assertEqual({5000_00: 1_000_000}, depot)
+
+        depot[4000_00] = 2_000_000
+        journal.record(900_00, depot)
+        self.assertEqual({"money": 900_00,
+                          "depot": {"400000": 0.02, "500000": 0.01}},
+                         json.loads(journal.journal_path.read_text()))
+        self.assertEqual((900_00, {4000_00: 0.02, 5000_00: 0.01}),
+                         self.journal().recover())
+
+        del depot[5000_00]
+        journal.record(800_00, depot)
+        self.assertEqual({"money": 800_00, "depot": {"400000": 0.02}},
+                         json.loads(self.path.read_text()))
+        self.assertEqual(
+            (800_00, {4000_00: 2_000_000}),
+            self.journal(units=TradingPair.BTCEUR).recover())
+
+    if __name__ == '__main__':
+        unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+import logging
+import sys
+import threading
+
+from gann.event_pipeline import BackpressurePolicy, EventPipeline
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.INFO)
+
+class TestRunner:
+    """Remembers what it got."""
+    def __init__(self):
+        self.offers = []
+        self.removals = []
+
+    def add_order(self, offer):
+        self.offers.append(offer.order_id)
+
+    def remove_order(self, removal):
+        self.removals.append(removal.order_id)
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def offer_data(order_id):
+    return {'order_id': order_id, 'amount': '1.0', 'min_amount': '0.1',
+            'price': '5000.0', 'order_type': 'sell', 'trading_pair': 'btceur',
+            'payment_option': '1'}
+
+def removal_data(order_id):
+    return {'order_id': order_id, 'order_type': 'sell',
+            'trading_pair': 'btceur'}
+
+class TestEventPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.runner = TestRunner()
+        self.clock = Clock()
+
+    def pipeline(self, policy, max_size=10):
+        return EventPipeline(self.runner, max_size=max_size, policy=policy,
+                             max_age=0.1, clock=self.clock)
+
+    def drain(self, pipeline):
+        pipeline.start()
+        pipeline.stop(timeout=5)
+
+    def test_process_in_order(self):
+        pipeline = self.pipeline(BackpressurePolicy.BLOCK)
+        pipeline.add_order(offer_data('a'))
+        pipeline.remove_order(removal_data('a'))
+        pipeline.add_order(offer_data('b'))
+
+        self.drain(pipeline)
+
+        self.assertEqual(['a', 'b'], self.runner.offers)
+        self.assertEqual(['a'], self.runner.removals)
+        self.assertEqual(3, pipeline.metrics.processed)
+        self.assertEqual(3, pipeline.metrics.max_depth)
+        self.assertEqual(0, pipeline.metrics.depth)
+
+    def test_drop_stale(self):
+        """Expect offers which waited too long to be skipped, but not
+        removals."""
+        pipeline = self.pipeline(BackpressurePolicy.DROP_STALE)
+        pipeline.add_order(offer_data('old'))
+        pipeline.remove_order(removal_data('old'))
+        self.clock.now = 0.2
+        pipeline.add_order(offer_data('new'))
+
+        self.drain(pipeline)
+
+        self.assertEqual(['new'], self.runner.offers)
+        self.assertEqual(['old'], self.runner.removals)
+        self.assertEqual(1, pipeline.metrics.dropped_stale)
+        self.assertAlmostEqual(0.2, pipeline.metrics.max_age)
+
+    def test_drop_oldest_if_full(self):
+        pipeline = self.pipeline(BackpressurePolicy.DROP_STALE, max_size=2)
+        for order_id in 'abc':
+            pipeline.add_order(offer_data(order_id))
+
+        self.drain(pipeline)
+
+        self.assertEqual(['b', 'c'], self.runner.offers)
+        self.assertEqual(1, pipeline.metrics.dropped_full)
+
+    def test_keep_removals_if_full(self):
+        """Expect the oldest offers to be dropped from a full queue, but
+        never removals."""
+        pipeline = self.pipeline(BackpressurePolicy.DROP_STALE, max_size=2)
+        pipeline.remove_order(removal_data('x'))
+        pipeline.add_order(offer_data('a'))
+        pipeline.add_order(offer_data('b'))
+        pipeline.remove_order(removal_data('y'))
+        pipeline.remove_order(removal_data('z'))
+
+        self.drain(pipeline)
+
+        self.assertEqual([], self.runner.offers)
+        self.assertEqual(['x', 'y', 'z'], self.runner.removals)
+        self.assertEqual(2, pipeline.metrics.dropped_full)
+        self.assertEqual(3, pipeline.metrics.max_depth)
+
+    def test_block_without_worker(self):
+        """Expect the receiver not to wait for room, if no worker runs."""
+        pipeline = self.pipeline(BackpressurePolicy.BLOCK, max_size=2)
+        receiver = threading.Thread(target=lambda: [
+            pipeline.add_order(offer_data(order_id)) for order_id in 'abc'],
+            daemon=True)
+        receiver.start()
+        receiver.join(timeout=5)
+
+        self.assertFalse(receiver.is_alive())
+        self.assertEqual(1, pipeline.metrics.dropped_full)
+
+    def test_coalesce(self):
+        """Expect removed offers not to be processed at all and offers
+        offered again to be processed once."""
+        pipeline = self.pipeline(BackpressurePolicy.COALESCE)
+        pipeline.add_order(offer_data('a'))
+        pipeline.add_order(offer_data('b'))
+        pipeline.add_order(offer_data('a'))
+        pipeline.remove_order(removal_data('b'))
+        pipeline.remove_order(removal_data('c'))
+
+        self.drain(pipeline)
+
+        self.assertEqual(['a'], self.runner.offers)
+        self.assertEqual(['c'], self.runner.removals)
+        self.assertEqual(2, pipeline.metrics.coalesced)
+
+    if __name__ == '__main__':
+        unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+import logging
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from pathlib import Path
+
+from gann.feed import FeedClient, FeedServer
+from gann.offer import CompactOffer
+from gann.removal import CompactRemoval, Removal
+from gann.synthetic import SyntheticMarket
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.WARNING)
+
+class TestFeed(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.server = FeedServer(Path(self.temporary.name) / 'feed')
+
+    def tearDown(self):
+        self.server.close()
+        self.temporary.cleanup()
+
+    def receive(self, client):
+        """Receives the events of a client in the background like a trader
+        would."""
+        received = []
+        thread = threading.Thread(
+            target=lambda: received.extend(client.events()), daemon=True)
+        thread.start()
+        return thread, received
+
+    def connect(self, count):
+        clients = [FeedClient(self.server.path, timeout=0.05)
+                   for _ in range(count)]
+        # The server accepts in a thread of its own
+        deadline = time.monotonic() + 5
+        while len(self.server.clients) < count:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+        return clients
+
+    def test_fan_out(self):
+        """Expect each client to receive all events in order."""
+        receivers = [self.receive(client) for client in self.connect(2)]
+        events = list(SyntheticMarket(1).events(500))
+        for event in events:
+            if isinstance(event, Removal):
+                self.server.publish_removal(event)
+            else:
+                self.server.publish_offer(event)
+        self.server.close()
+
+        for thread, received in receivers:
+            thread.join(5)
+            self.assertEqual([event.order_id for event in events],
+                             [event.order_id for event in received])
+            self.assertEqual([event.timestamp for event in events],
+                             [event.timestamp for event in received])
+            self.assertTrue(any(isinstance(event, CompactOffer)
+                                for event in received))
+            self.assertTrue(any(isinstance(event, CompactRemoval)
+                                for event in received))
+        self.assertEqual(500, self.server.published)
+
+    def test_closed_client(self):
+        """Expect clients which went away to be disconnected, while the
+        others still receive events."""
+        gone, staying = self.connect(2)
+        gone.close()
+        thread, received = self.receive(staying)
+
+        offers = list(SyntheticMarket(2).offers(1000))
+        for offer in offers:
+            self.server.publish_offer(offer)
+        self.server.close()
+
+        self.assertEqual(1, self.server.disconnected)
+        thread.join(5)
+        self.assertEqual(1000, len(received))
+
+    def test_stalled_client(self):
+        """Expect a client which stopped reading to neither hold up
+        publishing nor the others, but to be disconnected once it is too far
+        behind."""
+        self.server.close()
+        self.server = FeedServer(Path(self.temporary.name) / 'feed',
+                                 send_timeout=30, send_buffer=4096,
+                                 max_backlog=100)
+        stalled, staying = self.connect(2)
+        thread, received = self.receive(staying)
+
+        offers = list(SyntheticMarket(3).offers(5000))
+        deadline = time.monotonic() + 5
+        for i, offer in enumerate(offers, 1):
+            self.server.publish_offer(offer)
+            # Let the reading client keep up
+            while i % 50 == 0 and len(received) < i:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.001)
+        self.assertEqual(1, self.server.disconnected)
+        self.assertEqual(1, len(self.server.clients))
+        self.server.close()
+
+        thread.join(5)
+        self.assertEqual(5000, len(received))
+        stalled.close()
+
+    def test_not_a_feed(self):
+        """Expect an error for sockets which do not publish events."""
+        path = str(Path(self.temporary.name) / 'other')
+        other = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        other.bind(path)
+        other.listen()
+        try:
+            def reject():
+                connection, _ = other.accept()
+                connection.sendall(b'nonsense' * 4)
+                connection.close()
+
+            threading.Thread(target=reject, daemon=True).start()
+            with self.assertRaises(ValueError):
+                FeedClient(path, timeout=0.05)
+        finally:
+            other.close()
+
+    if __name__ == '__main__':
+        unittest.main()
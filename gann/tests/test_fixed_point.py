@@ -0,0 +1,104 @@
+import unittest
+import logging
+import random
+import sys
+
+from gann.fixed_point import (depot_to_coins, depot_to_units, from_units,
+                              to_units)
+from gann.offer import Offer, OfferType
+from gann.trader import Trader
+from gann.trader_conditions import TraderConditions
+from gann.trading_pair import TradingPair
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.WARNING)
+
+class TestBroker:
+    """ In these tests we guess, that all trades work"""
+    def __init__(self):
+        pass
+
+    def try_buy(self, offer, amount):
+        return amount
+
+    def try_sell(self, offer, amount):
+        return int(offer.price * amount)
+
+class TestFixedPoint(unittest.TestCase):
+
+    def conditions(self, fixed_point, min_profit_str='500'):
+        return TraderConditions(step_price=20_00, turnaround_price=10_00,
+                                min_profit_str=min_profit_str,
+                                fixed_point=fixed_point)
+
+    def test_conversions(self):
+        self.assertEqual(1_000_000, to_units(0.01, TradingPair.BTCEUR))
+        self.assertEqual(10_000, to_units(0.01, TradingPair.XRPEUR))
+        self.assertEqual(0.01, from_units(1_000_000, TradingPair.BTCEUR))
+        self.assertEqual({5000_00: 0.01}, depot_to_coins(
+            depot_to_units({5000_00: 0.01}, TradingPair.BTCEUR),
+            TradingPair.BTCEUR))
+
+    def test_purchase_amount(self):
+        """Expect the same amounts as rounding coins, but as units."""
+        fixed = self.conditions(True)
+        floating = self.conditions(False)
+        for price in range(1_00, 60000_00, 997):
+            self.assertEqual(to_units(floating.purchase_amount(price),
+                                      TradingPair.BTCEUR),
+                             fixed.purchase_amount(price), price)
+
+    def test_integer_depot(self):
+        """Expect amounts in the depot and money to stay integers."""
+        trader = Trader(broker=TestBroker(), money=1000_00,
+                        conditions=self.conditions(True))
+        trader.highest_price_buying = 5100_00
+
+        self.assertTrue(trader.process_offer(Offer(
+            '1', 0.1, 0.0, 5000_00, OfferType.SELL, TradingPair.BTCEUR)))
+        self.assertEqual({5000_00: 2_000_000}, trader.depot)
+        self.assertEqual(900_00, trader.money)
+
+        self.assertFalse(trader.process_offer(Offer(
+            '2', 0.02, 0.0, 5100_00, OfferType.BUY, TradingPair.BTCEUR)))
+        self.assertTrue(trader.process_offer(Offer(
+            '3', 0.01, 0.0, 6000_00, OfferType.BUY, TradingPair.BTCEUR)))
+        self.assertEqual({5000_00: 1_000_000}, trader.depot)
+        self.assertEqual(960_00, trader.money)
+
+    def test_same_decisions(self):
+        """Expect the same trades as with amounts in floating point."""
+        for min_profit_str in ['500', '3%']:
+            generator = random.Random(7)
+            fixed = Trader(broker=TestBroker(), money=10000_00,
+                           conditions=self.conditions(True, min_profit_str))
+            floating = Trader(broker=TestBroker(), money=10000_00,
+                              conditions=self.conditions(False,
+                                                         min_profit_str))
+            price = 5000_00
+            trades = 0
+            for order_id in range(5000):
+                price = max(100_00, price + generator.randint(-50_00, 50_00))
+                offer = Offer(str(order_id),
+                              generator.choice([0.005, 0.01, 0.02, 0.5]),
+                              generator.choice([0.0, 0.001, 0.01]),
+                              price,
+                              generator.choice(list(OfferType)),
+                              TradingPair.BTCEUR)
+
+                traded = fixed.process_offer(offer)
+                self.assertEqual(floating.process_offer(offer), traded)
+                trades += traded
+
+            self.assertEqual(list(floating.depot), list(fixed.depot))
+            for price, amount in floating.depot.items():
+                self.assertAlmostEqual(
+                    amount, from_units(fixed.depot[price],
+                                       TradingPair.BTCEUR))
+            # Costs are rounded up to cents
+            self.assertIsInstance(fixed.money, int)
+            self.assertGreater(trades, 10)
+            self.assertAlmostEqual(floating.money, fixed.money, delta=trades)
+
+    if __name__ == '__main__':
+        unittest.main()
@@ -0,0 +1,201 @@
+import unittest
+import io
+import logging
+import math
+import sys
+
+from datetime import datetime, timedelta
+
+from gann.backtest import Backtest
+from gann.market_stats import MarketStatistics, PairStatistics
+from gann.offer import Offer, OfferType
+from gann.order_book import OrderBooks
+from gann.removal import Removal
+from gann.synthetic import SyntheticMarket
+from gann.trader import Trader
+from gann.trader_conditions import TraderConditions
+from gann.trader_runner import TraderRunner
+from gann.trading_pair import TradingPair
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.WARNING)
+
+START = datetime(2021, 3, 4, 12, 0, 0)
+
+class TestMarketStats(unittest.TestCase):
+
+    def offer(self, seconds, price, amount=1.0, offer_type=OfferType.SELL,
+              trading_pair=TradingPair.BTCEUR):
+        self.offer_id += 1
+        return Offer('#%i' % self.offer_id, amount, 0.0, price, offer_type,
+                     trading_pair, START + timedelta(seconds=seconds))
+
+    def setUp(self):
+        self.offer_id = 0
+
+    def test_window(self):
+        """Expect VWAP and extremes of the offers within the window only."""
+        statistics = PairStatistics(window=60)
+        statistics.add(self.offer(0, 100, 1.0))
+        statistics.add(self.offer(10, 300, 3.0))
+        statistics.add(self.offer(20, 200, 1.0))
+
+        self.assertAlmostEqual((100 + 900 + 200) / 5, statistics.vwap)
+        self.assertEqual(100, statistics.low)
+        self.assertEqual(300, statistics.high)
+
+        statistics.add(self.offer(65, 250, 1.0))
+        self.assertAlmostEqual((900 + 200 + 250) / 5, statistics.vwap)
+        self.assertEqual(200, statistics.low)
+        self.assertEqual(300, statistics.high)
+
+        statistics.add(self.offer(200, 150, 2.0))
+        self.assertAlmostEqual(150, statistics.vwap)
+        self.assertEqual(150, statistics.low)
+        self.assertEqual(150, statistics.high)
+        # The return is observed when the latest offer arrives
+        self.assertAlmostEqual(abs(math.log(150 / 250)),
+                               statistics.volatility)
+
+    def test_matches_rescanning(self):
+        """Expect the incremental statistics to match recomputing them from
+        the window's offers."""
+        statistics = PairStatistics(window=30)
+        offers = list(SyntheticMarket(5).offers(3000, TradingPair.BTCEUR))
+        for i, offer in enumerate(offers):
+            statistics.add(offer)
+            if i % 500:
+                continue
+            window = [other for other in offers[:i + 1]
+                      if other.timestamp > offer.timestamp - 30]
+            self.assertAlmostEqual(
+                sum(other.price * other.amount for other in window)
+                / sum(other.amount for other in window),
+                statistics.vwap, delta=1e-6)
+            self.assertEqual(min(other.price for other in window),
+                             statistics.low)
+            self.assertEqual(max(other.price for other in window),
+                             statistics.high)
+
+    def test_remove(self):
+        """Expect removed offers to no longer count towards VWAP and
+        extremes, even if they had displaced others."""
+        statistics = PairStatistics(window=60)
+        offers = [self.offer(0, 200, 1.0), self.offer(1, 100, 1.0),
+                  self.offer(2, 300, 1.0), self.offer(3, 150, 2.0)]
+        for offer in offers:
+            statistics.add(offer)
+        self.assertEqual(100, statistics.low)
+
+        self.assertTrue(statistics.remove(Removal(offers[1].order_id,
+                                                  OfferType.SELL, 'canceled')))
+        self.assertEqual(150, statistics.low)
+        self.assertEqual(300, statistics.high)
+        self.assertAlmostEqual((200 + 300 + 300) / 4, statistics.vwap)
+        self.assertEqual(3, statistics.snapshot()['offers'])
+
+        statistics.remove(offers[2])
+        self.assertEqual(200, statistics.high)
+        self.assertFalse(statistics.remove(offers[2]))
+
+        # Expired offers are gone already
+        statistics.add(self.offer(62, 400, 1.0))
+        self.assertFalse(statistics.remove(offers[0]))
+        self.assertEqual(150, statistics.low)
+        self.assertAlmostEqual((300 + 400) / 3, statistics.vwap)
+
+    def test_remove_matches_rescanning(self):
+        """Expect the statistics to match recomputing them from the offers
+        of the window, which were not removed."""
+        statistics = MarketStatistics(window=30)
+        events = list(SyntheticMarket(7).events(3000))
+        open_offers = dict()
+        for i, event in enumerate(events):
+            if isinstance(event, Removal):
+                statistics.remove(event)
+                open_offers.pop(event.order_id, None)
+            else:
+                statistics.add(event)
+                open_offers[event.order_id] = event
+            if i % 250:
+                continue
+            pair = statistics.pair(TradingPair.BTCEUR)
+            window = [offer for offer in open_offers.values()
+                      if offer.trading_pair == TradingPair.BTCEUR
+                      and offer.timestamp > pair.now - 30]
+            if not window:
+                self.assertIsNone(pair.low)
+                continue
+            self.assertAlmostEqual(
+                sum(offer.price * offer.amount for offer in window)
+                / sum(offer.amount for offer in window),
+                pair.vwap, delta=1e-6)
+            self.assertEqual(min(offer.price for offer in window), pair.low)
+            self.assertEqual(max(offer.price for offer in window), pair.high)
+
+    def test_ewma(self):
+        """Expect older prices to weigh less, by half after the halflife."""
+        statistics = PairStatistics(halflife=10)
+        statistics.add(self.offer(0, 100))
+        statistics.add(self.offer(10, 200))
+
+        self.assertAlmostEqual((0.5 * 100 + 200) / 1.5, statistics.ewma)
+
+        # Offers at the same time weigh the same
+        statistics.add(self.offer(10, 200))
+        self.assertAlmostEqual((0.5 * 100 + 400) / 2.5, statistics.ewma)
+
+    def test_volatility(self):
+        """Expect returns between offers of the same type only."""
+        statistics = PairStatistics()
+        statistics.add(self.offer(0, 100, offer_type=OfferType.SELL))
+        statistics.add(self.offer(1, 90, offer_type=OfferType.BUY))
+        statistics.add(self.offer(2, 110, offer_type=OfferType.SELL))
+        statistics.add(self.offer(3, 99, offer_type=OfferType.BUY))
+
+        self.assertAlmostEqual(
+            math.sqrt(math.log(1.1) ** 2 + math.log(1.1) ** 2),
+            statistics.volatility)
+
+    def test_runner(self):
+        """Expect the runner to keep the statistics and the spread of its
+        traders' pair up to date."""
+        statistics = MarketStatistics()
+        trader = Trader(broker=None, money=0)
+        runner = TraderRunner([trader], [io.StringIO()],
+                              statistics=statistics)
+
+        runner.add_order(self.offer(0, 100, offer_type=OfferType.BUY))
+        runner.add_order(self.offer(1, 120, offer_type=OfferType.SELL))
+        runner.add_order(self.offer(2, 500, trading_pair=TradingPair.ETHEUR))
+
+        self.assertIs(statistics.pair(TradingPair.BTCEUR), trader.statistics)
+        self.assertEqual(110, trader.statistics.vwap)
+        self.assertEqual(20, trader.statistics.spread)
+        runner.remove_order(Removal('#2', OfferType.SELL, 'canceled'))
+        self.assertIsNone(trader.statistics.spread)
+        self.assertEqual(100, trader.statistics.vwap)
+        self.assertEqual({'btceur', 'etheur'}, set(statistics.snapshot()))
+
+    def test_backtest(self):
+        """Expect the same statistics in replays as live."""
+        events = list(SyntheticMarket(3).events(1000))
+        live = MarketStatistics(order_books=OrderBooks())
+        for event in events:
+            if isinstance(event, Removal):
+                live.order_books.remove(event)
+                live.remove(event)
+            else:
+                live.order_books.add(event)
+                live.add(event)
+
+        replayed = MarketStatistics()
+        backtest = Backtest(TraderConditions(), statistics=replayed)
+        backtest.run(events)
+
+        self.assertEqual(live.snapshot(), replayed.snapshot())
+        self.assertIs(replayed.pair(TradingPair.BTCEUR),
+                      backtest.trader.statistics)
+
+    if __name__ == '__main__':
+        unittest.main()
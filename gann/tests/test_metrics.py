@@ -0,0 +1,184 @@
+import unittest
+import io
+import logging
+import random
+import sys
+
+from gann.metrics import Histogram, InstrumentedBroker, Metrics
+from gann.offer import Offer, OfferType
+from gann.trader import Trader
+from gann.trader_conditions import TraderConditions
+from gann.trader_runner import TraderRunner
+from gann.trading_pair import TradingPair
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.WARNING)
+
+class TestBroker:
+    def __init__(self, result):
+        self.result = result
+
+    def try_buy(self, offer, amount):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+    def try_sell(self, offer, amount):
+        return self.try_buy(offer, amount)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        self.now += 1000
+        return self.now
+
+class TestMetrics(unittest.TestCase):
+
+    def test_bucket_bounds(self):
+        """Expect each value within the bounds of its bucket and buckets to
+        be narrow."""
+        histogram = Histogram()
+        for value in list(range(1000)) + [random.randrange(1 << 39)
+                                          for _ in range(1000)]:
+            index = histogram.index(value)
+            self.assertLessEqual(histogram.lowest(index), value)
+            self.assertGreaterEqual(histogram.highest(index), value)
+            self.assertLessEqual(
+                histogram.highest(index) - histogram.lowest(index),
+                max(value / 64, 0))
+
+    def test_percentile(self):
+        """Expect percentiles within a percent of the exact ones."""
+        generator = random.Random(1)
+        values = sorted(int(generator.lognormvariate(11, 2))
+                        for _ in range(10000))
+        histogram = Histogram()
+        for value in values:
+            histogram.record(value)
+
+        self.assertEqual(len(values), histogram.count)
+        self.assertEqual(max(values), histogram.max)
+        for quantile in (0.5, 0.9, 0.99, 0.999):
+            exact = values[int(quantile * len(values) + 0.5) - 1]
+            self.assertAlmostEqual(exact, histogram.percentile(quantile),
+                                   delta=exact / 100)
+
+    def test_render(self):
+        """Expect histograms and counters in Prometheus' format."""
+        metrics = Metrics()
+        metrics.observe('decision', 3000)
+        metrics.observe('decision', 2_000_000)
+        metrics.increment('offers_total', trading_pair='btceur',
+                          outcome='accepted')
+
+        text = metrics.render()
+        self.assertIn('# TYPE gann_latency_seconds histogram', text)
+        self.assertIn(
+            'gann_latency_seconds_bucket{stage="decision",le="1e-05"} 1',
+            text)
+        self.assertIn(
+            'gann_latency_seconds_bucket{stage="decision",le="+Inf"} 2',
+            text)
+        self.assertIn('gann_latency_seconds_count{stage="decision"} 2', text)
+        self.assertIn('gann_latency_quantile_seconds{stage="decision",'
+                      'quantile="0.5"}', text)
+        self.assertIn('gann_offers_total{outcome="accepted",'
+                      'trading_pair="btceur"} 1', text)
+
+    def test_runner(self):
+        """Expect the runner to time decisions and count outcomes."""
+        metrics = Metrics(clock=FakeClock())
+        trader = Trader(broker=TestBroker(1), money=1000_00,
+                        conditions=TraderConditions(
+                            trading_pair=TradingPair.BTCEUR))
+        runner = TraderRunner([trader], [io.StringIO()], metrics)
+
+        runner.add_order(Offer('A', 1.0, 0.0, 100000_00, OfferType.SELL,
+                               TradingPair.ETHEUR), received=0)
+        runner.add_order(Offer('B', 1.0, 0.0, 100000_00, OfferType.SELL,
+                               TradingPair.BTCEUR))
+
+        self.assertEqual(1, metrics.counter('offers_total',
+                                            trading_pair='etheur',
+                                            outcome='no_traders'))
+        self.assertEqual(1, metrics.counter('offers_total',
+                                            trading_pair='btceur',
+                                            outcome='filtered'))
+        self.assertEqual(2, metrics.histograms['decision'].count)
+        self.assertEqual(1, metrics.histograms['receive_to_decision'].count)
+
+    def test_runner_stages(self):
+        """Expect decisions timed without the broker and persisting, and
+        rejections counted by reason."""
+        clock = FakeClock()
+
+        class SlowBroker(TestBroker):
+            def try_sell(self, offer, amount):
+                clock.now += 10 ** 9
+                return self.result
+
+        metrics = Metrics(clock=clock)
+        trader = Trader(broker=SlowBroker(1), money=1_00,
+                        depot={5000_00: 0.01})
+        runner = TraderRunner([trader], [io.StringIO()], metrics)
+
+        runner.add_order(Offer('A', 1.0, 0.0, 4000_00, OfferType.SELL,
+                               TradingPair.BTCEUR))
+        runner.add_order(Offer('B', 1.0, 1.0, 6000_00, OfferType.BUY,
+                               TradingPair.BTCEUR))
+        runner.add_order(Offer('C', 1.0, 0.0, 6000_00, OfferType.BUY,
+                               TradingPair.BTCEUR), received=0)
+
+        for reason in ('money', 'min_amount'):
+            self.assertEqual(1, metrics.counter('rejections_total',
+                                                trading_pair='btceur',
+                                                reason=reason))
+        self.assertEqual(1, metrics.counter('offers_total',
+                                            trading_pair='btceur',
+                                            outcome='accepted'))
+        self.assertEqual(3, metrics.histograms['decision'].count)
+        self.assertLess(metrics.histograms['decision'].max, 10 ** 6)
+        self.assertLess(metrics.histograms['receive_to_decision'].max,
+                        clock.now - 10 ** 9)
+        self.assertEqual(1, metrics.histograms['persist'].count)
+
+    def test_disabled(self):
+        """Expect nothing recorded by disabled metrics."""
+        metrics = Metrics(enabled=False)
+        trader = Trader(broker=TestBroker(1), money=1000_00)
+        runner = TraderRunner([trader], [io.StringIO()], metrics)
+        runner.add_order(Offer('A', 1.0, 0.0, 100_00, OfferType.SELL,
+                               TradingPair.BTCEUR))
+
+        self.assertEqual({}, metrics.histograms)
+        self.assertEqual({}, metrics.counters)
+
+    def test_instrumented_broker(self):
+        """Expect outcomes of trades counted and errors passed on."""
+        metrics = Metrics()
+        offer = Offer('A', 1.0, 0.0, 100_00, OfferType.SELL,
+                      TradingPair.BTCEUR)
+
+        self.assertEqual(1, InstrumentedBroker(TestBroker(1), metrics)
+                         .try_buy(offer, 1.0))
+        self.assertEqual(0, InstrumentedBroker(TestBroker(0), metrics)
+                         .try_sell(offer, 1.0))
+        with self.assertRaises(ValueError):
+            InstrumentedBroker(TestBroker(ValueError()), metrics) \
+                .try_buy(offer, 1.0)
+
+        self.assertEqual(1, metrics.counter('broker_requests_total',
+                                            operation='buy',
+                                            outcome='success'))
+        self.assertEqual(1, metrics.counter('broker_requests_total',
+                                            operation='sell',
+                                            outcome='failed'))
+        self.assertEqual(1, metrics.counter('broker_requests_total',
+                                            operation='buy',
+                                            outcome='error'))
+        self.assertEqual(2, metrics.histograms['broker_buy'].count)
+
+    if __name__ == '__main__':
+        unittest.main()
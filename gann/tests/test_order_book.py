@@ -0,0 +1,84 @@
+import unittest
+
+from gann.offer import Offer, OfferType
+from gann.order_book import OrderBook, OrderBooks
+from gann.removal import Removal
+from gann.trading_pair import TradingPair
+
+class TestOrderBook(unittest.TestCase):
+
+    def offer(self, offer_type, price, amount=1.0,
+              trading_pair=TradingPair.BTCEUR):
+        self.offer_id += 1
+
+        return Offer(
+            order_id='#'+str(self.offer_id),
+            amount=amount,
+            min_amount=0.0,
+            price=price,
+            type=offer_type,
+            trading_pair=trading_pair)
+
+    def setUp(self):
+        self.offer_id = 0
+        self.book = OrderBook(TradingPair.BTCEUR)
+
+    def test_empty(self):
+        self.assertIsNone(self.book.best_bid())
+        self.assertIsNone(self.book.best_ask())
+        self.assertIsNone(self.book.spread())
+
+    def test_best_prices_and_depth(self):
+        for offer in [self.offer(OfferType.BUY, 4900_00),
+                      self.offer(OfferType.BUY, 4950_00, 0.5),
+                      self.offer(OfferType.BUY, 4950_00, 0.25),
+                      self.offer(OfferType.SELL, 5100_00),
+                      self.offer(OfferType.SELL, 5000_00, 2.0)]:
+            self.book.add(offer)
+
+        self.assertEqual(4950_00, self.book.best_bid())
+        self.assertEqual(5000_00, self.book.best_ask())
+        self.assertEqual(50_00, self.book.spread())
+        self.assertEqual(0.75, self.book.depth(OfferType.BUY, 4950_00))
+        self.assertEqual(0.0, self.book.depth(OfferType.SELL, 4950_00))
+        self.assertEqual({'trading_pair': 'btceur',
+                          'bids': [[4950_00, 0.75]],
+                          'asks': [[5000_00, 2.0]]},
+                         self.book.snapshot(levels=1))
+
+    def test_remove(self):
+        """Expect removed offers and emptied price levels to be gone."""
+        cheap = self.offer(OfferType.SELL, 5000_00)
+        self.book.add(cheap)
+        self.book.add(self.offer(OfferType.SELL, 5100_00))
+
+        self.assertEqual(cheap, self.book.remove_order(cheap.order_id))
+        self.assertIsNone(self.book.remove_order(cheap.order_id))
+        self.assertEqual(5100_00, self.book.best_ask())
+        self.assertEqual(1, len(self.book))
+
+    def test_offered_again(self):
+        """Expect an offer sent again to replace the previous one."""
+        offer = self.offer(OfferType.SELL, 5000_00)
+        self.book.add(offer)
+        self.book.add(offer)
+
+        self.assertEqual(1, len(self.book.asks))
+        self.assertEqual(1.0, self.book.depth(OfferType.SELL, 5000_00))
+
+    def test_books_route_removals(self):
+        """Expect removals to find their book, even without trading
+        pair."""
+        books = OrderBooks()
+        offer = self.offer(OfferType.BUY, 100_00,
+                           trading_pair=TradingPair.ETHEUR)
+        books.add(offer)
+        books.add(self.offer(OfferType.BUY, 5000_00))
+
+        self.assertEqual(offer, books.remove(
+            Removal(offer.order_id, OfferType.BUY, 'canceled')))
+        self.assertEqual(0, len(books.book(TradingPair.ETHEUR)))
+        self.assertEqual(1, len(books.book(TradingPair.BTCEUR)))
+
+    if __name__ == '__main__':
+        unittest.main()
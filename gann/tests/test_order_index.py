@@ -0,0 +1,137 @@
+import unittest
+import logging
+import math
+import sys
+import tempfile
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from gann.offer import Offer, OfferType
+from gann.order_index import (bucket_of, build_order_index, NOWHERE,
+                              open_order_index)
+from gann.query import Archive
+from gann.removal import Removal
+from gann.serialization import EVENT_TYPE, EventWriter
+from gann.trading_pair import TradingPair
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.WARNING)
+
+START = datetime(2021, 3, 4, 12, 0, 0)
+
+class TestOrderIndex(unittest.TestCase):
+
+    def offer(self, order_id, minute, trading_pair=TradingPair.BTCEUR):
+        return Offer(order_id, 1.0, 0.1, 1000_00 + minute, OfferType.BUY,
+                     trading_pair, START + timedelta(minutes=minute))
+
+    def removal(self, order_id, minute):
+        return Removal(order_id, OfferType.BUY, 'canceled', 0, 0.0,
+                       date=START + timedelta(minutes=minute),
+                       trading_pair=TradingPair.BTCEUR)
+
+    def write(self, name, events):
+        (self.directory / name).parent.mkdir(exist_ok=True)
+        with (self.directory / name).open('wb') as file:
+            writer = EventWriter(file)
+            for event in events:
+                if isinstance(event, Offer):
+                    writer.write_offer(event)
+                else:
+                    writer.write_removal(event)
+            writer.close()
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary.name)
+
+        # The sniffer reconnected, so `a` is re-emitted in the second file,
+        # `b` got removed twice, `c` was added before the archive starts
+        # and `d` is never removed.
+        self.write('sniffed_since_2021-03-04_12:00:00',
+                   [self.offer('a', 1), self.offer('b', 2),
+                    self.removal('c', 3), self.removal('b', 4)])
+        self.write('sniffed_since_2021-03-04_13:00:00',
+                   [self.offer('a', 61), self.removal('b', 62),
+                    self.removal('a', 63)])
+        self.write('btceur/sniffed_since_2021-03-04_12:30:00',
+                   [self.offer('d', 31)])
+        self.index = build_order_index(Archive(self.directory), buckets=4,
+                                       chunk_size=2)
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def test_lookup(self):
+        """Expect the first add and removal of each id."""
+        entry = self.index.lookup('a')
+        self.assertEqual(2, entry['adds'])
+        self.assertEqual(1, entry['removals'])
+        self.assertEqual((START + timedelta(minutes=1)).timestamp(),
+                         entry['added_at'])
+        self.assertEqual(1000_01, self.index.added(entry)['price'])
+        self.assertEqual((START + timedelta(minutes=63)).timestamp(),
+                         self.index.removed(entry)['timestamp'])
+
+        entry = self.index.lookup('b')
+        self.assertEqual(2, entry['removals'])
+        self.assertEqual(0, entry['removed_file'])
+        self.assertEqual(3, entry['removed_record'])
+
+        entry = self.index.lookup('c')
+        self.assertEqual(NOWHERE, entry['added_file'])
+        self.assertIsNone(self.index.added(entry))
+        self.assertTrue(math.isnan(entry['added_at']))
+
+        self.assertIsNone(self.index.removed(self.index.lookup('d')))
+        self.assertIsNone(self.index.lookup('e'))
+        self.assertEqual(4, len(self.index))
+
+    def test_buckets(self):
+        """Expect each bucket sorted and holding the ids hashed to it."""
+        for bucket, entries in enumerate(self.index.entries()):
+            self.assertTrue(np.all(entries['order_id'][:-1]
+                                   < entries['order_id'][1:]))
+            self.assertTrue(np.all(bucket_of(entries['order_id'], 4)
+                                   == bucket))
+
+    def test_locate(self):
+        entries, found = self.index.locate(
+            np.array([b'd', b'x', b'a'], dtype='S6'))
+        self.assertEqual([True, False, True], list(found))
+        self.assertEqual([1, 2], list(entries['adds'][found]))
+
+    def test_deduplicated(self):
+        """Expect re-emitted offers and repeated removals to be dropped."""
+        events = [(record['order_id'], record['event'])
+                  for records in self.index.deduplicated(chunk_size=2)
+                  for record in records]
+        added = EVENT_TYPE.ADDED.value
+        removed = EVENT_TYPE.REMOVED.value
+        self.assertEqual([(b'a', added), (b'b', added), (b'c', removed),
+                          (b'b', removed), (b'd', added), (b'a', removed)],
+                         events)
+
+    def test_lifetimes(self):
+        """Expect the seconds between first add and first removal of the
+        offers added and removed within the archive."""
+        lifetimes = sorted(np.concatenate(list(self.index.lifetimes())))
+        self.assertEqual([2 * 60.0, 62 * 60.0], lifetimes)
+
+    def test_reopen(self):
+        """Expect the index to be found within the archive, even if it
+        moved."""
+        moved = Path(self.temporary.name + '_moved')
+        self.directory.rename(moved)
+        try:
+            index = open_order_index(moved)
+            self.assertEqual(1000_02,
+                             index.added(index.lookup('b'))['price'])
+        finally:
+            moved.rename(self.directory)
+
+    if __name__ == '__main__':
+        unittest.main()
@@ -0,0 +1,238 @@
+import unittest
+import logging
+import sys
+import tempfile
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from gann.backtest import RemovalIndex
+from gann.offer import Offer, OfferType
+from gann.query import (Archive, archive_file_date, parse_shard_name,
+                        shard_name, shard_of)
+from gann.removal import CompactRemoval, Removal
+from gann.serialization import (concatenate_records, EventWriter,
+                                serialize_offer_v1)
+from gann.trading_pair import TradingPair
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.INFO)
+
+START = datetime(2021, 3, 4, 12, 0, 0)
+
+class TestQuery(unittest.TestCase):
+
+    def offer(self, offer_type, minute, trading_pair=TradingPair.BTCEUR):
+        """Creates a new offer appearing `minute` minutes after `START`."""
+        self.offer_id += 1
+
+        return Offer(
+            order_id='#'+str(self.offer_id),
+            amount=1.0,
+            min_amount=0.1,
+            price=1000_00 + minute,
+            type=offer_type,
+            trading_pair=trading_pair,
+            date=START + timedelta(minutes=minute))
+
+    def write(self, name, events, finish=True):
+        (self.directory / name).parent.mkdir(exist_ok=True)
+        with (self.directory / name).open('wb') as file:
+            writer = EventWriter(file, index_interval=2)
+            for event in events:
+                if isinstance(event, Offer):
+                    writer.write_offer(event)
+                else:
+                    writer.write_removal(event)
+            if finish:
+                writer.close()
+
+    def setUp(self):
+        self.offer_id = 0
+        self.temporary = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary.name)
+
+        # Two hours, one file per hour, the second one still being written
+        self.write('sniffed_since_2021-03-04_12:00:00',
+                   [self.offer(OfferType.BUY, minute)
+                    for minute in range(0, 60, 5)])
+        self.write('sniffed_since_2021-03-04_13:00:00',
+                   [self.offer(OfferType.SELL, minute, TradingPair.ETHEUR)
+                    for minute in range(60, 120, 5)]
+                   + [Removal('#1', OfferType.BUY, 'canceled', 0, 0.0,
+                              date=START + timedelta(minutes=121),
+                              trading_pair=TradingPair.BTCEUR)],
+                   finish=False)
+        (self.directory / 'unrelated').write_bytes(b'nothing')
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def test_archive_file_date(self):
+        self.assertEqual(START, archive_file_date(
+            'some/where/sniffed_since_2021-03-04_12:00:00_2'))
+        self.assertIsNone(archive_file_date('unrelated'))
+
+    def test_files_between(self):
+        """Expect only the files covering the time range to be picked."""
+        archive = Archive(self.directory)
+
+        self.assertEqual(2, len(archive.files))
+        self.assertEqual(
+            [archive.files[0]],
+            archive.files_between(START + timedelta(minutes=10),
+                                  START + timedelta(minutes=20)))
+        self.assertEqual(
+            archive.files,
+            archive.files_between(START + timedelta(minutes=50),
+                                  START + timedelta(minutes=70)))
+        self.assertEqual(
+            [archive.files[1]],
+            archive.files_between(START + timedelta(hours=5)))
+
+    def test_time_range(self):
+        """Expect exactly the events of a time range spanning files."""
+        archive = Archive(self.directory)
+
+        offers = list(archive.offers(START + timedelta(minutes=50),
+                                     START + timedelta(minutes=70)))
+
+        self.assertEqual([50, 55, 60, 65],
+                         [offer.price - 1000_00 for offer in offers])
+
+    def test_unfiltered_records_are_views(self):
+        """Expect unfiltered records of the current layout not to be
+        copied."""
+        archive = Archive(self.directory)
+
+        records = list(archive.records(START, START + timedelta(minutes=30)))
+
+        self.assertEqual(1, len(records))
+        self.assertEqual(6, len(records[0]))
+        self.assertFalse(records[0].flags.owndata)
+
+    def test_close(self):
+        """Expect closing to unmap the files, unless records still view
+        them, and the files to be mapped again on next use."""
+        with Archive(self.directory) as archive:
+            kept = list(archive.records(START, START + timedelta(minutes=30)))
+            mapped = [file.data() for file in archive.files]
+        self.assertFalse(mapped[0].closed)
+        self.assertTrue(mapped[1].closed)
+        self.assertEqual(6, len(kept[0]))
+
+        self.assertEqual(24, len(list(archive.offers())))
+        self.assertIsNot(mapped[1], archive.files[1].data())
+
+    def test_filters(self):
+        """Expect filters by trading pair, offer type and event type."""
+        archive = Archive(self.directory)
+
+        self.assertEqual(12, len(list(archive.offers(
+            trading_pair=TradingPair.ETHEUR))))
+        self.assertEqual(0, len(list(archive.offers(
+            trading_pair=TradingPair.ETHEUR, offer_type=OfferType.BUY))))
+        self.assertEqual(13, len(list(archive.events(
+            trading_pair=TradingPair.BTCEUR))))
+        self.assertEqual(
+            [Removal('#1', OfferType.BUY, 'canceled', 0, 0.0,
+                     date=START + timedelta(minutes=121),
+                     trading_pair=TradingPair.BTCEUR)],
+            list(archive.events(start=START + timedelta(minutes=120))))
+
+    def test_legacy_files(self):
+        """Expect files of the legacy layout to be queried as well."""
+        (self.directory / 'sniffed_since_2021-03-04_14:00:00').write_bytes(
+            b''.join(serialize_offer_v1(self.offer(OfferType.BUY, minute))
+                     for minute in range(120, 180, 5)))
+        archive = Archive(self.directory)
+
+        offers = list(archive.offers(START + timedelta(minutes=150)))
+
+        self.assertEqual(6, len(offers))
+
+    def test_shard_name(self):
+        self.assertEqual('btceur', shard_name(TradingPair.BTCEUR))
+        self.assertEqual((TradingPair.ETHEUR, OfferType.SELL),
+                         parse_shard_name(shard_name(TradingPair.ETHEUR,
+                                                     OfferType.SELL)))
+        self.assertEqual((TradingPair.BTCEUR, None),
+                         parse_shard_name('btceur'))
+        self.assertIsNone(parse_shard_name('btceur_nothing'))
+        self.assertIsNone(parse_shard_name('unrelated'))
+
+    def test_shard_of(self):
+        """Expect removals to be sharded by the type of their offer."""
+        offer = self.offer(OfferType.SELL, 0, TradingPair.ETHEUR)
+        removal = CompactRemoval('#1', OfferType.BUY, 'canceled', 0, 0.0,
+                                 START.timestamp(), TradingPair.BTCEUR)
+        self.assertEqual((TradingPair.ETHEUR, None), shard_of(offer))
+        self.assertEqual((TradingPair.ETHEUR, OfferType.SELL),
+                         shard_of(offer, by_type=True))
+        self.assertEqual((TradingPair.BTCEUR, OfferType.BUY),
+                         shard_of(removal, by_type=True))
+        self.assertEqual((TradingPair.BTCEUR, OfferType.BUY),
+                         shard_of(removal.to_removal(), by_type=True))
+
+    def test_shards(self):
+        """Expect queries to read only the shards they need and to merge
+        shards in time order."""
+        self.temporary.cleanup()
+        self.directory.mkdir()
+        self.write('btceur/sniffed_since_2021-03-04_12:00:00',
+                   [self.offer(OfferType.BUY, minute)
+                    for minute in range(0, 60, 10)])
+        self.write('btceur/sniffed_since_2021-03-04_13:00:00',
+                   [self.offer(OfferType.BUY, minute)
+                    for minute in range(60, 120, 10)])
+        self.write('etheur/sniffed_since_2021-03-04_12:30:00',
+                   [self.offer(OfferType.SELL, minute, TradingPair.ETHEUR)
+                    for minute in range(30, 90, 15)])
+        archive = Archive(self.directory)
+
+        self.assertEqual({(TradingPair.BTCEUR, None),
+                          (TradingPair.ETHEUR, None)}, set(archive.shards))
+        self.assertEqual(1, len(archive.shards_of(TradingPair.ETHEUR)))
+
+        # A single shard's records stay views on the file
+        records = list(archive.records(trading_pair=TradingPair.BTCEUR))
+        self.assertEqual([6, 6], [len(chunk) for chunk in records])
+        self.assertFalse(records[0].flags.owndata)
+
+        offers = list(archive.offers(START + timedelta(minutes=20),
+                                     START + timedelta(minutes=80)))
+        self.assertEqual([20, 30, 30, 40, 45, 50, 60, 60, 70, 75],
+                         [offer.price - 1000_00 for offer in offers])
+        self.assertEqual(4, len(list(archive.offers(
+            offer_type=OfferType.SELL))))
+
+    def test_unknown_removals(self):
+        """Expect removals of an unknown trading pair to be included in
+        queries of all pairs, which do not ask for offers only."""
+        self.offer_id = 0
+        self.temporary.cleanup()
+        self.directory.mkdir()
+        self.write('btceur/sniffed_since_2021-03-04_12:00:00',
+                   [self.offer(OfferType.BUY, 0),
+                    Removal('#1', OfferType.BUY, 'canceled', 0, 0.0,
+                            date=START + timedelta(minutes=1),
+                            trading_pair=TradingPair.BTCEUR)])
+        self.write('unknown/sniffed_since_2021-03-04_12:00:00',
+                   [Removal('#0', OfferType.SELL, 'canceled', 0, 0.0,
+                            date=START + timedelta(minutes=2))])
+        self.write('etheur/sniffed_since_2021-03-04_12:00:00',
+                   [self.offer(OfferType.SELL, 3, TradingPair.ETHEUR)])
+        archive = Archive(self.directory)
+
+        records = concatenate_records(list(archive.records(
+            trading_pair=TradingPair.BTCEUR)))
+        self.assertEqual([b'#1', b'#1', b'#0'], list(records['order_id']))
+        removals = RemovalIndex.from_records(records)
+        self.assertEqual(2, len(removals))
+        self.assertEqual(1, len(list(archive.offers(
+            trading_pair=TradingPair.BTCEUR))))
+        self.assertEqual(2, sum(len(records) for records in archive.records(
+            trading_pair=TradingPair.ETHEUR)))
+
+    if __name__ == '__main__':
+        unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import io
+import logging
+import os
+import sys
+import tempfile
+
+from datetime import datetime
+from pathlib import Path
+
+from gann.offer import Offer, OfferType, PaymentOption
+from gann import raw_dump
+from gann.raw_dump import (chunk_ranges, convert, convert_chunk,
+                           LineParser)
+from gann.removal import Removal
+from gann.serialization import deserialize_from
+from gann.trading_pair import TradingPair
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.INFO)
+
+ADDED = {'order_id': 'ABC', 'amount': '0.5', 'min_amount': '0.1',
+         'price': '1000.01', 'order_type': 'buy', 'trading_pair': 'btceur',
+         'payment_option': '2'}
+REMOVED = {'order_id': 'ABC', 'order_type': 'buy', 'reason': 'canceled',
+           'trading_pair': 'btceur'}
+
+class TestRawDump(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.path = Path(self.temporary.name) / 'raw'
+        self.path.write_text(
+            '{"added": %s, "timestamp": 1600000000.5}\n'
+            % str(ADDED).replace("'", '"')
+            + str({'removed': REMOVED}) + '\n'
+            + '\n'
+            + 'broken\n'
+            + str({'refresh_express_option': {}}) + '\n')
+        os.utime(self.path, (1600000001, 1600000001))
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def test_chunk_ranges(self):
+        """Expect chunks to end at line boundaries and to cover the file."""
+        ranges = chunk_ranges(self.path, 10)
+
+        content = self.path.read_bytes()
+        self.assertEqual(0, ranges[0][0])
+        self.assertEqual(len(content), ranges[-1][1])
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(b'\n', content[end - 1:end])
+
+    def test_convert_chunk(self):
+        """Expect JSON and python lines to be parsed and errors counted."""
+        records, stats = convert_chunk(self.path, 0,
+                                       self.path.stat().st_size, 0.0)
+
+        self.assertEqual(2 * 64, len(records))
+        self.assertEqual(5, stats.lines)
+        self.assertEqual(2, stats.events)
+        self.assertEqual(1, stats.errors)
+
+    def test_line_parser(self):
+        """Expect the format of the previous line to be tried first."""
+        calls = []
+
+        def loads(line):
+            calls.append(line)
+            return raw_dump.loads(line)
+
+        parse = LineParser()
+        parse.parsers = (loads, raw_dump._literal_eval)
+        self.assertEqual({'a': 1}, parse(b'{"a": 1}'))
+        self.assertEqual({'b': 2}, parse(b"{'b': 2}"))
+        self.assertEqual({'c': 3}, parse(b"{'c': 3}"))
+        self.assertEqual([b'{"a": 1}', b"{'b': 2}"], calls)
+        self.assertIsNone(parse(b'  '))
+
+    def test_convert(self):
+        """Expect the converted events to be those the websocket sent."""
+        output = io.BytesIO()
+
+        stats = convert([self.path, self.path], output, processes=2,
+                        chunk_size=10)
+        output.seek(0)
+        events = list(deserialize_from(output))
+
+        self.assertEqual(4, stats.events)
+        self.assertEqual(2, stats.errors)
+        offer = Offer('ABC', 0.5, 0.1, 1000_01, OfferType.BUY,
+                      TradingPair.BTCEUR,
+                      datetime.fromtimestamp(1600000000.5),
+                      PaymentOption.SEPA_ONLY)
+        removal = Removal('ABC', OfferType.BUY, 'canceled', 0, float('nan'),
+                          datetime.fromtimestamp(1600000001),
+                          TradingPair.BTCEUR)
+        self.assertEqual([offer, offer], events[::2])
+        self.assertEqual([str(removal)] * 2,
+                         [str(event) for event in events[1::2]])
+        self.assertEqual([removal.date] * 2,
+                         [event.date for event in events[1::2]])
+
+    if __name__ == '__main__':
+        unittest.main()
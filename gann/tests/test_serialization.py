@@ -2,14 +2,24 @@ import unittest
 import logging
 import sys
 import io
+import os
+import random
+import tempfile
 
 from datetime import datetime, timedelta
 
-from gann.offer import Offer, OfferType
-from gann.removal import Removal
+from gann.offer import (CompactOffer, Offer, OfferType,
+                        compact_offer_bitcoin_de, offer_bitcoin_de)
+from gann.removal import CompactRemoval, Removal
 from gann.trading_pair import TradingPair
 from gann.serialization import (serialize_offer_to, serialize_removal_to,
-                                deserialize_from)
+                                deserialize_from, deserialize_arrays,
+                                serialize_offer_v1, serialize_removal_v1,
+                                convert_legacy, load_arrays, read_index,
+                                seek_time, iter_events, records_view,
+                                EventWriter,
+                                OFFER_TYPES_BY_INDEXES,
+                                TRADING_PAIRS_BY_INDEXES)
 
 logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
 logging.getLogger().setLevel(logging.INFO)
@@ -78,5 +88,191 @@ class TestSerialisation(unittest.TestCase):
         self.assertEqual(1, len(actuals))
         self.assertEqual(actuals[0], expected)
 
+    def test_deserialize_arrays(self):
+        """
+        Expect the columnar reader to yield the same values as
+        `deserialize_from` for a mixed stream of offers and removals.
+        """
+        date = datetime.now() - timedelta(days=1)
+        buffer = io.BytesIO()
+        serialize_offer_to(self.offer(OfferType.SELL, 1000_00, date=date),
+                           buffer)
+        serialize_removal_to(Removal("#1", OfferType.SELL, "reason", 1000_00,
+                                     1.5, date=date), buffer)
+        serialize_offer_to(self.offer(OfferType.BUY, 2000_00, amount=0.5,
+                                      trading_pair=TradingPair.ETHEUR,
+                                      date=date), buffer)
+
+        offers, removals = deserialize_arrays(buffer.getvalue())
+
+        self.assertEqual(2, len(offers))
+        self.assertEqual(1, len(removals))
+        self.assertEqual([b'#1', b'#2'], list(offers['order_id']))
+        self.assertEqual([1000_00, 2000_00], list(offers['price']))
+        self.assertEqual([2.0, 0.5], list(offers['amount']))
+        self.assertEqual(OfferType.BUY,
+                         OFFER_TYPES_BY_INDEXES[offers['type'][1]])
+        self.assertEqual(TradingPair.ETHEUR,
+                         TRADING_PAIRS_BY_INDEXES[offers['trading_pair'][1]])
+        self.assertEqual(date.timestamp(), offers['timestamp'][0])
+        self.assertEqual(b'reason', removals['reason'][0])
+        self.assertEqual(1.5, removals['amount'][0])
+
+    def test_compact_events(self):
+        """Expect compact offers and removals to convert to equal events and
+        to serialize like them."""
+        date = datetime.now() - timedelta(days=1)
+        expected = [self.offer(OfferType.SELL, 1000_00, date=date),
+                    Removal("#1", OfferType.SELL, "reason", 1000_00, 1.5,
+                            date=date, trading_pair=TradingPair.BTCEUR)]
+        buffer = io.BytesIO()
+        writer = EventWriter(buffer)
+        writer.write_offer(expected[0])
+        writer.write_removal(expected[1])
+        writer.close()
+
+        offer, removal = iter_events(records_view(buffer.getvalue()),
+                                     compact=True)
+
+        self.assertIsInstance(offer, CompactOffer)
+        self.assertIsInstance(removal, CompactRemoval)
+        self.assertEqual(expected, [offer.to_offer(), removal.to_removal()])
+        self.assertEqual(str(expected[0]), str(offer))
+        self.assertEqual(date, offer.date)
+
+        compact = io.BytesIO()
+        writer = EventWriter(compact)
+        writer.write_offer(offer)
+        writer.write_removal(removal)
+        writer.close()
+        self.assertEqual(buffer.getvalue(), compact.getvalue())
+
+    def test_compact_offer_bitcoin_de(self):
+        """Expect the same offer as `offer_bitcoin_de` creates."""
+        data = {'order_id': 'ABC', 'amount': '0.5', 'min_amount': '0.1',
+                'price': '1000.01', 'order_type': 'buy',
+                'trading_pair': 'btceur', 'payment_option': '2'}
+
+        expected = offer_bitcoin_de(data)
+        offer = compact_offer_bitcoin_de(data).to_offer()
+
+        self.assertEqual(expected, Offer(**{**offer.__dict__,
+                                            'date': expected.date}))
+        self.assertAlmostEqual(expected.timestamp, offer.timestamp, delta=1)
+
+    def test_deserialize_arrays_ignores_truncated_tail(self):
+        """Expect an incompletely written last event to be skipped."""
+        buffer = io.BytesIO()
+        serialize_offer_to(self.offer(OfferType.SELL, 1000_00), buffer)
+        serialize_offer_to(self.offer(OfferType.SELL, 1000_00), buffer)
+
+        offers, removals = deserialize_arrays(buffer.getvalue()[:-3])
+
+        self.assertEqual(1, len(offers))
+        self.assertEqual(0, len(removals))
+
+    def test_deserialize_legacy(self):
+        """Expect files of the legacy layout to be still readable."""
+        date = datetime.now() - timedelta(days=2)
+        offer = self.offer(OfferType.SELL, 1000_00, date=date)
+        removal = Removal("theId", OfferType.BUY, "reason", 0, 0.0, date=date)
+
+        buffer = io.BytesIO(serialize_offer_v1(offer)
+                            + serialize_removal_v1(removal))
+
+        self.assertEqual([offer, removal], list(deserialize_from(buffer)))
+
+    def test_deserialize_legacy_pipe(self):
+        """Expect legacy data to be readable from streams, which can not
+        seek."""
+        date = datetime.now() - timedelta(days=2)
+        offer = self.offer(OfferType.SELL, 1000_00, date=date)
+        removal = Removal("theId", OfferType.BUY, "reason", 0, 0.0, date=date)
+
+        read, write = os.pipe()
+        with os.fdopen(write, 'wb') as output:
+            output.write(serialize_removal_v1(removal)
+                         + serialize_offer_v1(offer))
+        with os.fdopen(read, 'rb') as stream:
+            self.assertEqual([removal, offer],
+                             list(deserialize_from(stream)))
+
+    def test_deserialize_legacy_arrays(self):
+        """Expect the columns of all complete events of a long legacy
+        stream, whose last event got cut off."""
+        generator = random.Random(1)
+        events = []
+        for i in range(500):
+            if generator.random() < 0.3:
+                events.append(Removal('#%i' % i, OfferType.BUY, 'reason',
+                                      100_00, 0.5))
+            else:
+                events.append(self.offer(OfferType.SELL, 1000_00 + i))
+        data = b''.join(serialize_offer_v1(event) if isinstance(event, Offer)
+                        else serialize_removal_v1(event) for event in events)
+
+        offers, removals = deserialize_arrays(data[:-5])
+
+        complete = events[:-1]
+        self.assertEqual([event.price for event in complete
+                          if isinstance(event, Offer)],
+                         list(offers['price']))
+        self.assertEqual([event.order_id.encode() for event in complete
+                          if isinstance(event, Removal)],
+                         list(removals['order_id']))
+
+    def test_seek_time(self):
+        """Expect to find the first record at or after a timestamp using the
+        index of a finished file."""
+        start = datetime.now() - timedelta(days=1)
+        buffer = io.BytesIO()
+        writer = EventWriter(buffer, index_interval=4)
+        for second in range(0, 40, 2):
+            writer.write_offer(self.offer(
+                OfferType.BUY, 1000_00,
+                date=start + timedelta(seconds=second)))
+
+        unfinished = buffer.getvalue()
+        writer.close()
+        finished = buffer.getvalue()
+
+        self.assertIsNone(read_index(unfinished))
+        self.assertEqual(5, len(read_index(finished)[1]))
+
+        for data in (unfinished, finished):
+            self.assertEqual(0, seek_time(data, start.timestamp() - 1))
+            self.assertEqual(5, seek_time(
+                data, (start + timedelta(seconds=10)).timestamp()))
+            self.assertEqual(6, seek_time(
+                data, (start + timedelta(seconds=11)).timestamp()))
+            self.assertEqual(20, seek_time(
+                data, (start + timedelta(seconds=60)).timestamp()))
+
+        buffer.seek(0)
+        self.assertEqual(20, len(list(deserialize_from(buffer))))
+
+    def test_convert_legacy(self):
+        """Expect a converted legacy file to contain the same events."""
+        date = datetime.now() - timedelta(days=2)
+        offer = self.offer(OfferType.SELL, 1000_00, date=date)
+        removal = Removal("#1", OfferType.SELL, "reason", 0, 0.0, date=date)
+
+        with tempfile.TemporaryDirectory() as directory:
+            legacy = os.path.join(directory, 'legacy')
+            current = os.path.join(directory, 'current')
+            with open(legacy, 'wb') as legacy_file:
+                legacy_file.write(serialize_offer_v1(offer)
+                                  + serialize_removal_v1(removal))
+
+            self.assertEqual(2, convert_legacy(legacy, current))
+
+            with open(current, 'rb') as current_file:
+                self.assertEqual([offer, removal],
+                                 list(deserialize_from(current_file)))
+
+            offers, removals = load_arrays(current)
+            self.assertEqual(1, len(offers))
+            self.assertEqual(1, len(removals))
+
     if __name__ == '__main__':
         unittest.main()
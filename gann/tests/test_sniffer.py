@@ -0,0 +1,69 @@
+import unittest
+import logging
+import sys
+import tempfile
+
+from importlib.machinery import SourceFileLoader
+from importlib.util import module_from_spec, spec_from_loader
+from pathlib import Path
+
+from gann.offer import OfferType
+from gann.query import Archive
+from gann.trading_pair import TradingPair
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.WARNING)
+
+SNIFFER = Path(__file__).resolve().parents[2] / 'bin' / 'sniffer'
+
+try:
+    import socketio
+except ImportError:
+    socketio = None
+
+def load_sniffer():
+    """Imports `bin/sniffer` as module."""
+    loader = SourceFileLoader('sniffer', str(SNIFFER))
+    module = module_from_spec(spec_from_loader('sniffer', loader))
+    loader.exec_module(module)
+    return module
+
+@unittest.skipUnless(socketio is not None and SNIFFER.exists(),
+                     "bin/sniffer needs socketio")
+class TestSniffer(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary.name)
+        self.sniffer = load_sniffer()
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def test_shard_by_pair_and_type(self):
+        """Expect removals to be sharded by the type of their offer."""
+        serializer = self.sniffer.Serializer(
+            self.directory, '/market',
+            shard_by=self.sniffer.SHARD_BY_PAIR_AND_TYPE)
+        serializer.on_add_order({
+            'order_id': 'A1', 'order_type': 'buy', 'amount': 1.0,
+            'min_amount': 0.1, 'price': 100.0, 'trading_pair': 'btceur',
+            'payment_option': '1'})
+        serializer.on_remove_order({'order_id': 'B2', 'order_type': 'sell',
+                                    'reason': 'canceled'})
+        serializer.on_remove_order({'order_id': 'A1', 'order_type': 'buy',
+                                    'reason': 'canceled'})
+        serializer.close()
+
+        archive = Archive(self.directory)
+        self.assertEqual({(TradingPair.BTCEUR, OfferType.BUY),
+                          (TradingPair.UNKNOWN, OfferType.SELL)},
+                         set(archive.shards))
+        # The removal of the seen offer is stored along with it
+        records = list(archive.shards[TradingPair.BTCEUR, OfferType.BUY][0]
+                       .records())
+        self.assertEqual([b'A1', b'A1'],
+                         [record['order_id'] for record in records])
+
+    if __name__ == '__main__':
+        unittest.main()
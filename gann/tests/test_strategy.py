@@ -0,0 +1,137 @@
+import unittest
+import io
+import logging
+import random
+import sys
+
+from datetime import datetime, timedelta
+
+from gann.backtest import Backtest
+from gann.market_stats import MarketStatistics
+from gann.offer import Offer, OfferType
+from gann.strategy import Sale, Strategy, ThresholdStrategy
+from gann.synthetic import SyntheticMarket
+from gann.trader import Trader
+from gann.trader_conditions import TraderConditions
+from gann.trader_runner import TraderRunner
+from gann.trading_pair import TradingPair
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.WARNING)
+
+START = datetime(2021, 3, 4, 12, 0, 0)
+
+class BelowAverageStrategy(Strategy):
+    """Buys 0.1 coins of sell offers below the average price and sells the
+    positions fitting into buy offers above it."""
+
+    def buy(self, trader, offer, amount, min_amount):
+        vwap = trader.statistics.vwap
+        if vwap is None or offer.price >= vwap or min_amount > 0.1:
+            return None
+        return min(amount, 0.1)
+
+    def sell(self, trader, offer, amount):
+        vwap = trader.statistics.vwap
+        if vwap is None or offer.price <= vwap:
+            return None
+        # Sell the cheapest positions fitting into the offer
+        consumed = trader.depot.count_within(amount)
+        if not consumed:
+            return None
+        amounts, costs = trader.depot.cumulative()
+        return Sale(consumed, amounts[consumed - 1], costs[consumed - 1])
+
+class TestStrategy(unittest.TestCase):
+
+    def test_incomplete(self):
+        """Expect strategies to implement both buying and selling."""
+        class BuyOnly(Strategy):
+            def buy(self, trader, offer, amount, min_amount):
+                return amount
+
+        with self.assertRaises(TypeError):
+            BuyOnly()
+        with self.assertRaises(TypeError):
+            Strategy()
+
+    def test_compiled_enough(self):
+        """Expect the compiled profit checks to decide exactly as the
+        conditions do."""
+        generator = random.Random(1)
+        strategy = ThresholdStrategy()
+        for fixed_point in (False, True):
+            for min_profit in ('1000', '1337', '3%', '7%'):
+                conditions = TraderConditions(min_profit_str=min_profit,
+                                              amount_price=99_99,
+                                              fixed_point=fixed_point)
+                enough = strategy.compile(conditions).enough
+                for _ in range(2000):
+                    price = generator.randrange(1000_00, 60000_00)
+                    if fixed_point:
+                        amount = generator.randrange(1, 10 ** 8)
+                        spent = amount * generator.randrange(900_00, 60000_00)
+                    else:
+                        amount = generator.uniform(0.0001, 2)
+                        spent = amount * generator.uniform(900_00, 60000_00)
+                    offer = Offer('#', 1.0, 0.0, price, OfferType.BUY,
+                                  TradingPair.BTCEUR)
+                    self.assertEqual(
+                        conditions.enough(amount, offer, spent),
+                        enough(amount, price, spent))
+
+    def test_recompile(self):
+        """Expect new conditions to be compiled on assignment."""
+        trader = Trader(broker=None, money=0)
+        self.assertEqual(120_00, trader.decisions.max_price)
+
+        trader.conditions = TraderConditions(amount_price=200_00)
+        self.assertEqual(220_00, trader.decisions.max_price)
+        self.assertEqual(-10_00, trader.buy_limit())
+
+        trader.conditions = TraderConditions(turnaround_price=50_00)
+        self.assertEqual(-50_00, trader.buy_limit())
+
+    def test_backtest(self):
+        """Expect a strategy to decide in backtests with the trader's
+        statistics."""
+        backtest = Backtest(TraderConditions(), money=100000_00,
+                            statistics=MarketStatistics(),
+                            strategy=BelowAverageStrategy())
+        report = backtest.run(SyntheticMarket(2).events(5000))
+
+        self.assertTrue(report.trades)
+        for trade in report.trades:
+            if trade.type == OfferType.BUY:
+                self.assertLessEqual(trade.amount, 0.1)
+        self.assertEqual({OfferType.BUY, OfferType.SELL},
+                         {trade.type for trade in report.trades})
+
+    def test_runner(self):
+        """Expect the runner to pass every offer to strategies without
+        bounds."""
+        class Broker:
+            def try_buy(self, offer, amount):
+                return amount
+
+            def try_sell(self, offer, amount):
+                return offer.price * amount
+
+        statistics = MarketStatistics()
+        trader = Trader(broker=Broker(), money=1000_00,
+                        strategy=BelowAverageStrategy())
+        runner = TraderRunner([trader], [io.StringIO()],
+                              statistics=statistics)
+
+        for i, (offer_type, price) in enumerate((
+                (OfferType.SELL, 500_00), (OfferType.SELL, 300_00),
+                (OfferType.BUY, 450_00))):
+            runner.add_order(Offer('#%i' % i, 1.0, 0.0, price, offer_type,
+                                   TradingPair.BTCEUR,
+                                   START + timedelta(seconds=i)))
+
+        self.assertEqual(1000_00 - 30_00 + 45_00, trader.money)
+        self.assertEqual({}, trader.depot)
+
+    if __name__ == '__main__':
+        unittest.main()
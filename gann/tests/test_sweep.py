@@ -0,0 +1,133 @@
+import unittest
+import logging
+import sys
+import io
+import tempfile
+
+from datetime import datetime, timedelta
+from multiprocessing import shared_memory
+from pathlib import Path
+
+from gann.offer import Offer, OfferType
+from gann.query import Archive
+from gann.removal import Removal
+from gann import sweep as sweep_module
+from gann.serialization import (serialize_offer_to, serialize_removal_to,
+                                deserialize_records, RECORD_DTYPE)
+from gann.sweep import load_records, parameter_grid, sweep, format_table
+from gann.trader_conditions import TraderConditions
+from gann.trading_pair import TradingPair
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.WARNING)
+
+START = datetime(2021, 3, 4, 12, 0, 0)
+
+class TestSweep(unittest.TestCase):
+
+    def offer(self, offer_type, price, amount=1.0,
+              trading_pair=TradingPair.BTCEUR):
+        """Creates a new offer, one minute after the previous one."""
+        self.offer_id += 1
+
+        return Offer(
+            order_id='#'+str(self.offer_id),
+            amount=amount,
+            min_amount=0.0,
+            price=price,
+            type=offer_type,
+            trading_pair=trading_pair,
+            date=START + timedelta(minutes=self.offer_id))
+
+    def setUp(self):
+        self.offer_id = 0
+
+    def test_parameter_grid(self):
+        """Expect one conditions object for each combination."""
+        grid = parameter_grid(TraderConditions(decimals=3),
+                              step_price=[10_00, 20_00],
+                              min_profit_str=['1000', '5%'])
+
+        self.assertEqual(4, len(grid))
+        self.assertEqual({3}, {conditions.decimals for conditions in grid})
+        self.assertEqual([False, True, False, True],
+                         [conditions.percentage for conditions in grid])
+        with self.assertRaises(ValueError):
+            parameter_grid(TraderConditions(), decimals=[1])
+
+    def test_load_records(self):
+        """Expect the offers of the pair and removals of an unknown pair,
+        from unsharded files and the pair's shards."""
+        with tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+            (directory / 'etheur').mkdir()
+            with (directory / 'sniffed_since_2021-03-04_12:00:00').open(
+                    'wb') as file:
+                serialize_offer_to(self.offer(OfferType.BUY, 5000_00), file)
+                serialize_offer_to(self.offer(
+                    OfferType.BUY, 100_00,
+                    trading_pair=TradingPair.ETHEUR), file)
+                serialize_removal_to(Removal('#1', OfferType.BUY, 'canceled',
+                                             date=START), file)
+            with (directory / 'etheur'
+                  / 'sniffed_since_2021-03-04_13:00:00').open('wb') as file:
+                serialize_offer_to(self.offer(
+                    OfferType.BUY, 200_00,
+                    trading_pair=TradingPair.ETHEUR), file)
+
+            records = load_records(Archive(directory),
+                                   trading_pair=TradingPair.BTCEUR)
+
+        self.assertEqual([b'#1', b'#1'], list(records['order_id']))
+        self.assertEqual([5000_00, 0], list(records['price']))
+
+    def test_read_only_records(self):
+        """Expect workers not to be able to change the shared records."""
+        memory = shared_memory.SharedMemory(create=True,
+                                            size=RECORD_DTYPE.itemsize)
+        try:
+            sweep_module._attach(memory.name, 1)
+            with self.assertRaises(ValueError):
+                sweep_module._worker_records['price'] = 1
+        finally:
+            sweep_module._worker_records = None
+            if sweep_module._worker_memory is not None:
+                sweep_module._worker_memory.close()
+                sweep_module._worker_memory = None
+            memory.close()
+            memory.unlink()
+
+    def test_sweep(self):
+        """Expect all conditions to be evaluated and sorted by profit."""
+        buffer = io.BytesIO()
+        for offer in [self.offer(OfferType.BUY, 5000_00),
+                      self.offer(OfferType.SELL, 4900_00),
+                      self.offer(OfferType.BUY, 5500_00)]:
+            serialize_offer_to(offer, buffer)
+        records = deserialize_records(buffer.getvalue())
+
+        # Only a turnaround below 100 € makes the trader buy at 4900 €,
+        # only a profit of at most 10% lets it sell at 5500 € afterwards.
+        # The held coins are valued at 5500 € as well.
+        results = sweep(records,
+                        parameter_grid(TraderConditions(),
+                                       turnaround_price=[50_00, 200_00],
+                                       min_profit_str=['5%', '20%']),
+                        processes=2)
+
+        self.assertEqual(4, len(results))
+        self.assertEqual([50_00, 50_00],
+                         [result.conditions.turnaround_price
+                          for result in results[:2]])
+        self.assertEqual({'5%': 2, '20%': 1},
+                         {result.conditions.min_profit_str: result.trades
+                          for result in results[:2]})
+        self.assertGreater(results[1].profit, 0)
+        self.assertEqual([0, 0], [result.profit for result in results[2:]])
+        self.assertEqual(
+            sorted([result.profit for result in results], reverse=True),
+            [result.profit for result in results])
+        self.assertEqual(3, len(format_table(results, limit=2).splitlines()))
+
+    if __name__ == '__main__':
+        unittest.main()
@@ -235,6 +235,7 @@ class TestTrader(unittest.TestCase):
 
         self.assertEqual(self.trader.money, 1000_00)
         self.assertEqual(self.trader.depot, INTITIAL_DEPOT)
+        self.assertEqual('profit', self.trader.rejection)
 
     def test_enough_profit(self):
         """Expect the trader to sell, if it makes enoguht profit"""
@@ -242,6 +243,7 @@ class TestTrader(unittest.TestCase):
 
         self.assertEqual(self.trader.money, 1060_00)
         self.assertEqual(self.trader.depot, dict())
+        self.assertIsNone(self.trader.rejection)
 
     def test_enough_profit_but_something_left(self):
         """Expect the trader have something left, if the offer asks for less
@@ -309,6 +311,7 @@ class TestTrader(unittest.TestCase):
 
         self.assertEqual(self.trader.depot, INTITIAL_DEPOT)
         self.assertEqual(self.trader.money, 1000_00)
+        self.assertEqual('buy_limit', self.trader.rejection)
 
     def test_do_not_buy_when_there_is_not_enough_money(self):
         """Expect to ignore sellings we have too little money to buy."""
@@ -318,6 +321,7 @@ class TestTrader(unittest.TestCase):
 
         self.assertEqual(self.trader.depot, INTITIAL_DEPOT)
         self.assertEqual(self.trader.money, 1_00)
+        self.assertEqual('money', self.trader.rejection)
 
     def test_sell_only_profitalbe(self):
         """Expect to sell only the profitalbe positions,
@@ -332,5 +336,29 @@ class TestTrader(unittest.TestCase):
                                              4018100: 0.002})
         self.assertEqual(self.trader.money, 1000_00 + 88_00)
 
+    def test_prepare_before_deciding(self):
+        """Expect the broker to prepare a trade of an offer before the
+        strategy decides on it."""
+        calls = []
+
+        class PreparingBroker(TestBroker):
+            def prepare(self, offer):
+                calls.append(('prepare', offer.order_id))
+
+            def try_sell(self, offer, amount):
+                calls.append(('sell', offer.order_id))
+                return offer.price * amount
+
+        class Strategy(type(self.trader.strategy)):
+            def sell(self, trader, offer, amount):
+                calls.append(('decide', offer.order_id))
+                return super().sell(trader, offer, amount)
+
+        self.trader.broker = PreparingBroker()
+        self.trader.strategy = Strategy()
+        self.trader.process_offer(self.offer(OfferType.BUY, 6000_00, 0.01))
+
+        self.assertEqual([('prepare', 1), ('decide', 1), ('sell', 1)], calls)
+
     if __name__ == '__main__':
         unittest.main()
@@ -0,0 +1,143 @@
+import unittest
+import io
+import json
+import logging
+import random
+import sys
+
+from gann.fixed_point import depot_to_units
+from gann.offer import Offer, OfferType
+from gann.trader import Trader
+from gann.trader_conditions import TraderConditions
+from gann.trader_runner import TraderRunner
+from gann.trading_pair import TradingPair
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.WARNING)
+
+class TestBroker:
+    """ In these tests we guess, that all trades work"""
+    def __init__(self):
+        pass
+
+    def try_buy(self, offer, amount):
+        return amount
+
+    def try_sell(self, offer, amount):
+        return offer.price * amount
+
+def traders():
+    """A couple of traders with differing conditions on two pairs."""
+    return [Trader(broker=TestBroker(),
+                   depot={5000_00 + 100_00 * i: 0.01} if i % 3 else None,
+                   money=1000_00,
+                   conditions=TraderConditions(
+                       step_price=10_00 * (i + 1),
+                       turnaround_price=5_00 * (i + 1),
+                       min_profit_str='%i%%' % (i + 1) if i % 2 else '500',
+                       trading_pair=(TradingPair.BTCEUR if i < 8
+                                     else TradingPair.ETHEUR)))
+            for i in range(10)]
+
+class TestTraderRunner(unittest.TestCase):
+
+    def offers(self, count, seed=1):
+        """A random walk of offers around 5000 €."""
+        generator = random.Random(seed)
+        price = 5000_00
+        for order_id in range(count):
+            price = max(100_00, price + generator.randint(-50_00, 50_00))
+            yield Offer(
+                order_id=str(order_id),
+                amount=generator.choice([0.005, 0.01, 0.02, 1]),
+                min_amount=generator.choice([0.0, 0.001, 0.5]),
+                price=price,
+                type=generator.choice(list(OfferType)),
+                trading_pair=generator.choice([TradingPair.BTCEUR,
+                                               TradingPair.ETHEUR,
+                                               TradingPair.LTCEUR]))
+
+    def test_same_trades_as_processing_every_trader(self):
+        """Expect the same outcome as letting every trader process every
+        offer until the first one trades."""
+        expected = traders()
+        actual = traders()
+        depots = [io.StringIO() for _ in actual]
+        runner = TraderRunner(actual, depots)
+
+        for offer in self.offers(3000):
+            runner.add_order(offer)
+
+            # The runner before prefiltering traders
+            for trader in expected:
+                if trader.process_offer(offer):
+                    break
+
+        self.assertEqual([(trader.money, trader.depot) for trader in expected],
+                         [(trader.money, trader.depot) for trader in actual])
+        self.assertEqual(
+            [(trader.highest_price_buying, trader.lowest_price_selling)
+             for trader in expected],
+            [(trader.highest_price_buying, trader.lowest_price_selling)
+             for trader in actual])
+        self.assertNotEqual([trader.depot for trader in traders()],
+                            [trader.depot for trader in actual])
+
+    def test_traders_after_the_accepting_one(self):
+        """Expect traders after the one, which took an offer, not to see
+        it."""
+        early, late = [Trader(broker=TestBroker(), depot={5000_00: 0.01},
+                              money=1000_00, conditions=TraderConditions())
+                       for _ in range(2)]
+        runner = TraderRunner([early, late], [io.StringIO(), io.StringIO()])
+
+        runner.add_order(Offer('1', 0.01, 0.0, 6000_00, OfferType.BUY,
+                               TradingPair.BTCEUR))
+
+        self.assertEqual({}, early.depot)
+        self.assertEqual(6000_00, early.highest_price_buying)
+        self.assertEqual({5000_00: 0.01}, late.depot)
+        self.assertEqual(0, late.highest_price_buying)
+
+        # Nobody takes this one, so all of them see it
+        runner.add_order(Offer('2', 0.01, 0.0, 100_00, OfferType.SELL,
+                               TradingPair.BTCEUR))
+        self.assertEqual([100_00, 100_00], [early.lowest_price_selling,
+                                            late.lowest_price_selling])
+
+    def test_persist_depot_after_trade(self):
+        """Expect the depot of a trader to be written after it traded."""
+        trader = Trader(broker=TestBroker(), depot={5000_00: 0.01},
+                        money=1000_00, conditions=TraderConditions())
+        depot = io.StringIO()
+        runner = TraderRunner([trader], [depot])
+
+        runner.add_order(Offer('1', 0.01, 0.0, 6000_00, OfferType.BUY,
+                               TradingPair.BTCEUR))
+
+        self.assertEqual({"money": 1060_00, "depot": {}},
+                         json.loads(depot.getvalue()))
+
+    def test_persist_fixed_point_depot(self):
+        """Expect depots of traders in fixed-point mode to be stored in
+        coins, so that they read back the same in either mode."""
+        conditions = TraderConditions(fixed_point=True)
+        positions = {5000_00: 0.01, 4000_00: 0.02}
+        trader = Trader(broker=TestBroker(), money=1000_00,
+                        depot=depot_to_units(positions,
+                                             TradingPair.BTCEUR),
+                        conditions=conditions)
+        depot = io.StringIO()
+        runner = TraderRunner([trader], [depot])
+
+        runner.add_order(Offer('1', 0.01, 0.0, 4500_00, OfferType.BUY,
+                               TradingPair.BTCEUR))
+
+        stored = {int(price): amount for price, amount
+                  in json.loads(depot.getvalue())['depot'].items()}
+        self.assertEqual({4000_00: 0.01, 5000_00: 0.01}, stored)
+        self.assertEqual(trader.depot,
+                         depot_to_units(stored, TradingPair.BTCEUR))
+
+    if __name__ == '__main__':
+        unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+import logging
+import os
+import pickle
+import sys
+import tempfile
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from gann.depot import Depot
+from gann.offer import Offer, OfferType
+from gann.query import Archive
+from gann.serialization import EventWriter
+from gann.trader import Trader
+from gann.trader_conditions import TraderConditions
+from gann.trading_pair import TradingPair
+from gann.warm_state import (load_warm_state, prime, save_warm_state,
+                             TraderState)
+
+logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+logging.getLogger().setLevel(logging.ERROR)
+
+START = datetime(2021, 3, 4, 12, 0, 0)
+
+class TestWarmState(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary.name)
+        self.depot_path = self.directory / 'a_depot.json'
+        self.depot_path.write_text('{"money": 100, "depot": {"500": 1.0}}')
+        self.path = self.directory / 'warm_state'
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def trader(self):
+        trader = Trader(broker=None, money=100, depot={500: 1.0, 400: 0.5})
+        trader.highest_price_buying = 700
+        trader.lowest_price_selling = 300
+        trader.last_purchase_price = 450
+        return trader
+
+    def test_round_trip(self):
+        """Expect the state of a trader to be restored as saved."""
+        save_warm_state(self.path, {'a': TraderState.of(self.trader(),
+                                                        [self.depot_path])})
+
+        state = load_warm_state(self.path)['a']
+        self.assertTrue(state.depot_valid([self.depot_path],
+                                          TradingPair.BTCEUR))
+        self.assertTrue(state.market_valid(TradingPair.BTCEUR))
+        self.assertIsInstance(state.depot, Depot)
+        self.assertEqual([400, 500], state.depot.prices())
+        self.assertEqual(450, state.last_purchase_price)
+
+        trader = Trader(broker=None, money=state.money, depot=state.depot)
+        state.restore_market(trader)
+        self.assertEqual(700, trader.highest_price_buying)
+        self.assertEqual(300, trader.lowest_price_selling)
+
+    def test_invalidation(self):
+        """Expect depots, whose files changed, and old market state not to
+        be restored."""
+        state = TraderState.of(self.trader(), [self.depot_path],
+                               now=START.timestamp())
+
+        self.assertFalse(state.depot_valid([self.depot_path],
+                                           TradingPair.ETHEUR))
+        # Amounts in other units, the trader's fixed-point mode changed
+        self.assertFalse(state.depot_valid([self.depot_path],
+                                           TradingPair.BTCEUR, 10 ** 8))
+        self.assertFalse(state.market_valid(
+            TradingPair.BTCEUR, now=(START + timedelta(hours=1)).timestamp()))
+        self.assertTrue(state.market_valid(
+            TradingPair.BTCEUR, now=(START + timedelta(minutes=1)).timestamp()))
+
+        self.depot_path.write_text('{"money": 100, "depot": {}}')
+        os.utime(self.depot_path, ns=(0, 0))
+        self.assertFalse(state.depot_valid([self.depot_path],
+                                           TradingPair.BTCEUR))
+
+    def test_unusable(self):
+        """Expect no states from missing, broken or foreign files."""
+        self.assertEqual({}, load_warm_state(self.path))
+
+        self.path.write_bytes(b'broken')
+        self.assertEqual({}, load_warm_state(self.path))
+
+        self.path.write_bytes(pickle.dumps({'version': 0, 'traders': {}}))
+        self.assertEqual({}, load_warm_state(self.path))
+
+    def test_prime(self):
+        """Expect the extreme prices of the archive's offers."""
+        with (self.directory / 'sniffed_since_2021-03-04_12:00:00') \
+             .open('wb') as file:
+            writer = EventWriter(file)
+            for minute, offer_type, price, pair in (
+                    (1, OfferType.BUY, 900, TradingPair.BTCEUR),
+                    (2, OfferType.BUY, 1100, TradingPair.ETHEUR),
+                    (3, OfferType.SELL, 1000, TradingPair.BTCEUR),
+                    (4, OfferType.SELL, 1200, TradingPair.BTCEUR),
+                    (5, OfferType.BUY, 800, TradingPair.BTCEUR)):
+                writer.write_offer(Offer(
+                    str(minute), 1.0, 0.0, price, offer_type, pair,
+                    START + timedelta(minutes=minute)))
+            writer.close()
+
+        trader = Trader(broker=None, money=100)
+        other = Trader(broker=None, money=100,
+                       conditions=TraderConditions(
+                           trading_pair=TradingPair.LTCEUR))
+        prime([trader, other], Archive(self.directory), START)
+
+        self.assertEqual(900, trader.highest_price_buying)
+        self.assertEqual(1000, trader.lowest_price_selling)
+        self.assertEqual(0, other.highest_price_buying)
+        self.assertEqual(sys.maxsize, other.lowest_price_selling)
+
+    if __name__ == '__main__':
+        unittest.main()
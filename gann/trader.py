@@ -3,7 +3,9 @@ import sys
 
 from threading import Lock
 
+from gann.depot import Depot
 from gann.offer import OfferType
+from gann.strategy import THRESHOLDS
 from gann.trader_conditions import TraderConditions
 
 log = logging.getLogger('gann')
@@ -12,7 +14,9 @@ class Trader:
     """A trader which remebers the assets it baught and will sell them only to a
     given amount of profit."""
     def __init__(self, broker, depot=None, money=0,
-                 conditions=TraderConditions()):
+                 conditions=TraderConditions(), strategy=None):
+        # Decides on offers, see `gann.strategy`
+        self.strategy = strategy if strategy is not None else THRESHOLDS
         self.conditions = conditions
         self.last_purchase_price = 0.0
         self.money = money
@@ -21,154 +25,135 @@ class Trader:
         self.lowest_price_selling = sys.maxsize
         self.highest_price_buying = 0
 
-        if depot is None:
-            self.depot = dict()
-        else:
-            # sorts dict by price, so that lower come first
-            self.depot = dict(sorted(depot.items()))
+        # The current `OrderBook` of the trading pair, if someone maintains
+        # one, see `TraderRunner`
+        self.order_book = None
+        # The `PairStatistics` of the trading pair, if someone maintains them
+        self.statistics = None
+
+        self.depot = depot
+
+        # Why the trader declined the last offer it considered, `None` if it
+        # took it. Strategies may tell more precisely than 'strategy'.
+        self.rejection = None
 
         # Set cheapest price for last bought item
         if any(self.depot):
-            self.last_purchase_price = list(self.depot)[0]
+            self.last_purchase_price = self.depot.cheapest()
 
         self.buylock = Lock()
         self.selllock = Lock()
 
-    def consider_buy(self, offer):
+    @property
+    def conditions(self):
+        """The trader's `TraderConditions`. Assigning them compiles them into
+        the strategy's `decisions`, so after changing them in place they have
+        to be assigned again."""
+        return self._conditions
+
+    @conditions.setter
+    def conditions(self, conditions):
+        self._conditions = conditions
+        self.decisions = self.strategy.compile(conditions)
+
+    @property
+    def depot(self):
+        """The trader's positions, see `Depot`."""
+        return self._depot
+
+    @depot.setter
+    def depot(self, depot):
+        self._depot = depot if isinstance(depot, Depot) else Depot(depot)
+
+    def consider_buy(self, offer, decided=None):
         """Takes an offer and buy to it if it matches the configured conditions
         taking the previously bought offers into account.
         ":param Offer offer: The offer to check.
+        ":param decided: Called after deciding to buy, right before asking
+        the broker.
         ":returns: `True` if the trader bought to it, `False` otherwise."""
         if offer.price < self.lowest_price_selling:
             self.lowest_price_selling = offer.price
 
-        if offer.price * offer.min_amount > self.conditions.max_price():
-            return False
-
-        if offer.price * offer.amount < self.conditions.min_price():
+        conditions = self.conditions
+        self.rejection = 'strategy'
+        # Amounts in the units of the depot, coins unless in fixed-point mode
+        amount = self.strategy.buy(self, offer,
+                                   conditions.to_units(offer.amount),
+                                   conditions.to_units(offer.min_amount))
+        if amount is None:
             return False
 
-        if any(self.depot):
-            if offer.price > (self.last_purchase_price
-                              - self.conditions.step_price):
-                return False
-        else:
-            if offer.price > (self.highest_price_buying -
-                              self.conditions.turnaround_price):
-                return False
-
-        amount = self.conditions.amount_price / offer.price
-
-        # Many platforms do not accept to obscure numbers.
-        amount = round(amount, self.conditions.decimals)
-
-        # If rounding was higher or lower than amount/min_amount
-        # use those values instead.
-        if amount > offer.amount:
-            amount = offer.amount
-
-        if amount < offer.min_amount:
-            amount = offer.min_amount
-
-        if amount * offer.price > self.money:
+        if amount * offer.price > self.money * conditions.scale:
+            self.rejection = 'money'
             return False
 
-        gained_coins = self.broker.try_buy(offer, amount)
+        if decided is not None:
+            decided()
+        gained_coins = self.broker.try_buy(offer, conditions.from_units(amount))
         if not gained_coins:
             log.info("Failed to buy %f of %s", gained_coins, offer)
+            self.rejection = 'broker'
             return False
+        self.rejection = None
 
-        self.money -= amount * offer.price
+        self.money -= conditions.cost(amount, offer.price)
         log.info("Bought %f of %s", gained_coins, offer)
         log.debug("Depot is now: %s", self.depot)
         self.last_purchase_price = offer.price
 
+        gained = conditions.to_units(gained_coins)
         if offer.price in self.depot:
-            self.depot[offer.price] += gained_coins
+            self.depot[offer.price] += gained
         else:
-            self.depot[offer.price] = gained_coins
+            self.depot[offer.price] = gained
 
         return True
 
-    def consider_sell(self, offer):
+    def consider_sell(self, offer, decided=None):
         """Takes an offer and sells to it if it matches the configured conditions
         taking the previously bought offers into account.
         ":param Offer offer: The offer to check.
+        ":param decided: Called after deciding to sell, right before asking
+        the broker.
         ":returns: `True` if the trader sold to it, `False` otherwise."""
         if offer.price > self.highest_price_buying:
             self.highest_price_buying = offer.price
 
-        prices = sorted(self.depot, reverse=True)
-
-        if len(prices) < 1:
+        if not self.depot:
+            self.rejection = 'depot'
             return False
 
-        amount = 0
-        consumed = []
-        left_in_depot_amount = 0
-        initial_spent = 0
-        enough_profit_reached = False
-        profit_possible = True
-
-        while (any(prices)
-               and profit_possible
-               and amount < offer.amount
-               ):
-            current_price = prices.pop()
-
-            # Do not try to sell more than asked for
-            if amount + self.depot[current_price] > offer.amount:
-                left_in_depot_price = current_price
-                left_in_depot_amount = (self.depot[left_in_depot_price]
-                                        - (offer.amount - amount))
-
-                initial_spent += left_in_depot_price * (
-                    self.depot[left_in_depot_price] - left_in_depot_amount)
-
-                # Check if we would make enough profit with the deal
-                if not self.conditions.enough(
-                        offer.amount, offer, initial_spent):
-                    left_in_depot_price = 0
-                    left_in_depot_amount = 0
-                    profit_possible = False
-                else:
-                    enough_profit_reached = True
-                    amount = offer.amount
-            else:
-                initial_spent += self.depot[current_price] * current_price
-
-                # Leave if we couldn't make enough profit with the deal
-                if not self.conditions.enough(
-                        amount + self.depot[current_price], offer,
-                        initial_spent):
-                    profit_possible = False
-                else:
-                    amount += self.depot[current_price]
-                    consumed.append(current_price)
-                    enough_profit_reached = True
+        conditions = self.conditions
+        self.rejection = 'strategy'
+        sale = self.strategy.sell(self, offer, conditions.to_units(offer.amount))
 
         # Exit if we do not have enough in depot to make a profitalbe deal
-        if offer.min_amount > amount:
+        if sale is None:
             return False
-
-        if not enough_profit_reached:
+        if conditions.to_units(offer.min_amount) > sale.amount:
+            self.rejection = 'min_amount'
             return False
 
-        gained_money = self.broker.try_sell(offer, amount)
+        if decided is not None:
+            decided()
+        coins = conditions.from_units(sale.amount)
+        gained_money = self.broker.try_sell(offer, coins)
         if not gained_money:
-            log.info("Failed to sell %f of %s", amount, offer)
+            log.info("Failed to sell %f of %s", coins, offer)
+            self.rejection = 'broker'
             return False
+        self.rejection = None
 
-        log.info("Sold %f of %s for %f initial spent: %f", amount, offer,
-                    gained_money/100, int(initial_spent))
+        log.info("Sold %f of %s for %f initial spent: %f", coins, offer,
+                    gained_money/100, int(sale.initial_spent / conditions.scale))
         log.debug("Depot is now: %s", self.depot)
         self.money += gained_money
 
-        for item in consumed:
-            del self.depot[item]
+        self.depot.remove_cheapest(sale.consumed)
 
-        if left_in_depot_amount > 0:
-            self.depot[left_in_depot_price] = left_in_depot_amount
+        if sale.left_amount > 0:
+            self.depot[sale.left_price] = sale.left_amount
 
         # Reset highest_price_buying, since prices a rising again
         # And we do not want to go with the highest price of the last
@@ -177,15 +162,35 @@ class Trader:
 
         return True
 
-    def process_offer(self, offer):
+    def buy_limit(self):
+        """The highest price `consider_buy` currently buys at."""
+        return self.strategy.buy_limit(self)
+
+    def sell_floor(self):
+        """A lower bound of the prices `consider_sell` currently sells at."""
+        return self.strategy.sell_floor(self)
+
+    def process_offer(self, offer, decided=None):
+        """Buys from or sells to an offer, if it fits.
+
+        :param decided: Called after deciding to trade, right before asking
+        the broker, see `consider_buy`.
+        :returns: `True` if the trader traded."""
         if offer.trading_pair != self.conditions.trading_pair:
+            self.rejection = 'trading_pair'
             return False
 
+        # Let the broker presign a trade before deciding on the offer, so
+        # taking it only has to sign the nonce and amount
+        prepare = getattr(self.broker, 'prepare', None)
+        if prepare is not None:
+            prepare(offer)
+
         if offer.type == OfferType.BUY:
             self.buylock.acquire()
 
             # Someone wants to buy coins
-            result = self.consider_sell(offer)
+            result = self.consider_sell(offer, decided)
 
             self.buylock.release()
             return result
@@ -193,7 +198,7 @@ class Trader:
             self.selllock.acquire()
 
             # Someone wants to sell coins
-            result = self.consider_buy(offer)
+            result = self.consider_buy(offer, decided)
 
             self.selllock.release()
             return result
@@ -1,5 +1,6 @@
 from dataclasses import dataclass, field
 
+from gann.fixed_point import units_per_coin
 from gann.trading_pair import TradingPair
 from gann.offer import Offer
 
@@ -22,6 +23,10 @@ class TraderConditions:
                              decimal places, to produce not too obscure numbers.
         :param TradingPair trading_pair: Specifies the tradint pair, the trader
         should use.
+        :param bool fixed_point: Count amounts of coins in integer units of the
+        trading pair's coin, see `gann.fixed_point`, so that the trader
+        compares them without rounding errors. The trader's depot holds
+        units then.
         """
     amount_price: int = 100_00
     amount_price_tolerance: int = 20_00
@@ -30,8 +35,10 @@ class TraderConditions:
     turnaround_price: int = 10_00
     decimals: int = 4
     trading_pair: TradingPair = TradingPair.BTCEUR
+    fixed_point: bool = False
     min_profit: int = field(init=False)
     percentage: bool = field(init=False)
+    scale: int = field(init=False)
 
     def __post_init__(self):
         if (isinstance(self.min_profit_str, str)
@@ -42,16 +49,68 @@ class TraderConditions:
             self.min_profit = int(self.min_profit_str)
             self.percentage = False
 
+        # Units per coin
+        self.scale = (units_per_coin(self.trading_pair)
+                      if self.fixed_point else 1)
+
     def max_price(self):
         return self.amount_price + self.amount_price_tolerance
 
     def min_price(self):
         return self.amount_price - self.amount_price_tolerance
 
+    def profit_factor(self):
+        """How much more than spent selling has to bring at least."""
+        if self.percentage:
+            return 1 + self.min_profit / 100
+        return 1 + self.min_profit / self.amount_price
+
+    def to_units(self, amount: float):
+        """Converts an amount of coins into the trader's units."""
+        if self.fixed_point:
+            return round(amount * self.scale)
+        return amount
+
+    def from_units(self, amount):
+        """Converts an amount of the trader's units into coins."""
+        if self.fixed_point:
+            return amount / self.scale
+        return amount
+
+    def purchase_amount(self, price: int):
+        """How many units to buy at `price` for `amount_price`, rounded to
+        `decimals` places of a coin."""
+        if not self.fixed_point:
+            return round(self.amount_price / price, self.decimals)
+
+        step = max(self.scale // 10 ** self.decimals, 1)
+        steps, rest = divmod(self.amount_price * self.scale, price * step)
+        # Round half to even like `round`
+        if 2 * rest > price * step or (2 * rest == price * step
+                                       and steps % 2):
+            steps += 1
+        return steps * step
+
+    def cost(self, amount, price: int):
+        """The cents to pay for an amount of units at `price`, rounded up in
+        fixed-point mode."""
+        if self.fixed_point:
+            return -(-amount * price // self.scale)
+        return amount * price
+
     def enough(self,
                amount: float,
                offer: Offer,
                initial_spent: int) -> bool:
+        """Tells if selling `amount` to the offer brings enough profit for
+        positions bought for `initial_spent`. In fixed-point mode `amount`
+        are units and `initial_spent` the sum of units times prices."""
+        if self.fixed_point:
+            if self.percentage:
+                return (offer.price * amount * 100
+                        >= initial_spent * (100 + self.min_profit))
+            return (offer.price * amount * self.amount_price
+                    >= initial_spent * (self.amount_price + self.min_profit))
 
         if self.percentage:
             return (offer.price * amount
@@ -60,3 +119,27 @@ class TraderConditions:
         return  (amount * offer.price >= (
             initial_spent/self.amount_price * self.min_profit +
             initial_spent))
+
+def trader_conditions_from_config(config, section):
+    """Reads the conditions of a trader from a section of a `traders.ini`.
+
+    :param configparser.ConfigParser config: The parsed ini file.
+    :param str section: The trader's section.
+    """
+    return TraderConditions(
+        amount_price=config.getint(
+            section, 'amount_price', fallback=100_00),
+        amount_price_tolerance=config.getint(
+            section, 'amount_price_tolerance', fallback=20_00),
+        min_profit_str=config.get(
+            section, 'min_profit_price', fallback='10_00'),
+        step_price=config.getint(
+            section, 'step_price', fallback=40_00),
+        turnaround_price=config.getint(
+            section, 'turnaround_price', fallback=10_00),
+        decimals=config.getint(
+            section, 'decimals', fallback=4),
+        trading_pair=TradingPair(
+            config.get(section, 'trading_pair', fallback='btceur')),
+        fixed_point=config.getboolean(
+            section, 'fixed_point', fallback=False))
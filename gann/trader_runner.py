@@ -1,34 +1,218 @@
 import json
-import sys
+
+import numpy as np
+
+from gann.depot_journal import DepotJournal
+from gann.fixed_point import depot_to_coins
+from gann.metrics import DISABLED
+from gann.offer import OfferType
+from gann.order_book import OrderBooks
+
+class TraderGroup:
+    """The traders of one trading pair along with arrays of the thresholds
+    they act on, so that a single vectorized comparison tells which of them
+    might accept an offer. The thresholds are the bounds of the traders'
+    strategies, see `gann.strategy.Strategy`.
+
+    The traders remain the source of truth, the arrays are refreshed from
+    them, whenever the runner let one of them process an offer.
+
+    :param indexes: The positions of the traders in the runner's list.
+    :param traders: The traders themselves.
+    """
+    def __init__(self, indexes, traders):
+        self.indexes = indexes
+        self.traders = traders
+        self.buy_limit = np.empty(len(traders))
+        self.max_price = np.empty(len(traders))
+        self.min_price = np.empty(len(traders))
+        self.sell_floor = np.empty(len(traders))
+        self.highest_price_buying = np.empty(len(traders))
+        self.lowest_price_selling = np.empty(len(traders))
+        # Traders in fixed-point mode round amounts of offers to units
+        self.half_unit = np.empty(len(traders))
+
+        for row in range(len(traders)):
+            self.refresh(row)
+
+    def refresh(self, row):
+        """Reads the thresholds of a trader again."""
+        trader = self.traders[row]
+        self.buy_limit[row] = trader.buy_limit()
+        self.min_price[row], self.max_price[row] = \
+            trader.strategy.price_range(trader)
+        self.sell_floor[row] = trader.sell_floor()
+        self.highest_price_buying[row] = trader.highest_price_buying
+        self.lowest_price_selling[row] = trader.lowest_price_selling
+        self.half_unit[row] = (0.5 / trader.conditions.scale
+                               if trader.conditions.fixed_point else 0.0)
+
+    def candidates(self, offer):
+        """Returns the rows of the traders which might accept the offer.
+
+        The thresholds do not depend on the highest and lowest prices the
+        offer itself might set, so those are left to `observe`."""
+        if offer.type == OfferType.BUY:
+            return np.flatnonzero(offer.price >= self.sell_floor)
+
+        if offer.type == OfferType.SELL:
+            return np.flatnonzero(
+                (offer.price <= self.buy_limit)
+                & (offer.price * (offer.min_amount - self.half_unit)
+                   <= self.max_price)
+                & (offer.price * (offer.amount + self.half_unit)
+                   >= self.min_price))
+
+        return np.empty(0, dtype=np.intp)
+
+    def observe(self, offer, rows):
+        """Keeps track of the highest and lowest prices for the first `rows`
+        traders, as they would do when processing the offer themselves.
+        Traders after the one which took the offer never get to see it."""
+        if offer.type == OfferType.BUY:
+            for row in np.flatnonzero(
+                    offer.price > self.highest_price_buying[:rows]):
+                self.traders[row].highest_price_buying = offer.price
+                self.refresh(row)
+        elif offer.type == OfferType.SELL:
+            for row in np.flatnonzero(
+                    offer.price < self.lowest_price_selling[:rows]):
+                self.traders[row].lowest_price_selling = offer.price
+                self.lowest_price_selling[row] = offer.price
 
 class TraderRunner:
-    """ Runs traders and persists their depots."""
-    def __init__(self, traders=None, depots=None):
+    """ Runs traders and persists their depots.
+
+    :param traders: The traders to run.
+    :param depots: For each trader either a file to rewrite with its depot
+    JSON or a `DepotJournal`.
+    :param Metrics metrics: Records how long decisions take and how offers
+    are dealt with.
+    :param MarketStatistics statistics: Kept up to date with all offers and
+    removals and taking the spreads from the runner's order books, unless it
+    has some of its own.
+    """
+    def __init__(self, traders=None, depots=None, metrics=None,
+                 statistics=None):
         self.traders = traders if traders is not None else list()
         self.depots = depots if depots is not None else list()
+        self.metrics = metrics if metrics is not None else DISABLED
+        self.order_books = OrderBooks()
+        self.statistics = statistics
+        if statistics is not None and statistics.order_books is None:
+            statistics.order_books = self.order_books
+        self.refresh()
+
+    def refresh(self):
+        """Groups the traders by trading pair and reads their thresholds.
+        Has to be called after changing traders other than through
+        `add_order`."""
+        indexes = dict()
+        for i, trader in enumerate(self.traders):
+            indexes.setdefault(trader.conditions.trading_pair, []).append(i)
+            trader.order_book = self.order_books.book(
+                trader.conditions.trading_pair)
+            if self.statistics is not None:
+                trader.statistics = self.statistics.pair(
+                    trader.conditions.trading_pair)
+        self.groups = {pair: TraderGroup(group,
+                                         [self.traders[i] for i in group])
+                       for pair, group in indexes.items()}
+        self.grouped = len(self.traders)
+
+    def add_order(self, offer, received=None):
+        """Progresses a given order
 
-    def add_order(self, offer):
-        """Progresses a given order"""
+        The decision is timed until the first trade is sent to the broker,
+        or until all traders declined, persisting a trade is timed on its
+        own. Traders which decline count as rejections by their reason.
+
+        :param received: When the offer was received as timestamp of the
+        metrics' clock, if known."""
+        metrics = self.metrics
+        decide = None
+        if metrics.enabled:
+            started = metrics.clock()
+            decided = None
+
+            def decide():
+                nonlocal decided
+                if decided is None:
+                    decided = metrics.clock()
 
         if len(self.traders) != len(self.depots):
             raise Exception("Trader and depot sizes do not match.")
 
-        for i in range(len(self.traders)):
-            trader = self.traders[i]
-            depot = self.depots[i]
-            if trader.process_offer(offer):
-                depot.seek(0)
-                depot.write(json.dumps(
-                    {"money": trader.money,
-                     "depot": trader.depot}))
-                # flush everythin else if previously written depot was larger.
-                depot.truncate()
-                depot.flush()
-                # skip other traders, since this offers gone now
-                return
-
-    def remove_order(self, *args):
+        if self.grouped != len(self.traders):
+            self.refresh()
+
+        self.order_books.add(offer)
+        if self.statistics is not None:
+            self.statistics.add(offer)
+
+        group = self.groups.get(offer.trading_pair)
+        if group is None:
+            outcome = 'no_traders'
+        else:
+            # Only the traders whose thresholds match run their full logic
+            candidates = group.candidates(offer)
+            outcome = 'declined' if len(candidates) else 'filtered'
+            seen = len(group.traders)
+            for row in candidates:
+                trader = group.traders[row]
+                traded = trader.process_offer(offer, decide)
+                group.refresh(row)
+                if traded:
+                    if metrics.enabled:
+                        persisting = metrics.clock()
+                    self.persist(self.depots[group.indexes[row]], trader)
+                    if metrics.enabled:
+                        metrics.since('persist', persisting)
+                    outcome = 'accepted'
+                    # skip other traders, since this offers gone now
+                    seen = row + 1
+                    break
+                if metrics.enabled:
+                    metrics.increment('rejections_total',
+                                      trading_pair=offer.trading_pair.value,
+                                      reason=trader.rejection)
+            group.observe(offer, seen)
+
+        if metrics.enabled:
+            if decided is None:
+                decided = metrics.clock()
+            metrics.observe('decision', decided - started)
+            if received is not None:
+                metrics.observe('receive_to_decision', decided - received)
+            metrics.increment('offers_total',
+                              trading_pair=offer.trading_pair.value,
+                              outcome=outcome)
+
+    def persist(self, depot, trader):
+        """Stores money and depot of a trader, which just traded."""
+        if isinstance(depot, DepotJournal):
+            depot.record(trader.money, trader.depot)
+            return
+
+        # Depot files hold coins, even of traders in fixed-point mode
+        conditions = trader.conditions
+        positions = (depot_to_coins(trader.depot, conditions.trading_pair)
+                     if conditions.fixed_point else trader.depot)
+        depot.seek(0)
+        depot.write(json.dumps(
+            {"money": trader.money,
+             "depot": positions}))
+        # flush everythin else if previously written depot was larger.
+        depot.truncate()
+        depot.flush()
+
+    def remove_order(self, removal):
         """Progress the removal of an order"""
+        self.order_books.remove(removal)
+        if self.statistics is not None:
+            self.statistics.remove(removal)
+        if self.metrics.enabled:
+            self.metrics.increment('removals_total')
 
     def refresh_express_option(self, *args):
         """Seems to occur sometimes at bitcoin.de
@@ -0,0 +1,144 @@
+"""Snapshots of the traders' state for a fast restart of `bin/trader`.
+
+At shutdown the depots are stored already parsed along with what the traders
+learned about the market, the highest and lowest prices seen and the price of
+their last purchase. Next start, depots are taken from the snapshot, if their
+files did not change in the meantime, and the market state, if it is recent
+enough. Otherwise the depot files are read as usual and the market state can
+be primed from the last minutes of a sniffed archive instead.
+"""
+import logging
+import os
+import pickle
+import sys
+import time
+
+from dataclasses import dataclass
+from pathlib import Path
+
+from gann.depot import Depot
+from gann.offer import OfferType
+from gann.serialization import EVENT_TYPE
+from gann.trading_pair import TradingPair
+
+log = logging.getLogger('gann')
+
+WARM_STATE_VERSION = 2
+
+# Market state older than this many seconds is not restored
+MARKET_STATE_MAX_AGE = 15 * 60
+
+def fingerprint(paths):
+    """Identifies the content of files by their modification times and
+    sizes."""
+    result = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            result.append((str(path), stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            result.append((str(path), None, None))
+    return tuple(result)
+
+@dataclass
+class TraderState:
+    """What is restored of a trader.
+
+    :param tuple sources: The `fingerprint` of the depot's files when the
+    state was saved.
+    :param TradingPair trading_pair: The trader's trading pair.
+    :param money: The trader's money in cents.
+    :param Depot depot: The trader's positions.
+    :param last_purchase_price: The price of the trader's last purchase.
+    :param int highest_price_buying: The highest price of buy offers seen.
+    :param int lowest_price_selling: The lowest price of sell offers seen.
+    :param float saved: When the state was saved as timestamp.
+    :param int scale: The units per coin the depot's amounts count, see
+    `TraderConditions.scale`.
+    """
+    sources: tuple
+    trading_pair: TradingPair
+    money: int
+    depot: Depot
+    last_purchase_price: float
+    highest_price_buying: int
+    lowest_price_selling: int
+    saved: float
+    scale: int = 1
+
+    @classmethod
+    def of(cls, trader, sources, now=None):
+        """The state of a trader, whose depot is stored in `sources`."""
+        return cls(fingerprint(sources), trader.conditions.trading_pair,
+                   trader.money, trader.depot, trader.last_purchase_price,
+                   trader.highest_price_buying, trader.lowest_price_selling,
+                   now if now is not None else time.time(),
+                   trader.conditions.scale)
+
+    def depot_valid(self, sources, trading_pair, scale=1):
+        """Whether the depot's files are unchanged since saving and its
+        amounts count the same units."""
+        return (self.trading_pair == trading_pair
+                and self.scale == scale
+                and self.sources == fingerprint(sources))
+
+    def market_valid(self, trading_pair, max_age=MARKET_STATE_MAX_AGE,
+                     now=None):
+        """Whether the market state is of the pair and recent enough."""
+        now = now if now is not None else time.time()
+        return self.trading_pair == trading_pair and now - self.saved <= max_age
+
+    def restore_market(self, trader):
+        trader.highest_price_buying = self.highest_price_buying
+        trader.lowest_price_selling = self.lowest_price_selling
+
+def save_warm_state(path, states):
+    """Stores the states by trader names, replacing the file atomically."""
+    path = Path(path)
+    temporary = path.with_name(path.name + '.tmp')
+    with temporary.open('wb') as file:
+        pickle.dump({'version': WARM_STATE_VERSION, 'traders': states}, file,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+
+def load_warm_state(path):
+    """Returns the states by trader names or an empty dict, if there is no
+    usable snapshot."""
+    path = Path(path)
+    if not path.exists():
+        return dict()
+    try:
+        with path.open('rb') as file:
+            data = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError,
+            ImportError) as e:
+        log.warning("Ignoring unreadable warm state %s: %s", path, e)
+        return dict()
+    if (not isinstance(data, dict)
+        or data.get('version') != WARM_STATE_VERSION):
+        log.warning("Ignoring warm state %s of another version", path)
+        return dict()
+    return data['traders']
+
+def prime(traders, archive, start, end=None):
+    """Lets traders know the highest price of buy offers and the lowest price
+    of sell offers of their trading pair in a time range of an `Archive`, as
+    if they had seen them."""
+    extremes = dict()
+    for trading_pair in {trader.conditions.trading_pair for trader in traders}:
+        highest = 0
+        for records in archive.records(start, end, trading_pair,
+                                       OfferType.BUY, EVENT_TYPE.ADDED):
+            highest = max(highest, int(records['price'].max()))
+        lowest = sys.maxsize
+        for records in archive.records(start, end, trading_pair,
+                                       OfferType.SELL, EVENT_TYPE.ADDED):
+            lowest = min(lowest, int(records['price'].min()))
+        extremes[trading_pair] = highest, lowest
+
+    for trader in traders:
+        highest, lowest = extremes[trader.conditions.trading_pair]
+        if highest > trader.highest_price_buying:
+            trader.highest_price_buying = highest
+        if lowest < trader.lowest_price_selling:
+            trader.lowest_price_selling = lowest